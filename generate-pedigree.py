@@ -1,9 +1,337 @@
 #!/usr/bin/env python
+import argparse
+import bisect
+import collections
+import gzip
+import io
+import json
+import math
+import mmap
+import multiprocessing
+import os
+import platform
 import random
+import shutil
+import struct
+import tempfile
+import time
+import tracemalloc
 from datetime import datetime
+try:
+    import numpy as np
+except ImportError:
+    np = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import resource
+except ImportError:
+    resource = None
 now = datetime.now()
 year = now.year
 
+#cancer incidences per 100 person-years by age band from Table 1 in
+#Antoniou et al 2004
+NC_BR_CA_INC = {30:0.009, 40:0.040, 50:0.068, 60:0.092, 70:0.114}
+BRCA1_BR_CA_INC = {30:0.538, 40:1.021, 50:0.677, 60:0.450, 70:0.481}
+BRCA2_BR_CA_INC = {30:0.375, 40:0.799, 50:1.484, 60:2.612, 70:3.591}
+NC_OV_CA_INC = {30:0.004, 40:0.012, 50:0.031, 60:0.044, 70:0.048}
+BRCA1_OV_CA_INC = {30:0.021, 40:1.173, 50:0.813, 60:0.976, 70:0.100}
+BRCA2_OV_CA_INC = {30:0.022, 40:0.044, 50:0.462, 60:0.416, 70:0.100}
+
+#probabilities of a BRCA1 or BRCA2 mutation by age band at diagnosis of
+#breast or ovarian cancer from Table 2 in Antoniou et al 2004
+BR_BRCA1_PROB = {30:0.051, 40:0.016, 50:0.004, 60:0.002, 70:0.001}
+BR_BRCA2_PROB = {30:0.050, 40:0.020, 50:0.015, 60:0.012, 70:0.008}
+OV_BRCA1_PROB = {30:0.006, 40:0.082, 50:0.018, 60:0.013, 70:0.001}
+OV_BRCA2_PROB = {30:0.008, 40:0.004, 50:0.016, 60:0.008, 70:0.001}
+
+def age_table(inc, max_age, scale=1):
+    '''
+    inc: dictionary of incidences or probabilities key = age band, value =
+    incidence or probability
+
+    Returns a tuple indexed by age from 0 to max_age of the value for the
+    age band of each age divided by scale, with the bands used by
+    sample_ca_inc and sample_mutn_inc
+    '''
+    table = []
+    for age in range(max_age + 1):
+        band = min(max(age // 10 * 10, 30), 70)
+        table.append(inc[band]/scale)
+    return tuple(table)
+
+def cumulative_hazard(probs):
+    '''
+    probs: tuple of yearly cancer probabilities indexed by age
+
+    Returns a tuple indexed by age of the cumulative hazard -log(1 - p)
+    summed over the yearly cancer probabilities p used by get_br_cancer
+    and get_ov_cancer from age 30 up to that age
+    '''
+    cum_hazard = []
+    total = 0.0
+    for age in range(len(probs)):
+        if age >= 30:
+            total -= math.log(1 - probs[age])
+        cum_hazard.append(total)
+    return tuple(cum_hazard)
+
+class CancerModel(object):
+    '''
+    Cancer incidences from Table 1 and mutation probabilities from Table 2
+    in Antoniou et al 2004 compiled once into tuples indexed by integer age
+    from 0 to max_age, so sampling reads one entry instead of going through
+    the age band if/elif chains of sample_ca_inc and sample_mutn_inc
+
+    br_ca_prob, ov_ca_prob: yearly breast and ovarian cancer probabilities
+        for mutation status 0 to 3
+    br_cum_hazard, ov_cum_hazard: cumulative hazards of the yearly
+        probabilities from age 30 for mutation status 0 to 3
+    br_mutn_prob, ov_mutn_prob: BRCA1 and BRCA2 mutation probabilities by
+        age at diagnosis of breast or ovarian cancer
+
+    The tables are tuples so the compiled model is read only and can be
+    shared with or pickled to worker processes
+    '''
+
+    def __init__(self, max_age=120):
+        '''Compiles the tables for ages 0 to max_age'''
+        self.max_age = max_age
+        self.br_ca_prob = tuple([age_table(inc, max_age, 100) for inc in
+                                 [NC_BR_CA_INC, BRCA1_BR_CA_INC,
+                                  BRCA2_BR_CA_INC, BRCA1_BR_CA_INC]])
+        self.ov_ca_prob = tuple([age_table(inc, max_age, 100) for inc in
+                                 [NC_OV_CA_INC, BRCA1_OV_CA_INC,
+                                  BRCA2_OV_CA_INC, BRCA1_OV_CA_INC]])
+        self.br_cum_hazard = tuple([cumulative_hazard(probs) for probs in
+                                    self.br_ca_prob])
+        self.ov_cum_hazard = tuple([cumulative_hazard(probs) for probs in
+                                    self.ov_ca_prob])
+        self.br_mutn_prob = (age_table(BR_BRCA1_PROB, max_age),
+                             age_table(BR_BRCA2_PROB, max_age))
+        self.ov_mutn_prob = (age_table(OV_BRCA1_PROB, max_age),
+                             age_table(OV_BRCA2_PROB, max_age))
+
+#compiled model used by all the sampling functions
+MODEL = CancerModel()
+
+#relationship of each member of a pedigree to the proband, the roles after
+#the aunts and uncles are only in pedigrees with more generations
+ROLES = ["proband", "father", "mother", "sibling", "paternal grandfather",
+         "paternal grandmother", "maternal grandfather",
+         "maternal grandmother", "paternal aunt/uncle", "maternal aunt/uncle",
+         "paternal ancestor", "maternal ancestor", "paternal cousin",
+         "maternal cousin", "paternal relative", "maternal relative", "child",
+         "grandchild", "descendant", "niece/nephew", "partner"]
+FIRST_DEGREE_ROLES = ["father", "mother", "sibling", "child"]
+PATERNAL_SECOND_DEGREE_ROLES = ["paternal grandfather",
+                                "paternal grandmother",
+                                "paternal aunt/uncle"]
+MATERNAL_SECOND_DEGREE_ROLES = ["maternal grandfather",
+                                "maternal grandmother",
+                                "maternal aunt/uncle"]
+
+#family history group of each relative role counted by add_history
+HISTORY_GROUPS = {}
+for role in FIRST_DEGREE_ROLES:
+    HISTORY_GROUPS[role] = "first"
+for role in MATERNAL_SECOND_DEGREE_ROLES:
+    HISTORY_GROUPS[role] = "maternal"
+for role in PATERNAL_SECOND_DEGREE_ROLES:
+    HISTORY_GROUPS[role] = "paternal"
+
+#integer codes used to store the BOADICEA string values in Person and
+#PedigreeBatch
+SEX_CODES = {"M": 1, "F": 2}
+G_TEST_CODES = {0: 0, "S": 1, "T": 2}
+MUTN_CODES = {0: 0, 1: 1, 2: 2, 3: 3, "N": 4}
+RECEPTOR_CODES = {0: 0, "N": 1, "P": 2}
+MALE = SEX_CODES["M"]
+FEMALE = SEX_CODES["F"]
+DIRECT_TEST = G_TEST_CODES["T"]
+
+def decode_table(codes):
+    '''Returns a dictionary of the BOADICEA value of each code in codes'''
+    values = {}
+    for value, code in codes.items():
+        values[code] = value
+    return values
+
+SEX_VALUES = decode_table(SEX_CODES)
+G_TEST_VALUES = decode_table(G_TEST_CODES)
+MUTN_VALUES = decode_table(MUTN_CODES)
+RECEPTOR_VALUES = decode_table(RECEPTOR_CODES)
+
+def check_generations(generations):
+    '''
+    Checks the number of generations of an N-generation pedigree, given as
+    [up, down]: the number of generations above the proband, at least 1,
+    and the number below the proband, at least 0
+
+    Returns [up, down] as integers
+    '''
+    try:
+        up, down = generations
+    except (TypeError, ValueError):
+        raise ValueError("generations must be [up, down]")
+    if int(up) != up or int(down) != down:
+        raise ValueError("generations must be whole numbers")
+    if up < 1:
+        raise ValueError("Pedigree needs at least one generation above the "
+                         "proband")
+    if down < 0:
+        raise ValueError("Generations below the proband can not be "
+                         "negative")
+    return [int(up), int(down)]
+
+class Person(object):
+    '''
+    One member of a pedigree with a named field for each BOADICEA column,
+    in the order of the person lists of make_healthy_pedigree
+
+    sex, g_test, mutn and the receptor fields hold the integer codes of
+    SEX_CODES, G_TEST_CODES, MUTN_CODES and RECEPTOR_CODES. Indexing a
+    Person gives the BOADICEA value of a column, so person[6] is "F" when
+    person.sex is FEMALE, and a Person can be used wherever a person list
+    is expected. The simulation uses the fields directly and the codes are
+    only turned back into BOADICEA values when a pedigree is written
+    '''
+
+    __slots__ = ("fam_id", "name", "target", "ind_id", "fath_id", "moth_id",
+                 "sex", "twin", "dead", "age", "birth_year", "br_ca1",
+                 "br_ca2", "ov_ca", "pro_ca", "pan_ca", "g_test", "mutn",
+                 "ashkn", "er", "pr", "her2", "ck14", "ck56")
+
+    #codes of each column by index, None for columns stored as they are
+    codes = (None, None, None, None, None, None, SEX_CODES, None, None, None,
+             None, None, None, None, None, None, G_TEST_CODES, MUTN_CODES,
+             None, RECEPTOR_CODES, RECEPTOR_CODES, RECEPTOR_CODES,
+             RECEPTOR_CODES, RECEPTOR_CODES)
+    values = tuple([None if codes is None else decode_table(codes)
+                    for codes in codes])
+
+    def __init__(self, fam_id=0, name=0, target=0, ind_id=0, fath_id=0,
+                 moth_id=0, sex=MALE, twin=0, dead=0, age=0, birth_year=0,
+                 br_ca1=0, br_ca2=0, ov_ca=0, pro_ca=0, pan_ca=0, g_test=0,
+                 mutn=0, ashkn=0, er=0, pr=0, her2=0, ck14=0, ck56=0):
+        '''Takes the fields with sex, g_test, mutn and receptors coded'''
+        self.fam_id = fam_id
+        self.name = name
+        self.target = target
+        self.ind_id = ind_id
+        self.fath_id = fath_id
+        self.moth_id = moth_id
+        self.sex = sex
+        self.twin = twin
+        self.dead = dead
+        self.age = age
+        self.birth_year = birth_year
+        self.br_ca1 = br_ca1
+        self.br_ca2 = br_ca2
+        self.ov_ca = ov_ca
+        self.pro_ca = pro_ca
+        self.pan_ca = pan_ca
+        self.g_test = g_test
+        self.mutn = mutn
+        self.ashkn = ashkn
+        self.er = er
+        self.pr = pr
+        self.her2 = her2
+        self.ck14 = ck14
+        self.ck56 = ck56
+
+    @classmethod
+    def from_values(cls, values):
+        '''
+        values: person list in the format used in the make_healthy_pedigree
+        function
+
+        Returns a Person with the same information
+        '''
+        codes = []
+        for index, value in enumerate(values):
+            if cls.codes[index] is None:
+                codes.append(value)
+            else:
+                codes.append(cls.codes[index][value])
+        return cls(*codes)
+
+    def get_codes(self):
+        '''Returns a tuple of the fields with categorical values coded'''
+        return (self.fam_id, self.name, self.target, self.ind_id,
+                self.fath_id, self.moth_id, self.sex, self.twin, self.dead,
+                self.age, self.birth_year, self.br_ca1, self.br_ca2,
+                self.ov_ca, self.pro_ca, self.pan_ca, self.g_test, self.mutn,
+                self.ashkn, self.er, self.pr, self.her2, self.ck14, self.ck56)
+
+    def to_list(self):
+        '''
+        Returns a person list of BOADICEA values in the format used in the
+        make_healthy_pedigree function
+        '''
+        return [self.fam_id, self.name, self.target, self.ind_id,
+                self.fath_id, self.moth_id, SEX_VALUES[self.sex], self.twin,
+                self.dead, self.age, self.birth_year, self.br_ca1,
+                self.br_ca2, self.ov_ca, self.pro_ca, self.pan_ca,
+                G_TEST_VALUES[self.g_test], MUTN_VALUES[self.mutn],
+                self.ashkn, RECEPTOR_VALUES[self.er],
+                RECEPTOR_VALUES[self.pr], RECEPTOR_VALUES[self.her2],
+                RECEPTOR_VALUES[self.ck14], RECEPTOR_VALUES[self.ck56]]
+
+    def __getitem__(self, index):
+        '''Returns the BOADICEA value of a column index or slice'''
+        if isinstance(index, slice):
+            return self.to_list()[index]
+        value = getattr(self, self.__slots__[index])
+        if self.values[index] is None:
+            return value
+        return self.values[index][value]
+
+    def __setitem__(self, index, value):
+        '''Sets a column index from its BOADICEA value'''
+        if self.codes[index] is not None:
+            value = self.codes[index][value]
+        setattr(self, self.__slots__[index], value)
+
+    def __iter__(self):
+        '''Iterates over the BOADICEA values of the columns'''
+        return iter(self.to_list())
+
+    def __len__(self):
+        '''Returns the number of columns'''
+        return len(self.__slots__)
+
+    def __eq__(self, other):
+        '''A Person equals a Person or person list with the same values'''
+        if isinstance(other, Person):
+            return self.get_codes() == other.get_codes()
+        if isinstance(other, list):
+            return self.to_list() == other
+        return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        if equal is NotImplemented:
+            return equal
+        return not equal
+
+    __hash__ = None
+
+    def __reduce__(self):
+        '''Pickles a Person as its coded fields'''
+        return (Person, self.get_codes())
+
+    def __repr__(self):
+        return "Person(%r)" % self.to_list()
+
+##to debug Person
+#person = Person(1, 1, 1, 1, sex=FEMALE, age=40)
+#person[17] = 1
+#print(person, person.mutn, person[6], list(person) == person)
+
 class Pedigree(object):
     '''
     The following definitions/abbreviations are used throughout this class
@@ -38,10 +366,38 @@ class Pedigree(object):
 
     family_id = 0
     ind_id = 0
+    #smallest age at which a person in a pedigree with generations gets a
+    #partner and children
+    min_parent_age = 25
 
-    def __init__(self):
-        '''Initializes a unique family ID for each instance of a pedigree'''
+    def __init__(self, generations=None):
+        '''
+        generations: None for the three generations of
+            make_healthy_pedigree, or [ancestors, descendants] to build
+            ancestors generations above the proband and descendants
+            generations below with make_generations
+
+        Initializes a unique family ID for each instance of a pedigree and
+        an empty relationship index:
+        children: dictionary of lists of each parent's children key =
+            parent IndID
+        roles: dictionary of each person's role from ROLES key = IndID
+        proband: proband of the indexed pedigree
+        history: family history counts of the indexed pedigree in the
+            order br_ca_ls, br_ca_gr, ov_ca, m2_br_ca, p2_br_ca, m2_ov_ca,
+            p2_ov_ca, updated by add_history
+        history_count: number of people counted in history
+        num_founders: number of founders at the start of the pedigree
+        '''
         Pedigree.family_id += 1
+        if generations is not None:
+            generations = check_generations(generations)
+        self.generations = generations
+        self.num_founders = 4
+        self.children = {}
+        self.roles = {}
+        self.proband = None
+        self.reset_history()
 
     def get_family_id(self):
         '''Returns unique family ID when called'''
@@ -53,20 +409,20 @@ class Pedigree(object):
         return self.ind_id
 
     def get_gender(self):
-        '''Randomly returns either M for male or F for female when called'''
-        gender = random.randint(1,2)
-        if gender == 1:
-            return "M"
-        else:
-            return "F"
+        '''
+        Randomly returns either the code MALE or the code FEMALE when
+        called
+        '''
+        return random.randint(MALE, FEMALE)
         
     def init_proband(self):
         '''
-        Initializes the proband for the pedigree and returns a list in
-        the format:
+        Initializes the proband for the pedigree and returns a Person with
+        the fields:
         [FamID, Name, Target, IndID, FathID, MothID, Sex, Twin, Dead,
         Age, Birth Year, BrCa_1, BrCa_2, OvCa, ProCa, PanCa, G Test, 
         Mutn, Ashkn, ER, PR, HER2, CK14, CK56]
+        and no cancer, genetic test or mutation
         '''
         fam_id = self.get_family_id()
         person_id = self.get_ind_id()
@@ -79,27 +435,8 @@ class Pedigree(object):
         dead = 0
         age = random.randint(20,65)
         birth_year = int(year)-int(age)
-        br_ca_dx1 = 0
-        br_ca_dx2 = 0
-        ov_ca_dx = 0
-        pro_ca_dx = 0
-        pan_ca_dx = 0
-        g_test = 0
-        mutn = 0
-        ashkn = 0
-        ER = 0
-        PR = 0
-        HER2 = 0
-        CK14 = 0
-        CK56 = 0
-        proband = []
-        variables = [fam_id, name, target, person_id, fath_id, moth_id,
-                    gender, twin, dead, age, birth_year, br_ca_dx1,
-                    br_ca_dx2, ov_ca_dx, pro_ca_dx, pan_ca_dx, g_test,
-                    mutn, ashkn, ER, PR, HER2, CK14, CK56]
-        for variable in variables:
-            proband.append(variable)
-        return proband
+        return Person(fam_id, name, target, person_id, fath_id, moth_id,
+                      gender, twin, dead, age, birth_year)
 
 ##to debug init_proband
 #x = 1
@@ -113,16 +450,16 @@ class Pedigree(object):
     def add_parents(self, person):
         '''
         Adds parent information for an individual
-        Returns a list of lists with information for child's  mother and
-        father in the following format:
+        Returns a list of a Person for the child's father followed by a
+        Person for the child's mother with the fields:
         [Fam ID, Name, Target, IndID, FathID, MothID, Sex, Twin, Dead,
         Age, Birth Year, BrCa_1, BrCa_2, OvCa, ProCa, PanCa, G Test, Mutn,
         Ashkn, ER, PR, HER2, CK14, CK56]
         '''
-        person_moth_id = person[5]
-        person_fath_id = person[4]
+        person_moth_id = person.moth_id
+        person_fath_id = person.fath_id
         if person_moth_id == 0 and person_fath_id == 0:
-            fam_id = person [0]
+            fam_id = person.fam_id
             person_moth_id = self.get_ind_id()
             person_fath_id = self.get_ind_id()
             person_moth_name = person_moth_id
@@ -130,10 +467,10 @@ class Pedigree(object):
             moth_id = 0
             fath_id = 0
             target = 0
-            moth_gender = "F"
-            fath_gender = "M"
+            moth_gender = FEMALE
+            fath_gender = MALE
             twin = 0
-            child_age = int(person[9])
+            child_age = int(person.age)
             moth_age = random.randint(child_age + 20, child_age + 40)
             fath_age = random.randint(child_age + 20, child_age + 40)
             moth_birth_year = int(year) - int(moth_age)
@@ -148,37 +485,14 @@ class Pedigree(object):
                 fath_age = 91
             else:
                 fath_dead = 0
-            br_ca_dx1 = 0
-            br_ca_dx2 = 0
-            ov_ca_dx = 0
-            pro_ca_dx = 0
-            pan_ca_dx = 0
-            g_test = 0
-            mutn = 0
-            ashkn = 0
-            ER = 0
-            PR = 0
-            HER2 = 0
-            CK14 = 0
-            CK56 = 0
-            moth_variables = [fam_id, person_moth_name, target, person_moth_id, fath_id,
-                              moth_id, moth_gender, twin, moth_dead, moth_age,
-                              moth_birth_year, br_ca_dx1, br_ca_dx2,
-                              ov_ca_dx, pro_ca_dx, pan_ca_dx, g_test,
-                              mutn, ashkn, ER, PR, HER2, CK14, CK56]
-            fath_variables = [fam_id, person_fath_name, target, person_fath_id, fath_id,
-                              moth_id, fath_gender, twin, fath_dead, fath_age,
-                              fath_birth_year, br_ca_dx1, br_ca_dx2,
-                              ov_ca_dx, pro_ca_dx, pan_ca_dx, g_test,
-                              mutn, ashkn, ER, PR, HER2, CK14, CK56]
-            mother = []
-            for variable in moth_variables:
-                mother.append(variable)
-            father = []
-            for variable in fath_variables:
-                father.append(variable)
-            person[5] = person_moth_id
-            person[4] = person_fath_id
+            mother = Person(fam_id, person_moth_name, target, person_moth_id,
+                            fath_id, moth_id, moth_gender, twin, moth_dead,
+                            moth_age, moth_birth_year)
+            father = Person(fam_id, person_fath_name, target, person_fath_id,
+                            fath_id, moth_id, fath_gender, twin, fath_dead,
+                            fath_age, fath_birth_year)
+            person.moth_id = person_moth_id
+            person.fath_id = person_fath_id
             parents = []
             parents.append(father)
             parents.append(mother)
@@ -210,51 +524,36 @@ class Pedigree(object):
         '''
         Creates a partner given a specific person and randomly generates
         offspring for pair
-        Returns a list of information for the new partner in
-        the following format:
+        Returns a Person for the new partner with the fields:
         [Fam ID, Name, Target, IndID, FathID, MothID, Sex, Twin, Dead,
         Age, Birth Year, BrCa_1, BrCa_2, OvCa, ProCa, PanCa, G Test, Mutn,
         Ashkn, ER, PR, HER2, CK14, CK56]
         '''
-        fam_id = person[0]
+        fam_id = person.fam_id
         partner_id = self.get_ind_id()
         partner_name = partner_id
         partner_target = 0
         partner_moth_id = 0
         partner_fath_id = 0
-        person_gender = person[6]
-        if person_gender == "M":
-            partner_gender = "F"
+        person_gender = person.sex
+        if person_gender == MALE:
+            partner_gender = FEMALE
         else:
-            partner_gender = "M"
+            partner_gender = MALE
         partner_twin = 0
         partner_dead = 0
-        person_age = int(person[9])
+        person_age = int(person.age)
         partner_age = random.randint(person_age - 15, person_age + 15)
+        if partner_age < 18:
+            partner_age = 18
         if partner_age > 90:
             partner_age = 91
             partner_dead = 1
         partner_birth_year = int(year)-int(partner_age)
-        br_ca_dx1 = 0
-        br_ca_dx2 = 0
-        ov_ca_dx = 0
-        pro_ca_dx = 0
-        pan_ca_dx = 0
-        g_test = 0
-        mutn = 0
-        ashkn = 0
-        ER = 0
-        PR = 0
-        HER2 = 0
-        CK14 = 0
-        CK56 = 0
-        partner = [fam_id, partner_name, partner_target, partner_id,
-                   partner_fath_id, partner_moth_id,
-                   partner_gender, partner_twin,
-                   partner_dead, partner_age, partner_birth_year,
-                   br_ca_dx1, br_ca_dx2, ov_ca_dx,
-                   pro_ca_dx, pan_ca_dx, g_test, mutn, ashkn, ER,
-                   PR, HER2, CK14, CK56]
+        partner = Person(fam_id, partner_name, partner_target, partner_id,
+                         partner_fath_id, partner_moth_id, partner_gender,
+                         partner_twin, partner_dead, partner_age,
+                         partner_birth_year)
         return partner
 
 ##to debug add_partner
@@ -277,21 +576,21 @@ class Pedigree(object):
         '''
         Generates offrsping given 2 parents
 
-        Returns a list of lists with each list representing one child in
-        the following format:
+        Returns a list of Person objects, one for each child, with the
+        fields:
         [Fam ID, Name, Target, IndID, FathID, MothID, Sex, Twin, Dead,
         Age, Birth Year, BrCa_1, BrCa_2, OvCa, ProCa, PanCa, G Test, Mutn,
         Ashkn, ER, PR, HER2, CK14, CK56]
         '''
-        fam_id = person1[0]
-        if person1[6] == "F":
-            moth_id = person1[3]
-            fath_id = person2[3]
-            moth_age = int(person1[9])
+        fam_id = person1.fam_id
+        if person1.sex == FEMALE:
+            moth_id = person1.ind_id
+            fath_id = person2.ind_id
+            moth_age = int(person1.age)
         else:
-            moth_id = person2[3]
-            fath_id = person1[3]
-            moth_age = int(person2[9])
+            moth_id = person2.ind_id
+            fath_id = person1.ind_id
+            moth_age = int(person2.age)
         num_children = random.randint(0,4)
         children = []
         for child in range(num_children):
@@ -306,26 +605,10 @@ class Pedigree(object):
             if child_age <= 0:
                 child_age = 1
             child_birth_year = int(year) - int(child_age)
-            br_ca_dx1 = 0
-            br_ca_dx2 = 0
-            ov_ca_dx = 0
-            pro_ca_dx = 0
-            pan_ca_dx = 0
-            g_test = 0
-            mutn = 0
-            ashkn = 0
-            ER = 0
-            PR = 0
-            HER2 = 0
-            CK14 = 0
-            CK56 = 0
-            child_variables = [fam_id, child_name, child_target, child_id, fath_id,
-                               moth_id, child_gender, child_twin, child_dead,
-                               child_age, child_birth_year, br_ca_dx1,
-                               br_ca_dx2, ov_ca_dx, pro_ca_dx,
-                               pan_ca_dx, g_test, mutn, ashkn, ER,
-                               PR, HER2, CK14, CK56]
-            children.append(child_variables)
+            children.append(Person(fam_id, child_name, child_target,
+                                   child_id, fath_id, moth_id, child_gender,
+                                   child_twin, child_dead, child_age,
+                                   child_birth_year))
         return children
 
 #to debug add_offspring
@@ -347,16 +630,16 @@ class Pedigree(object):
         Given a particular person, generates siblings. Parents must be
         initialized before creating any siblings
 
-        Returns of list of lists containing the information for each
-        siblings in the following format:
+        Returns of list of Person objects, one for each sibling, with the
+        fields:
         [Fam ID, Name, Target, IndID, FathID, MothID, Sex, Twin, Dead,
         Age, Birth Year, BrCa_1, BrCa_2, OvCa, ProCa, PanCa, G Test, Mutn,
         Ashkn, ER, PR, HER2, CK14, CK56]
         '''
-        fam_id = person[0]
-        moth_id = person[5]
-        fath_id = person[4]
-        person_age = int(person[9])
+        fam_id = person.fam_id
+        moth_id = person.moth_id
+        fath_id = person.fath_id
+        person_age = int(person.age)
         if moth_id == 0 and fath_id == 0:
             raise ValueError("Must add parents before adding siblings")
         else:
@@ -375,26 +658,9 @@ class Pedigree(object):
                 if sib_age > 90:
                     sib_dead = 1
                     sib_age = 91
-                br_ca_dx1 = 0
-                br_ca_dx2 = 0
-                ov_ca_dx = 0
-                pro_ca_dx = 0
-                pan_ca_dx = 0
-                g_test = 0
-                mutn = 0
-                ashkn = 0
-                ER = 0
-                PR = 0
-                HER2 = 0
-                CK14 = 0
-                CK56 = 0
-                sib_variables = [fam_id, sib_name, sib_target, sib_id, fath_id,
-                                 moth_id, sib_gender, sib_twin, sib_dead,
-                                 sib_age, sib_birth_year, br_ca_dx1,
-                                 br_ca_dx2, ov_ca_dx, pro_ca_dx,
-                                 pan_ca_dx, g_test, mutn, ashkn, ER,
-                                 PR, HER2, CK14, CK56]
-                siblings.append(sib_variables)
+                siblings.append(Person(fam_id, sib_name, sib_target, sib_id,
+                                       fath_id, moth_id, sib_gender, sib_twin,
+                                       sib_dead, sib_age, sib_birth_year))
             return siblings
         
 #to debug add_siblings
@@ -417,17 +683,23 @@ class Pedigree(object):
         Randomly generates a pedigree of 3 generations with proband in
         final generation
 
-        Returns a list of lists with information for each pedigree
-        member in the following format:
+        Returns a list of Person objects with information for each
+        pedigree member with the fields:
         [Fam ID, Name, Target, IndID, FathID, MothID, Sex, Twin, Dead,
         Age, Birth Year, BrCa_1, BrCa_2, OvCa, ProCa, PanCa, G Test, Mutn,
         Ashkn, ER, PR, HER2, CK14, CK56]
+        Indexing a Person gives these BOADICEA values as in a list
 
         Order of family members is paternal grandfather, paternal
         grandmother, materal grandfather, maternal grandmother, father,
         mother, father's siblings, mother's siblings, proband's
         siblings, proband
+
+        If the pedigree was made with generations, returns the pedigree
+        from make_generations instead
         '''
+        if self.generations is not None:
+            return self.make_generations()
         pedigree = []
         proband = self.init_proband()
         pro_parents = self.add_parents(proband)
@@ -438,6 +710,23 @@ class Pedigree(object):
         pro_moth_parents = self.add_parents(pro_moth)
         pro_fath_siblings = self.add_siblings(pro_fath)
         pro_moth_siblings = self.add_siblings(pro_moth)
+        self.children = {}
+        self.roles = {}
+        self.proband = proband
+        self.index_person(pro_fath_parents[0], "paternal grandfather")
+        self.index_person(pro_fath_parents[1], "paternal grandmother")
+        self.index_person(pro_moth_parents[0], "maternal grandfather")
+        self.index_person(pro_moth_parents[1], "maternal grandmother")
+        self.index_person(pro_fath, "father")
+        self.index_person(pro_moth, "mother")
+        for person in pro_fath_siblings:
+            self.index_person(person, "paternal aunt/uncle")
+        for person in pro_moth_siblings:
+            self.index_person(person, "maternal aunt/uncle")
+        for person in pro_siblings:
+            self.index_person(person, "sibling")
+        self.index_person(proband, "proband")
+        self.reset_history()
         for person in pro_fath_parents:
             pedigree.append(person)
         for person in pro_moth_parents:
@@ -453,6 +742,223 @@ class Pedigree(object):
         pedigree.append(proband)
         return pedigree
 
+    def make_generations(self):
+        '''
+        Randomly generates a pedigree with the number of generations above
+        and below the proband in self.generations, built one generation at
+        a time so the work grows with the number of people:
+        going up, every person of a generation gets parents with
+        add_parents and then siblings with add_siblings, up to the top
+        ancestors; going down, every sibling of the proband or of an
+        ancestor, the proband and their descendants who are at least
+        min_parent_age get a partner with add_partner and children with
+        add_offspring, down to the lowest generation. This gives the
+        aunts/uncles and cousins on each side and the proband's children
+        and grandchildren
+
+        Returns a list of Person objects as in make_healthy_pedigree with
+        the founders (the top ancestors, in the order paternal then
+        maternal, followed by the partners) first, then everyone else from
+        the oldest generation down and the proband last. Sets num_founders
+        to the number of founders
+        '''
+        ancestors, descendants = self.generations
+        self.children = {}
+        self.roles = {}
+        proband = self.init_proband()
+        self.proband = proband
+        members = {}
+        parents = {}
+        for generation in range(-descendants, ancestors + 1):
+            members[generation] = []
+            parents[generation] = []
+        parents[0].append([proband, "proband", None])
+        level = [[proband, None]]
+        for generation in range(1, ancestors + 1):
+            next_level = []
+            for child, side in level:
+                father, mother = self.add_parents(child)
+                if generation == 1:
+                    father_side, mother_side = "paternal", "maternal"
+                else:
+                    father_side, mother_side = side, side
+                next_level.append([father, father_side])
+                next_level.append([mother, mother_side])
+            for child, side in level:
+                for sibling in self.add_siblings(child):
+                    members[generation - 1].append(sibling)
+                    if generation == 1:
+                        self.index_person(sibling, "sibling")
+                        parents[0].append([sibling, "sibling", None])
+                    elif generation == 2:
+                        self.index_person(sibling, "%s aunt/uncle" % side)
+                        parents[1].append([sibling, "aunt/uncle", side])
+                    else:
+                        self.index_person(sibling, "%s relative" % side)
+                        parents[generation - 1].append([sibling, "relative",
+                                                        side])
+            for parent, side in next_level:
+                if generation == 1:
+                    if parent.sex == MALE:
+                        role = "father"
+                    else:
+                        role = "mother"
+                elif generation == 2:
+                    if parent.sex == MALE:
+                        role = "%s grandfather" % side
+                    else:
+                        role = "%s grandmother" % side
+                else:
+                    role = "%s ancestor" % side
+                self.index_person(parent, role)
+                if generation < ancestors:
+                    members[generation].append(parent)
+            level = next_level
+        founders = [parent for parent, side in level]
+        for generation in range(ancestors - 1, -descendants, -1):
+            for person, line, side in parents[generation]:
+                if person.age < self.min_parent_age:
+                    continue
+                partner = self.add_partner(person)
+                self.index_person(partner, "partner")
+                founders.append(partner)
+                if person.sex == FEMALE:
+                    moth_age = person.age
+                else:
+                    moth_age = partner.age
+                if moth_age < self.min_parent_age:
+                    continue
+                role = self.descendant_role(line, side, generation - 1)
+                for child in self.add_offspring(person, partner):
+                    self.index_person(child, role)
+                    members[generation - 1].append(child)
+                    parents[generation - 1].append([child, line, side])
+        pedigree = founders
+        self.num_founders = len(founders)
+        for generation in range(ancestors - 1, -descendants - 1, -1):
+            pedigree.extend(members[generation])
+        self.index_person(proband, "proband")
+        pedigree.append(proband)
+        self.reset_history()
+        return pedigree
+
+    def descendant_role(self, line, side, generation):
+        '''
+        Returns the role of a child in generation (0 for the proband's,
+        negative below it) descended from the proband, a sibling, an
+        aunt/uncle or another relative, as given by line, on side
+        '''
+        if line == "proband":
+            if generation == -1:
+                return "child"
+            if generation == -2:
+                return "grandchild"
+            return "descendant"
+        if line == "sibling":
+            return "niece/nephew"
+        if line == "aunt/uncle" and generation == 0:
+            return "%s cousin" % side
+        return "%s relative" % side
+
+    def index_person(self, person, role):
+        '''
+        Adds a person to the relationship index with a role from ROLES, or
+        None if the role is unknown, and as a child of their parents
+        '''
+        self.roles[person.ind_id] = role
+        for parent_id in [person.fath_id, person.moth_id]:
+            if parent_id != 0:
+                if parent_id in self.children:
+                    self.children[parent_id].append(person)
+                else:
+                    self.children[parent_id] = [person]
+
+    def index_pedigree(self, pedigree):
+        '''
+        Rebuilds the relationship index for a pedigree that was not made
+        by this instance, such as one converted from a PedigreeBatch, with
+        the proband as the last person
+        '''
+        self.children = {}
+        self.roles = {}
+        self.proband = pedigree[-1]
+        for person in pedigree:
+            self.index_person(person, None)
+        by_id = {}
+        for person in pedigree:
+            by_id[person.ind_id] = person
+        proband = self.proband
+        self.roles[proband.ind_id] = "proband"
+        for side, parent_id in [["paternal", proband.fath_id],
+                                ["maternal", proband.moth_id]]:
+            parent = by_id.get(parent_id)
+            if parent is None:
+                continue
+            if side == "paternal":
+                self.roles[parent_id] = "father"
+            else:
+                self.roles[parent_id] = "mother"
+            if parent.fath_id in by_id:
+                self.roles[parent.fath_id] = "%s grandfather" % side
+                for person in self.children.get(parent.fath_id, []):
+                    if person.ind_id != parent_id:
+                        self.roles[person.ind_id] = "%s aunt/uncle" % side
+            if parent.moth_id in by_id:
+                self.roles[parent.moth_id] = "%s grandmother" % side
+        for person in self.children.get(proband.fath_id, []):
+            if person.ind_id != proband.ind_id:
+                self.roles[person.ind_id] = "sibling"
+        for person in self.children.get(proband.ind_id, []):
+            self.roles[person.ind_id] = "child"
+        self.reset_history()
+
+    def has_index(self, pedigree):
+        '''
+        Returns True if the relationship index was built for pedigree,
+        that is the proband of the index is the last person in pedigree
+        '''
+        return len(pedigree) > 0 and self.proband is pedigree[-1]
+
+    def reset_history(self):
+        '''
+        Sets the family history counts of the indexed pedigree to zero
+        '''
+        self.history = [0, 0, 0, 0, 0, 0, 0]
+        self.history_count = 0
+
+    def add_history(self, person):
+        '''
+        Adds a person whose cancer status is final to the family history
+        counts of the proband, using the person's role in the relationship
+        index. Each person should be added once, after which
+        get_family_history reads the counts without rescanning the
+        pedigree
+        '''
+        self.history_count += 1
+        group = HISTORY_GROUPS.get(self.roles.get(person.ind_id))
+        if group is None:
+            return
+        history = self.history
+        br_ca_status = person.br_ca1
+        ov_ca_status = person.ov_ca
+        if group == "first":
+            if br_ca_status > 0 and br_ca_status < 50:
+                history[0] += 1
+            elif br_ca_status >= 50:
+                history[1] += 1
+            if ov_ca_status > 0:
+                history[2] += 1
+        elif group == "maternal":
+            if br_ca_status > 0:
+                history[3] += 1
+            if ov_ca_status > 0:
+                history[5] += 1
+        else:
+            if br_ca_status > 0:
+                history[4] += 1
+            if ov_ca_status > 0:
+                history[6] += 1
+
 ##to debug make_healthy_pedigree
 #x = 1
 #while x <= 5:
@@ -462,26 +968,16 @@ class Pedigree(object):
 #        print person
 #    x += 1
 
-    def write_pedigree(self, pedigrees):
+    def write_pedigree(self, pedigrees, new_f="pedigree.txt",
+                       compression=None):
         '''
         Writes a list of pedigrees in output specific for BOADICEA 
-        import to file pedigree.txt
-        '''
-        new_f = "pedigree.txt"
-        my_pedigree = open(new_f, "w")
-        my_pedigree.write("BOADICEA import pedigree file format 2.0 \n")
-        headers = ["FamID", "Name", "Target", "IndivID", "FathID", "MothID",
-                   "Sex", "Twin", "Dead", "Age", "Yob", "1BrCa",
-                   "2BrCa", "OvCa", "ProCa", "PanCa", "Gtest", "Mutn",
-                   "Ashkn", "ER", "PR", "HER2", "CK14", "CK56"]
-        for item in headers:
-             my_pedigree.write("%s\t" % item)
-        my_pedigree.write("\n")
-        for pedigree in pedigrees:
-            for person in pedigree:
-                for info in person:
-                    my_pedigree.write("%s\t" % info)
-                my_pedigree.write("\n")
+        import to file pedigree.txt, or new_f compressed with compression
+        as in TextOutput, with an index if not compressed
+        '''
+        my_pedigree = TextOutput(new_f, write_pedigree_header, compression,
+                                 index=compression is None)
+        write_pedigree_rows(my_pedigree, pedigrees)
         my_pedigree.close()
     
 ##to debug write_pedigree
@@ -566,81 +1062,32 @@ class CancerPedigree(Pedigree):
         diagnosis and age of 2nd breast cancer diagnosis if person does
         randomly gets breast cancer 
         '''
-        nc_br_ca_inc = {30:0.009, 40:0.040, 50:0.068, 60:0.092,
-                        70:0.114}
-        brca1_br_ca_inc = {30:0.538, 40:1.021, 50:0.677, 60:0.450,
-                           70:0.481}
-        brca2_br_ca_inc = {30:0.375, 40:0.799, 50:1.484, 60:2.612,
-                           70:3.591}
-        sex = person[6]
-        st_age = person[9]
+        sex = person.sex
+        st_age = person.age
         ca_age = 30
-        br_ca1_status = person[11]
-        br_ca2_status = person[12]
-        mutn_status = person[17]
-        if mutn_status == 0:
-            while ca_age <= st_age:
-                br_ca_prob = self.sample_ca_inc(nc_br_ca_inc, ca_age)
-                chance = random.random()
-                if chance < br_ca_prob:
-                    if br_ca1_status == 0:
-                        person[11] = ca_age
-                    else:
-                        if br_ca2_status == 0:
-                            if br_ca1_status > ca_age:
-                                person[12] = br_ca1_status
-                                person[11] = ca_age
-                            else:
-                                person[12] = ca_age
-                ca_age += 1
-        elif mutn_status == 1:
-            while ca_age <= st_age:
-                br_ca_prob = self.sample_ca_inc(brca1_br_ca_inc, ca_age)
-                chance = random.random()
-                if chance < br_ca_prob:
-                    if br_ca1_status == 0:
-                        person[11] = ca_age
-                    else:
-                        if br_ca2_status == 0:
-                            if br_ca1_status > ca_age:    
-                                person[12] = br_ca1_status
-                                person[11]= ca_age
-                            else:
-                                person[12] = ca_age
-                ca_age += 1
-        elif mutn_status == 2:
-            while ca_age <= st_age:
-                br_ca_prob = self.sample_ca_inc(brca2_br_ca_inc, ca_age)
-                chance = random.random()
-                if chance < br_ca_prob:
-                    if br_ca1_status == 0:
-                        person[11] = ca_age
-                    else:
-                        if br_ca2_status == 0:
-                            if br_ca1_status > ca_age:
-                                person[12] = br_ca1_status
-                                person[11] = ca_age
-                            else:
-                                person[12] = ca_age
-                ca_age += 1
-        elif mutn_status == 3:
+        br_ca1_status = person.br_ca1
+        br_ca2_status = person.br_ca2
+        mutn_status = person.mutn
+        if mutn_status in (0, 1, 2, 3):
+            br_ca_probs = MODEL.br_ca_prob[mutn_status]
+            max_age = MODEL.max_age
             while ca_age <= st_age:
-                br_ca_prob = self.sample_ca_inc(brca1_br_ca_inc, ca_age)
+                br_ca_prob = br_ca_probs[min(ca_age, max_age)]
                 chance = random.random()
                 if chance < br_ca_prob:
                     if br_ca1_status == 0:
-                        person[11] = ca_age
+                        person.br_ca1 = ca_age
                     else:
                         if br_ca2_status == 0:
                             if br_ca1_status > ca_age:
-                                person[12] = br_ca1_status
-                                person[11] = ca_age
+                                person.br_ca2 = br_ca1_status
+                                person.br_ca1 = ca_age
                             else:
-                                person[12] = ca_age
+                                person.br_ca2 = ca_age
                 ca_age += 1
-        if sex == "M":
-            person[11] = 0
-            person[12] = 0
+        if sex == MALE:
+            person.br_ca1 = 0
+            person.br_ca2 = 0
         return person
 
 #to debug get_br_cancer
@@ -669,51 +1116,23 @@ class CancerPedigree(Pedigree):
         Returns person information with age of ovarian cancer included
         if person gets ovarian cancer
         '''
-        nc_ov_ca_inc = {30:0.004, 40:0.012, 50:0.031, 60:0.044,
-                        70:0.048}
-        brca1_ov_ca_inc = {30:0.021, 40:1.173, 50:0.813, 60:0.976,
-                           70:0.100}
-        brca2_ov_ca_inc = {30:0.022, 40:0.044, 50:0.462, 60:0.416,
-                           70:0.100}
-        sex = person[6]
-        st_age = person[9]
+        sex = person.sex
+        st_age = person.age
         ca_age = 30
-        ov_ca_status = person[13]
-        mutn_status = person[17]
-        if mutn_status == 0:
-            while ca_age <= st_age:
-                ov_ca_prob = self.sample_ca_inc(nc_ov_ca_inc,ca_age)
-                chance = random.random()
-                if chance < ov_ca_prob:
-                    if ov_ca_status == 0:
-                        person[13] = ca_age
-                ca_age += 1
-        elif mutn_status == 1:
-            while ca_age <= st_age:
-                ov_ca_prob = self.sample_ca_inc(brca1_ov_ca_inc, ca_age)
-                chance = random.random()
-                if chance < ov_ca_prob:
-                    if ov_ca_status == 0:
-                        person[13] = ca_age
-                ca_age += 1
-        elif mutn_status == 2:
+        ov_ca_status = person.ov_ca
+        mutn_status = person.mutn
+        if mutn_status in (0, 1, 2, 3):
+            ov_ca_probs = MODEL.ov_ca_prob[mutn_status]
+            max_age = MODEL.max_age
             while ca_age <= st_age:
-                ov_ca_prob = self.sample_ca_inc(brca2_ov_ca_inc, ca_age)
+                ov_ca_prob = ov_ca_probs[min(ca_age, max_age)]
                 chance = random.random()
                 if chance < ov_ca_prob:
                     if ov_ca_status == 0:
-                        person[13] = ca_age
+                        person.ov_ca = ca_age
                 ca_age += 1
-        elif mutn_status == 3:
-            while ca_age <= st_age:
-                ov_ca_prob = self.sample_ca_inc(brca1_ov_ca_inc, ca_age)
-                chance = random.random()
-                if chance < ov_ca_prob:
-                    if ov_ca_status == 0:
-                        person[13] = ca_age
-                ca_age += 1
-        if sex == "M":
-            person[13] = 0
+        if sex == MALE:
+            person.ov_ca = 0
         return person
 
 ##to debug get_ov_cancer
@@ -733,16 +1152,18 @@ class CancerPedigree(Pedigree):
         breast and ovarian cancer given probabilites used in functions
         get_br_cancer and get_ov_cancer
 
-        Returns a list of lists for all individuals in the original
-        pedigree with updated information for the four founder individuals
+        Returns a list of Person objects for all individuals in the
+        original pedigree with updated information for the four founder
+        individuals
         '''
-        founders = pedigree[:4]
+        founders = pedigree[:self.num_founders]
         founders_ca = []
         for founder in founders:
             br_ca = self.get_br_cancer(founder)
             ov_ca = self.get_ov_cancer(br_ca)
+            self.add_history(ov_ca)
             founders_ca.append(ov_ca)
-        for index in range(4):
+        for index in range(len(founders_ca)):
             pedigree[index] = founders_ca[index]
         return pedigree
     
@@ -767,51 +1188,48 @@ class CancerPedigree(Pedigree):
         Returns a list of information for a given person including their
         updated mutation status
         '''
-        br_brca1_prob = {30:0.051, 40:0.016, 50:0.004, 60:0.002,
-                         70:0.001}
-        br_brca2_prob = {30:0.050, 40:0.020, 50:0.015, 60:0.012,
-                         70:0.008}
-        ca_age = person[11]
-        br_ca_status = person[11]
-        mutn_status = person[17]
+        br_brca1_prob, br_brca2_prob = MODEL.br_mutn_prob
+        ca_age = person.br_ca1
+        br_ca_status = person.br_ca1
+        mutn_status = person.mutn
         brca1 = False
         brca2 = False
         if br_ca_status > 0:
             if mutn_status == 0:
-                brca1_prob = self.sample_mutn_inc(br_brca1_prob, ca_age)
+                brca1_prob = br_brca1_prob[min(ca_age, MODEL.max_age)]
                 chance1 = random.random()
                 if chance1 < brca1_prob:
                     brca1 = True
-                brca2_prob = self.sample_mutn_inc(br_brca2_prob, ca_age)
+                brca2_prob = br_brca2_prob[min(ca_age, MODEL.max_age)]
                 chance2 = random.random()
                 if chance2 < brca2_prob:
                     brca2 = True
                 if brca1 == True and brca2 == True:
-                    person[17] = 3
-                    person[16] = "T"
+                    person.mutn = 3
+                    person.g_test = DIRECT_TEST
                 elif brca1 == True and brca2 == False:
-                    person[17] = 1
-                    person[16] = "T"
+                    person.mutn = 1
+                    person.g_test = DIRECT_TEST
                 elif brca1 == False and brca2 == True:
-                    person[17] = 2
-                    person[16] = "T"
+                    person.mutn = 2
+                    person.g_test = DIRECT_TEST
                 else:
-                    person[17] = 0
+                    person.mutn = 0
             elif mutn_status == 1:
-                brca2_prob = self.sample_mutn_inc(br_brca2_prob, ca_age)
+                brca2_prob = br_brca2_prob[min(ca_age, MODEL.max_age)]
                 chance = random.random()
                 if chance < brca2_prob:
-                    person[17] = 3
-                    person[16] = "T"
+                    person.mutn = 3
+                    person.g_test = DIRECT_TEST
             elif mutn_status == 2:
-                brca1_prob = self.sample_mutn_inc(br_brca1_prob, ca_age)
+                brca1_prob = br_brca1_prob[min(ca_age, MODEL.max_age)]
                 chance = random.random()
                 if chance < brca1_prob:
-                    person[17] = 3
-                    person[16] = "T"
+                    person.mutn = 3
+                    person.g_test = DIRECT_TEST
             else:
-                person[17] = 3
-                person[16] = "T"
+                person.mutn = 3
+                person.g_test = DIRECT_TEST
         return person
 
 ##to debug get_mutn_br
@@ -835,51 +1253,48 @@ class CancerPedigree(Pedigree):
         Returns a list of information for the person including the
         updated mutations status
         '''
-        ov_brca1_prob = {30:0.006, 40:0.082, 50:0.018, 60:0.013,
-                         70:0.001}
-        ov_brca2_prob = {30:0.008, 40:0.004, 50:0.016, 60:0.008,
-                         70:0.001}
-        ca_age = person[13]
-        ov_ca_status = person[13]
-        mutn_status = person[17]
+        ov_brca1_prob, ov_brca2_prob = MODEL.ov_mutn_prob
+        ca_age = person.ov_ca
+        ov_ca_status = person.ov_ca
+        mutn_status = person.mutn
         brca1 = False
         brca2 = False
         if ov_ca_status > 0:
             if mutn_status == 0:
-                brca1_prob = self.sample_mutn_inc(ov_brca1_prob, ca_age)
+                brca1_prob = ov_brca1_prob[min(ca_age, MODEL.max_age)]
                 chance1 = random.random()
                 if chance1 < brca1_prob:
                     brca1 = True
-                brca2_prob = self.sample_mutn_inc(ov_brca2_prob, ca_age)
+                brca2_prob = ov_brca2_prob[min(ca_age, MODEL.max_age)]
                 chance2 = random.random()
                 if chance2 < brca2_prob:
                     brca2 = True
                 if brca1 == True and brca2 == True:
-                    person[17] = 3
-                    person[16] ="T"
+                    person.mutn = 3
+                    person.g_test = DIRECT_TEST
                 elif brca1 == True and brca2 == False:
-                    person[17] = 1
-                    person[16] = "T"
+                    person.mutn = 1
+                    person.g_test = DIRECT_TEST
                 elif brca1 == False and brca2 == True:
-                    person[17] = 2
-                    person[16] = "T"
+                    person.mutn = 2
+                    person.g_test = DIRECT_TEST
                 else:
-                    person[17] = 0
+                    person.mutn = 0
             elif mutn_status == 1:
-                brca2_prob = self.sample_mutn_inc(ov_brca2_prob, ca_age)
+                brca2_prob = ov_brca2_prob[min(ca_age, MODEL.max_age)]
                 chance = random.random()
                 if chance < brca2_prob:
-                    person[17] = 3
-                    person[16] = "T"
+                    person.mutn = 3
+                    person.g_test = DIRECT_TEST
             elif mutn_status == 2:
-                brca1_prob = self.sample_mutn_inc(ov_brca1_prob, ca_age)
+                brca1_prob = ov_brca1_prob[min(ca_age, MODEL.max_age)]
                 chance = random.random()
                 if chance < brca1_prob:
-                    person[17] = 3
-                    person[16] = "T"
+                    person.mutn = 3
+                    person.g_test = DIRECT_TEST
             else:
-                person[17] = 3
-                person[16] = "T"
+                person.mutn = 3
+                person.g_test = DIRECT_TEST
         return person
 
 ##to debug get_mutn_ov
@@ -901,21 +1316,21 @@ class CancerPedigree(Pedigree):
         get_munt_br and get_mutn_ov for only the female founders in a
         pedigree
 
-        Returns a list of lists of the information for each individual
-        in the pedigree with updated mutation information for the two
-        female founder individuals
+        Returns a list of Person objects for each individual in the
+        pedigree with updated mutation information for the two female
+        founder individuals
         '''
-        founders = ca_pedigree[:4]
+        founders = ca_pedigree[:self.num_founders]
         founder_mutns = []
         for founder in founders:
-            sex = founder[6]
-            if sex == "F":
+            sex = founder.sex
+            if sex == FEMALE:
                 br_mutn = self.get_mutn_br(founder)
                 ov_mutn = self.get_mutn_ov(br_mutn)
                 founder_mutns.append(ov_mutn)
             else:
                 founder_mutns.append(founder)
-        for index in range(4):
+        for index in range(len(founder_mutns)):
             ca_pedigree[index] = founder_mutns[index]
         return ca_pedigree
 
@@ -937,18 +1352,31 @@ class CancerPedigree(Pedigree):
         pedigree with a mutation returns a list of individuals with the
         founder mutation having a 50% chance of passing to the next
         generation
+
+        If the pedigree was made with generations, the mutation is passed
+        on down every generation, each carrier having a 50% chance of
+        passing it to each child
         '''
-        founder_id = founder[3]
-        founder_mutn = founder[17]
-        for person in mutn_pedigree:
-            moth_id = person[5]
-            fath_id = person[4]
-            if founder_id == moth_id or founder_id == fath_id:
-                prob_pass = 0.5
-                chance = random.random()
-                if chance < prob_pass:
-                    person[17] = founder_mutn
-                    person[16] = "T"
+        founder_id = founder.ind_id
+        founder_mutn = founder.mutn
+        if not self.has_index(mutn_pedigree):
+            self.index_pedigree(mutn_pedigree)
+        if self.generations is not None:
+            carriers = [founder_id]
+            while carriers:
+                carrier_id = carriers.pop()
+                for person in self.children.get(carrier_id, []):
+                    if random.random() < 0.5:
+                        person.mutn |= founder_mutn
+                        person.g_test = DIRECT_TEST
+                        carriers.append(person.ind_id)
+            return mutn_pedigree
+        for person in self.children.get(founder_id, []):
+            prob_pass = 0.5
+            chance = random.random()
+            if chance < prob_pass:
+                person.mutn = founder_mutn
+                person.g_test = DIRECT_TEST
         return mutn_pedigree
 
 ##to debug pass_founder_mutn
@@ -975,22 +1403,23 @@ class CancerPedigree(Pedigree):
         cancer given a pedigree where founders have been randomly
         assigned cancer and mutations
         
-        Returns a list of lists with each list containing information
-        for an individual in the format used in the
-        make_healthy_pedigree function
+        Returns a list of Person objects with information for each
+        individual as in the make_healthy_pedigree function
         '''
         cancer_pedigree = []
-        founders = mutn_pedigree[:4]
+        founders = mutn_pedigree[:self.num_founders]
         for founder in founders:
             cancer_pedigree.append(founder)
-        wo_founders = mutn_pedigree[4:]
+        wo_founders = mutn_pedigree[self.num_founders:]
         for person in wo_founders:
-            sex = person[6]
-            if sex == "F":
+            sex = person.sex
+            if sex == FEMALE:
                 br_ca = self.get_br_cancer(person)
                 ov_ca = self.get_ov_cancer(br_ca)
+                self.add_history(ov_ca)
                 cancer_pedigree.append(ov_ca)
             else:
+                self.add_history(person)
                 cancer_pedigree.append(person)
         return cancer_pedigree
 
@@ -1038,88 +1467,29 @@ class CancerPedigree(Pedigree):
             breast cancer, always 0 for this simulation
         pan_ca: number of first of second degree relatives with
             pancreatic cancer, always 0 for this simulation
+
+        The counts are read from add_history, which get_founder_ca and
+        make_ca_pedigree call as each person's cancer is assigned, so a
+        pedigree from simulate_pedigree is not scanned again. Any other
+        pedigree, or one whose people were not each added exactly once, is
+        counted here
         '''
-        family_hx = []
-        ped_length = len(ca_pedigree)
-        proband = ca_pedigree.pop(ped_length-1)
-        fam_id = proband[0]
-        ind_id = proband[3]
-        first_deg_rels = []
-        m_second_deg_rels = []
-        p_second_deg_rels = []
-        pro_fath_parents = ca_pedigree[:2]
-        for person in pro_fath_parents:
-            p_second_deg_rels.append(person)
-        pro_moth_parents = ca_pedigree[2:4]
-        for person in pro_moth_parents:
-            m_second_deg_rels.append(person)
-        pro_parents = ca_pedigree[4:6]
-        for person in pro_parents:
-            first_deg_rels.append(person)
-        pro_fath_id = proband[4]
-        pro_sibs = []
-        for person in ca_pedigree:
-            fath_id = person[4]
-            if fath_id == pro_fath_id:
-                pro_sibs.append(person)
-        for person in pro_sibs:
-            first_deg_rels.append(person)
-        pro_fath_sibs = []
-        pro_fath_fath_id = pro_fath_parents[0][3]
-        for person in ca_pedigree:
-            fath_id = person[4]
-            person_id = person[3]
-            if fath_id == pro_fath_fath_id and person_id != pro_parents[0][3]:
-                pro_fath_sibs.append(person)
-        for person in pro_fath_sibs:
-            p_second_deg_rels.append(person)
-        pro_moth_sibs = []
-        pro_moth_fath_id = pro_moth_parents[0][3]
-        for person in ca_pedigree:
-            fath_id = person[4]
-            person_id = person[3]
-            if fath_id == pro_moth_fath_id and person_id != pro_parents[1][3]:
-                pro_moth_sibs.append(person)
-        for person in pro_moth_sibs:
-            m_second_deg_rels.append(person)
+        if not self.has_index(ca_pedigree):
+            self.index_pedigree(ca_pedigree)
+        if self.history_count != len(ca_pedigree):
+            self.reset_history()
+            for person in ca_pedigree:
+                self.add_history(person)
+        proband = ca_pedigree[-1]
+        fam_id = proband.fam_id
+        ind_id = proband.ind_id
         fhx = 1
-        br_ca_ls = 0
-        br_ca_gr = 0
-        ov_ca = 0
-        for person in first_deg_rels:
-            br_ca_status = person[11]
-            ov_ca_status = person[13]
-            if br_ca_status > 0 and br_ca_status < 50:
-                br_ca_ls += 1
-            if br_ca_status >= 50:
-                br_ca_gr += 1
-            if ov_ca_status > 0:
-                ov_ca += 1
-        m2_br_ca = 0
-        m2_ov_ca = 0
-        for person in m_second_deg_rels:
-            br_ca_status = person[11]
-            ov_ca_status = person[13]
-            if br_ca_status > 0:
-                m2_br_ca += 1
-            if ov_ca_status > 0:
-                m2_ov_ca += 1
-        p2_br_ca = 0
-        p2_ov_ca = 0
-        for person in p_second_deg_rels:
-           br_ca_status = person[11]
-           ov_ca_status = person[13]
-           if br_ca_status > 0:
-               p2_br_ca += 1
-           if ov_ca_status > 0:
-               p2_ov_ca += 1
+        br_ca_ls, br_ca_gr, ov_ca, m2_br_ca, p2_br_ca, m2_ov_ca, p2_ov_ca = \
+            self.history
         male_br_ca = 0
         pan_ca = 0
-        var_list = [fam_id, ind_id, fhx, br_ca_ls, br_ca_gr, ov_ca, m2_br_ca,
-                    p2_br_ca, m2_ov_ca, p2_ov_ca, male_br_ca, pan_ca]
-        for var in var_list:
-            family_hx.append(var)
-        ca_pedigree.append(proband)
+        family_hx = [fam_id, ind_id, fhx, br_ca_ls, br_ca_gr, ov_ca, m2_br_ca,
+                     p2_br_ca, m2_ov_ca, p2_ov_ca, male_br_ca, pan_ca]
         return family_hx
 
 ##to debug get_family_hx
@@ -1146,24 +1516,17 @@ class CancerPedigree(Pedigree):
 #                w_ped = new_ped.write_pedigree([ca_ped])
 #                print fam_hx
 
-    def write_family_history(self, fam_hxs):
+    def write_family_history(self, fam_hxs, new_f="familyhistory.txt",
+                             compression=None):
         '''
         Write family history information for multiple families given
         list of family histories and output information to file 
-        familyhistory.txt 
-        '''
-        new_f = "familyhistory.txt"
-        my_hx = open(new_f, "w")
-        my_hx.write("Summary family history information \n")
-        headers = ["FamID", "ProID", "FamHx", "ls1BrCa", "gr1BrCa", "1OvCa", "m2BrCa",
-                   "p2BrCa", "m2OvCa", "p2OvCa", "maleBr", "PanCa"]
-        for item in headers:
-            my_hx.write("%s\t" % item)
-        my_hx.write("\n")
-        for fam in fam_hxs:
-            for value in fam:
-                my_hx.write("%s\t" % value)
-            my_hx.write("\n")
+        familyhistory.txt, or new_f compressed with compression as in
+        TextOutput, with an index if not compressed
+        '''
+        my_hx = TextOutput(new_f, write_family_history_header, compression,
+                           index=compression is None)
+        write_family_history_rows(my_hx, fam_hxs)
         my_hx.close()
 
 ##to debug write_family_history
@@ -1191,157 +1554,4401 @@ class CancerPedigree(Pedigree):
 #                w_hx = new_ped.write_family_history([fam_hx])
 
 
-#simulation
-def run_simulation(num_trials):
+class VectorizedCancerEngine(object):
     '''
-    Runs pedigree simulation for number of trials specified
-
-    Produces file "pedigree.txt" that contains number of specified
-    pedigrees
+    Assigns breast and ovarian cancer to many people at once with NumPy
+    using the same Table 1 incidences from Antoniou et al 2004 as
+    get_br_cancer and get_ov_cancer
 
-    For each family in pedigrees goes through the following steps:
-    1) Makes a healthy pedigree with designated proband, proband's
-    parents, proband's grandparents, proband's aunts/uncles
-    2) Randomly assigns pedigree founders (proband's grandparents)
-    cancer using probabilties from Antoniou et al 2004 Table 1
-    3) Randomly assigns pedigree founder mutations based on their cancer
-    status using probabilities from Antonious et al 2004 Table 2
-    4) Passes founder mutations from founder to each offspring with 50%
-    chance of passing mutation
-    5) Randomly assigns cancer to remaining individuals in pedigree
+    Each person still gets one uniform draw per year of age from 30 to
+    their current age, but the draws for a whole batch of people are made
+    as one array so the resulting cancer ages have the same distribution
+    as the scalar functions
     '''
-    pedigrees = []
-    x = 1
-    while x <= num_trials:
-        new_ped = CancerPedigree()
-        h_ped = new_ped.make_healthy_pedigree()
-        founder_ca = new_ped.get_founder_ca(h_ped)
-        founder_mutns = new_ped.get_founder_mutns(founder_ca)
-        founders = []
-        for person in founder_mutns:
-            if person[17] > 0:
-                founders.append(person)
-        if len(founders) > 0:
-            for person in founders:
-                pass_mutn = new_ped.pass_founder_mutn(person, founder_mutns)
-            ca_ped = new_ped.make_ca_pedigree(pass_mutn)
-            pedigrees.append(ca_ped)
-        else:
-            ca_ped = new_ped.make_ca_pedigree(founder_mutns)
-            pedigrees.append(ca_ped)
-        x += 1
-    new_sim = Pedigree()
-    w_ped = new_sim.write_pedigree(pedigrees)
-    return pedigrees
 
-#run_simulation(500)            
+    min_age = 30
+    max_age = MODEL.max_age
+    chunk_size = 65536
 
-def run_sim_fhx(num_trials):
-    '''
-    Runs simulation according to specifications given in run_simulation
-    but also produces a file with the summary family history for the
-    proband in each pedigree
+    def __init__(self, seed=None):
+        '''
+        seed: seed for the NumPy random generator, if None a seed is drawn
+        from the random module so runs seeded with random.seed repeat
+        '''
+        if np is None:
+            raise ImportError("NumPy is required for the vectorized "
+                              "cancer engine")
+        if seed is None:
+            seed = random.getrandbits(64)
+        self.rng = np.random.default_rng(seed)
+        self.br_hazard = self.make_hazard_table(MODEL.br_ca_prob)
+        self.ov_hazard = self.make_hazard_table(MODEL.ov_ca_prob)
 
-    Returns a list including all the pedigree information followed by
-    the summary family history information
-    '''
-    pedigrees = []
-    fam_hxs = []
-    x = 1
-    while x <= num_trials:
-        new_ped = CancerPedigree()
-        h_ped = new_ped.make_healthy_pedigree()
-        founder_ca = new_ped.get_founder_ca(h_ped)
-        founder_mutns = new_ped.get_founder_mutns(founder_ca)
-        founders = []
-        for person in founder_mutns:
-            if person[17] > 0:
-                founders.append(person)
-        if len(founders) > 0:
-            for person in founders:
-                pass_mutn = new_ped.pass_founder_mutn(person,
-                                                      founder_mutns)
-            ca_ped = new_ped.make_ca_pedigree(pass_mutn)
-            pedigrees.append(ca_ped)
-            fam_hx = new_ped.get_family_history(ca_ped)
-            fam_hxs.append(fam_hx)
-        else:
-            ca_ped = new_ped.make_ca_pedigree(founder_mutns)
-            pedigrees.append(ca_ped)
-            fam_hx = new_ped.get_family_history(ca_ped)
-            fam_hxs.append(fam_hx)
-        x += 1
-    new_sim = CancerPedigree()
-    w_ped = new_sim.write_pedigree(pedigrees)
-    w_fhx = new_sim.write_family_history(fam_hxs)
-    return [pedigrees, fam_hxs]
+    def make_hazard_table(self, ca_probs):
+        '''
+        ca_probs: yearly cancer probabilities by age from CancerModel for
+        mutation status 0 to 3
 
-#run_sim_fhx(5)
+        Returns an array with one row per mutation status and one column
+        per age holding the yearly probability of cancer, plus a final row
+        of zeros used for any other mutation status
+        '''
+        table = np.zeros((len(ca_probs) + 1, self.max_age + 1))
+        table[:-1] = ca_probs
+        return table
 
-def run_ca_sims(num_trials):
-    '''
-    Does the same thing as the function run simulation but only
-    returns pedigrees where at least one family member has a mutation
-    
-    Runs very slowly due to small probability of developing mutation
-    if an individual develops cancer
-    '''
-    pedigrees = []
-    x = 1
-    while x <= num_trials:
-        new_ped = CancerPedigree()
-        h_ped = new_ped.make_healthy_pedigree()
-        founder_ca = new_ped.get_founder_ca(h_ped)
-        founder_mutns = new_ped.get_founder_mutns(founder_ca)
-        founders = []
-        for person in founder_mutns:
-            if person[17] > 0:
-                founders.append(person)
-        if len(founders) > 0:
-            for person in founders:
-                pass_mutn = new_ped.pass_founder_mutn(person,
-                                                founder_mutns)
-            ca_ped = new_ped.make_ca_pedigree(pass_mutn)
-            pedigrees.append(ca_ped)
-            x += 1
-    new_sim = Pedigree()
-    w_ped = new_sim.write_pedigree(pedigrees)
-    return pedigrees
+    def get_mutn_rows(self, mutn):
+        '''Returns hazard table rows for an array of mutation statuses'''
+        rows = np.full(len(mutn), 4, dtype=np.int64)
+        for status in range(4):
+            rows[mutn == status] = status
+        return rows
 
-#run_ca_sims(5)
+    def sample_hits(self, hazard, mutn, age):
+        '''
+        hazard: hazard table from make_hazard_table
+        mutn: array of mutation statuses
+        age: array of current ages
 
-def run_ca_sim_fhx(num_trials):
-    '''
-    Runs simulations with same specifications in run_ca_sim but also
-    produces a file with the summary family history for the proband in
-    each pedigree
+        Returns a boolean array with one row per person and one column per
+        age starting at 30 that is True where the yearly draw gave cancer
+        '''
+        width = max(int(age.max()) - self.min_age + 1, 0) if len(age) else 0
+        if width == 0:
+            return np.zeros((len(age), 0), dtype=bool)
+        ages = np.arange(self.min_age, self.min_age + width)
+        rows = self.get_mutn_rows(mutn)
+        probs = hazard[rows][:, self.min_age:self.min_age + width]
+        chance = self.rng.random((len(age), width))
+        return (chance < probs) & (ages[None, :] <= age[:, None])
 
-    Return a list of the pedigrees followed by the family histories
-    '''
-    pedigrees = []
-    fam_hxs = []
-    x = 1
-    while x <= num_trials:
-        new_ped = CancerPedigree()
-        h_ped = new_ped.make_healthy_pedigree()
-        founder_ca = new_ped.get_founder_ca(h_ped)
-        founder_mutns = new_ped.get_founder_mutns(founder_ca)
-        founders = []
-        for person in founder_mutns:
-            if person[17] > 0:
-                founders.append(person)
-        if len(founders) > 0:
-            for person in founders:
-                pass_mutn = new_ped.pass_founder_mutn(person,
-                                                      founder_mutns)
-            ca_ped = new_ped.make_ca_pedigree(pass_mutn)
-            pedigrees.append(ca_ped)
-            fam_hx = new_ped.get_family_history(ca_ped)
-            fam_hxs.append(fam_hx)
-            x += 1
-    new_sim = CancerPedigree()
-    w_ped = new_sim.write_pedigree(pedigrees)
-    w_fhx = new_sim.write_family_history(fam_hxs)
-    return [pedigrees, fam_hxs]
+    def last_hit_age(self, hits):
+        '''
+        Returns the age of the last yearly draw that gave cancer for each
+        row of hits or 0 if there was none, matching the scalar loops which
+        overwrite the cancer age on every successful draw
+        '''
+        if hits.shape[1] == 0:
+            return np.zeros(hits.shape[0], dtype=np.int64)
+        last = hits.shape[1] - 1 - np.argmax(hits[:, ::-1], axis=1)
+        return np.where(hits.any(axis=1), last + self.min_age, 0)
 
-#run_ca_sim_fhx(5)
+    def br_cancer_ages(self, mutn, female, age, br_ca1, br_ca2):
+        '''
+        mutn: array of mutation statuses
+        female: boolean array, True for women
+        age: array of current ages
+        br_ca1: array of current ages at 1st breast cancer, 0 = unaffected
+        br_ca2: array of current ages at 2nd breast cancer, 0 = unaffected
+
+        Returns arrays of updated ages at 1st and 2nd breast cancer for
+        each person following the same rules as get_br_cancer
+        '''
+        mutn = np.asarray(mutn)
+        female = np.asarray(female, dtype=bool)
+        age = np.asarray(age, dtype=np.int64)
+        new_ca1 = np.array(br_ca1, dtype=np.int64)
+        new_ca2 = np.array(br_ca2, dtype=np.int64)
+        for start in range(0, len(age), self.chunk_size):
+            stop = start + self.chunk_size
+            chunk = np.nonzero(female[start:stop])[0] + start
+            if len(chunk) == 0:
+                continue
+            ca1 = new_ca1[chunk]
+            ca2 = new_ca2[chunk]
+            hits = self.sample_hits(self.br_hazard, mutn[chunk], age[chunk])
+            last = self.last_hit_age(hits)
+            first_ca = ca1 == 0
+            ca1_out = np.where(first_ca & (last > 0), last, ca1)
+            ca2_out = ca2.copy()
+            second_ca = (ca1 > 0) & (ca2 == 0)
+            if second_ca.any():
+                ages = np.arange(self.min_age, self.min_age + hits.shape[1])
+                below = self.last_hit_age(hits & (ages[None, :] <
+                                                  ca1[:, None]))
+                later = second_ca & (last >= ca1)
+                earlier = second_ca & (last > 0) & (last < ca1)
+                ca2_out[later] = last[later]
+                ca1_out[later] = np.where(below[later] > 0, below[later],
+                                          ca1[later])
+                ca2_out[earlier] = ca1[earlier]
+                ca1_out[earlier] = last[earlier]
+            new_ca1[chunk] = ca1_out
+            new_ca2[chunk] = ca2_out
+        new_ca1[~female] = 0
+        new_ca2[~female] = 0
+        return new_ca1, new_ca2
+
+    def ov_cancer_ages(self, mutn, female, age, ov_ca):
+        '''
+        mutn: array of mutation statuses
+        female: boolean array, True for women
+        age: array of current ages
+        ov_ca: array of current ages at ovarian cancer, 0 = unaffected
+
+        Returns an array of updated ages at ovarian cancer for each person
+        following the same rules as get_ov_cancer
+        '''
+        mutn = np.asarray(mutn)
+        female = np.asarray(female, dtype=bool)
+        age = np.asarray(age, dtype=np.int64)
+        new_ov = np.array(ov_ca, dtype=np.int64)
+        for start in range(0, len(age), self.chunk_size):
+            stop = start + self.chunk_size
+            chunk = np.nonzero(female[start:stop] &
+                               (new_ov[start:stop] == 0))[0] + start
+            if len(chunk) == 0:
+                continue
+            hits = self.sample_hits(self.ov_hazard, mutn[chunk], age[chunk])
+            new_ov[chunk] = self.last_hit_age(hits)
+        new_ov[~female] = 0
+        return new_ov
+
+    def get_cancer(self, people):
+        '''
+        people: list of Person objects for each individual as in the
+        make_healthy_pedigree function
+
+        Randomly assigns breast and then ovarian cancer to every person in
+        people at once and returns people with updated cancer ages, the
+        equivalent of calling get_br_cancer and get_ov_cancer on each
+        '''
+        if len(people) == 0:
+            return people
+        mutn = np.array([person.mutn if person.mutn in (0, 1, 2, 3) else -1
+                         for person in people])
+        female = np.array([person.sex != MALE for person in people])
+        age = np.array([person.age for person in people])
+        br_ca1 = np.array([person.br_ca1 for person in people])
+        br_ca2 = np.array([person.br_ca2 for person in people])
+        ov_ca = np.array([person.ov_ca for person in people])
+        br_ca1, br_ca2 = self.br_cancer_ages(mutn, female, age, br_ca1,
+                                             br_ca2)
+        ov_ca = self.ov_cancer_ages(mutn, female, age, ov_ca)
+        br_ca1 = br_ca1.tolist()
+        br_ca2 = br_ca2.tolist()
+        ov_ca = ov_ca.tolist()
+        for index, person in enumerate(people):
+            person.br_ca1 = br_ca1[index]
+            person.br_ca2 = br_ca2[index]
+            person.ov_ca = ov_ca[index]
+        return people
+
+    def get_batch_cancer(self, batch, rows=None):
+        '''
+        batch: PedigreeBatch
+        rows: array of rows of batch to assign cancer to, all rows if None
+
+        Randomly assigns breast and then ovarian cancer to the given rows
+        of batch in place and returns batch
+        '''
+        if rows is None:
+            rows = np.arange(batch.num_people())
+        mutn = batch.mutn[rows]
+        female = batch.sex[rows] != MALE
+        age = batch.age[rows]
+        br_ca1, br_ca2 = self.br_cancer_ages(mutn, female, age,
+                                             batch.br_ca1[rows],
+                                             batch.br_ca2[rows])
+        ov_ca = self.ov_cancer_ages(mutn, female, age, batch.ov_ca[rows])
+        batch.br_ca1[rows] = br_ca1
+        batch.br_ca2[rows] = br_ca2
+        batch.ov_ca[rows] = ov_ca
+        return batch
+
+    def cancer_mutations(self, mutn_probs, ca_age, mutn, g_test):
+        '''
+        mutn_probs: BRCA1 and BRCA2 mutation probabilities by age from
+            CancerModel, MODEL.br_mutn_prob or MODEL.ov_mutn_prob
+        ca_age: array of ages at breast or ovarian cancer, 0 = unaffected
+        mutn: array of Mutn codes
+        g_test: array of G Test codes
+
+        Returns arrays of updated Mutn and G Test codes after one BRCA1 and
+        one BRCA2 draw for each person with cancer, following the same
+        rules as get_mutn_br and get_mutn_ov: a new mutation is added to
+        the combined status 0/1/2/3 and anyone with cancer whose status
+        changes, or is 3, gets the "T" G Test
+        '''
+        probs = np.asarray(mutn_probs)[:, np.minimum(ca_age, MODEL.max_age)]
+        brca1 = self.rng.random(len(ca_age)) < probs[0]
+        brca2 = self.rng.random(len(ca_age)) < probs[1]
+        new_mutn = mutn | np.where(brca1, 1, 0) | np.where(brca2, 2, 0)
+        new_mutn = np.where((mutn >= 0) & (mutn <= 3), new_mutn, 3)
+        affected = ca_age > 0
+        new_mutn = np.where(affected, new_mutn, mutn)
+        tested = affected & (new_mutn > 0) & ((new_mutn != mutn) |
+                                              ((mutn != 1) & (mutn != 2)))
+        return new_mutn, np.where(tested, DIRECT_TEST, g_test)
+
+    def get_batch_founder_mutns(self, batch, rows):
+        '''
+        batch: PedigreeBatch with cancer assigned to the founders
+        rows: array of the founder rows of batch
+
+        Randomly assigns mutations to the female founders in rows in place
+        from their breast and then ovarian cancer ages, the equivalent of
+        get_founder_mutns, and returns batch
+        '''
+        rows = rows[batch.sex[rows] == FEMALE]
+        mutn = batch.mutn[rows].astype(np.int64)
+        g_test = batch.g_test[rows]
+        mutn, g_test = self.cancer_mutations(MODEL.br_mutn_prob,
+                                             batch.br_ca1[rows], mutn,
+                                             g_test)
+        mutn, g_test = self.cancer_mutations(MODEL.ov_mutn_prob,
+                                             batch.ov_ca[rows], mutn, g_test)
+        batch.mutn[rows] = mutn
+        batch.g_test[rows] = g_test
+        return batch
+
+    def pass_batch_founder_mutns(self, batch, all_generations=False):
+        '''
+        batch: PedigreeBatch with mutations assigned to the founders
+
+        Passes the mutation of every founder with one to each of their
+        children in place with a 50% chance for each child, the equivalent
+        of pass_founder_mutn for every founder, with one draw per founder
+        and child for the whole batch. A child who gets a mutation has it
+        added to their combined status 0/1/2/3 and gets the "T" G Test. If
+        all_generations is True the children who get a mutation pass it on
+        in the same way down every generation, as pass_founder_mutn does
+        for pedigrees made with generations: each founder's mutation is
+        followed on its own, so a person carrying mutations from two
+        founders passes each of them with its own 50% chance
+
+        Returns batch
+        '''
+        if batch.num_people() == 0:
+            return batch
+        fath_row, moth_row = batch.parent_rows()
+        if ((batch.fath_id != 0) & (fath_row < 0)).any() or \
+           ((batch.moth_id != 0) & (moth_row < 0)).any():
+            raise ValueError("Pedigree has a parent ID that is not in the "
+                             "family")
+        mutn = batch.mutn.astype(np.int64)
+        rows = np.arange(len(mutn))
+        #the children of each row, grouped by parent row
+        has_fath = fath_row >= 0
+        has_moth = moth_row >= 0
+        parent = np.concatenate([fath_row[has_fath], moth_row[has_moth]])
+        child = np.concatenate([rows[has_fath], rows[has_moth]])
+        child = child[np.argsort(parent, kind="stable")]
+        num_children = np.bincount(parent, minlength=len(mutn))
+        child_start = np.cumsum(num_children) - num_children
+        #one entry per founder mutation and person carrying it
+        carriers = np.flatnonzero((fath_row < 0) & (moth_row < 0) &
+                                  (mutn > 0))
+        carried = mutn[carriers]
+        while len(carriers) > 0:
+            counts = num_children[carriers]
+            total = int(counts.sum())
+            first = np.cumsum(counts) - counts
+            positions = np.arange(total) + \
+                np.repeat(child_start[carriers] - first, counts)
+            carriers = child[positions]
+            carried = np.repeat(carried, counts)
+            passed = self.rng.random(total) < 0.5
+            carriers = carriers[passed]
+            carried = carried[passed]
+            np.bitwise_or.at(mutn, carriers, carried)
+            batch.g_test[carriers] = DIRECT_TEST
+            if not all_generations:
+                break
+        batch.mutn[:] = mutn
+        return batch
+
+    def iter_ca_pedigrees(self, num_trials, block_size=10000):
+        '''
+        Produces the pedigrees of run_simulation with cancer assigned to
+        blocks of pedigrees at once instead of person by person
+
+        Yields the pedigree instance and the pedigree for each family, at
+        most block_size pedigrees are held at once
+        '''
+        made = 0
+        while made < num_trials:
+            block = []
+            for x in range(min(block_size, num_trials - made)):
+                new_ped = CancerPedigree()
+                block.append((new_ped, new_ped.make_healthy_pedigree()))
+            self.get_cancer([person for new_ped, h_ped in block
+                             for person in h_ped[:4]])
+            for new_ped, h_ped in block:
+                founder_mutns = new_ped.get_founder_mutns(h_ped)
+                for person in founder_mutns[:4]:
+                    if person.mutn > 0:
+                        new_ped.pass_founder_mutn(person, founder_mutns)
+            self.get_cancer([person for new_ped, h_ped in block
+                             for person in h_ped[4:] if person.sex == FEMALE])
+            for new_ped, h_ped in block:
+                yield new_ped, h_ped
+            made += len(block)
+
+    def make_ca_pedigrees(self, num_trials, block_size=10000):
+        '''
+        Returns a list of num_trials pedigrees from iter_ca_pedigrees in
+        the format used in the make_healthy_pedigree function
+        '''
+        pedigrees = []
+        for new_ped, ca_ped in self.iter_ca_pedigrees(num_trials,
+                                                      block_size):
+            pedigrees.append(ca_ped)
+        return pedigrees
+
+    def iter_ca_batches(self, num_trials, block_size=10000):
+        '''
+        Produces the pedigrees of run_simulation as PedigreeBatch blocks of
+        at most block_size families made entirely with arrays: the
+        structure from PedigreeStructureEngine, then founder cancer,
+        founder mutations, passing the founder mutations to their children
+        and cancer for the women who are not founders, each for the whole
+        block at once
+
+        Yields each PedigreeBatch
+        '''
+        structure = PedigreeStructureEngine(self.rng)
+        made = 0
+        while made < num_trials:
+            batch = structure.make_healthy_batch(min(block_size,
+                                                     num_trials - made))
+            founders = (batch.fath_id == 0) & (batch.moth_id == 0)
+            founder_rows = np.flatnonzero(founders)
+            self.get_batch_cancer(batch, founder_rows)
+            self.get_batch_founder_mutns(batch, founder_rows)
+            self.pass_batch_founder_mutns(batch)
+            self.get_batch_cancer(batch, np.flatnonzero(
+                ~founders & (batch.sex == FEMALE)))
+            yield batch
+            made += len(batch)
+
+##to debug VectorizedCancerEngine
+#engine = VectorizedCancerEngine()
+#new_fam = CancerPedigree()
+#people = [new_fam.init_proband() for x in range(10)]
+#for person in engine.get_cancer(people):
+#    print(person)
+
+
+class InverseCdfCancerPedigree(CancerPedigree):
+    '''
+    Cancer pedigree that draws cancer ages from precomputed cumulative
+    risk tables instead of one Bernoulli trial per year of age
+
+    The yearly incidences from Table 1 in Antoniou et al 2004 are constant
+    within the 30/40/50/60/70 age bands, so the age of the last yearly
+    trial that gives cancer can be found with one uniform draw and a
+    binary search of the cumulative hazard for the person's mutation
+    status. The ages have the same distribution as those from
+    get_br_cancer and get_ov_cancer in CancerPedigree
+    '''
+
+    max_age = MODEL.max_age
+    br_cum_hazard = MODEL.br_cum_hazard
+    ov_cum_hazard = MODEL.ov_cum_hazard
+
+    def sample_onset(self, cum_hazard, st_age, end_age):
+        '''
+        cum_hazard: tuple of cumulative hazards from CancerModel
+        st_age: first age of the yearly trials
+        end_age: last age of the yearly trials
+
+        Returns the last age from st_age to end_age at which a yearly
+        trial gives cancer, or 0 if none do, using one uniform draw
+        '''
+        st_age = max(st_age, 30)
+        end_age = min(end_age, self.max_age)
+        if end_age < st_age:
+            return 0
+        chance = 1 - random.random()
+        target = cum_hazard[end_age] + math.log(chance)
+        ca_age = bisect.bisect_left(cum_hazard, target, st_age - 1, end_age)
+        if ca_age < st_age:
+            return 0
+        return ca_age
+
+    def get_br_cancer(self, person):
+        '''
+        Randomly determines whether a person gets breast cancer as in
+        CancerPedigree.get_br_cancer but with one draw for the 1st breast
+        cancer and a second draw for the 2nd breast cancer
+
+        Returns person information with age of 1st breast cancer
+        diagnosis and age of 2nd breast cancer diagnosis if person does
+        randomly gets breast cancer
+        '''
+        sex = person.sex
+        st_age = person.age
+        br_ca1_status = person.br_ca1
+        br_ca2_status = person.br_ca2
+        mutn_status = person.mutn
+        if sex == MALE:
+            person.br_ca1 = 0
+            person.br_ca2 = 0
+            return person
+        if mutn_status not in (0, 1, 2, 3):
+            return person
+        cum_hazard = self.br_cum_hazard[mutn_status]
+        ca_age = self.sample_onset(cum_hazard, 30, st_age)
+        if br_ca1_status == 0:
+            if ca_age > 0:
+                person.br_ca1 = ca_age
+        elif br_ca2_status == 0:
+            if ca_age >= br_ca1_status:
+                person.br_ca2 = ca_age
+                first_age = self.sample_onset(cum_hazard, 30,
+                                              br_ca1_status - 1)
+                if first_age > 0:
+                    person.br_ca1 = first_age
+            elif ca_age > 0:
+                person.br_ca2 = br_ca1_status
+                person.br_ca1 = ca_age
+        return person
+
+    def get_ov_cancer(self, person):
+        '''
+        Randomly determines whether a person gets ovarian cancer as in
+        CancerPedigree.get_ov_cancer but with one draw
+
+        Returns person information with age of ovarian cancer included
+        if person gets ovarian cancer
+        '''
+        sex = person.sex
+        st_age = person.age
+        ov_ca_status = person.ov_ca
+        mutn_status = person.mutn
+        if sex == MALE:
+            person.ov_ca = 0
+            return person
+        if mutn_status in (0, 1, 2, 3) and ov_ca_status == 0:
+            cum_hazard = self.ov_cum_hazard[mutn_status]
+            person.ov_ca = self.sample_onset(cum_hazard, 30, st_age)
+        return person
+
+def onset_probs(cum_hazard, age):
+    '''
+    cum_hazard: tuple of cumulative hazards from CancerModel
+    age: current age
+
+    Returns a list of the possible cancer ages from the yearly trials of
+    get_br_cancer or get_ov_cancer for a person of that age, 0 for no
+    cancer, and a list of their probabilities
+    '''
+    ca_ages = [0]
+    probs = [math.exp(-cum_hazard[age])]
+    for ca_age in range(30, age + 1):
+        ca_ages.append(ca_age)
+        probs.append(math.exp(cum_hazard[ca_age] - cum_hazard[age]) -
+                     math.exp(cum_hazard[ca_age - 1] - cum_hazard[age]))
+    return ca_ages, probs
+
+def sample_discrete(values, weights):
+    '''
+    Returns one of values drawn with probability proportional to the
+    matching weight with one uniform draw
+    '''
+    cum_weights = []
+    total = 0.0
+    for weight in weights:
+        total += weight
+        cum_weights.append(total)
+    index = bisect.bisect_right(cum_weights, random.random()*total)
+    return values[min(index, len(values) - 1)]
+
+class CarrierFounderSampler(object):
+    '''
+    Assigns cancer and mutations to the founders of a pedigree directly
+    from their distribution given that at least one founder has a
+    mutation, instead of repeating get_founder_ca and get_founder_mutns
+    until a founder has one as in run_ca_sims
+
+    A female founder gets no mutation from her breast cancer at age a with
+    probability r(a) = (1 - BRCA1 prob)(1 - BRCA2 prob) from Table 2 in
+    Antoniou et al 2004 and none from her ovarian cancer at age b with
+    probability s(b), so she is a carrier with probability
+    q = 1 - E[r]E[s]. The carrier status of the female founders is drawn
+    given at least one carrier, then each founder's cancer ages and
+    mutations are drawn given her carrier status. The pedigrees have the
+    same distribution as those kept by the rejection loop
+    '''
+
+    br_cum_hazard = MODEL.br_cum_hazard[0]
+    ov_cum_hazard = MODEL.ov_cum_hazard[0]
+
+    def __init__(self):
+        '''Initializes the cache of founder tables for each age'''
+        self.age_tables = {}
+
+    def mutn_probs(self, mutn_prob, ca_age):
+        '''
+        mutn_prob: BRCA1 and BRCA2 probabilities by age from CancerModel
+
+        Returns the BRCA1 and BRCA2 probabilities for a cancer age, 0 for
+        no cancer
+        '''
+        if ca_age == 0:
+            return 0.0, 0.0
+        ca_age = min(ca_age, MODEL.max_age)
+        return mutn_prob[0][ca_age], mutn_prob[1][ca_age]
+
+    def get_age_tables(self, age):
+        '''
+        Returns a dictionary of the distributions of breast and ovarian
+        cancer ages of a female founder of a given age, the probabilities
+        r and s of no mutation from each cancer and her probability q of
+        being a carrier
+        '''
+        if age in self.age_tables:
+            return self.age_tables[age]
+        br_ages, br_probs = onset_probs(self.br_cum_hazard, age)
+        ov_ages, ov_probs = onset_probs(self.ov_cum_hazard, age)
+        br_none = []
+        for ca_age in br_ages:
+            brca1, brca2 = self.mutn_probs(MODEL.br_mutn_prob, ca_age)
+            br_none.append((1 - brca1)*(1 - brca2))
+        ov_none = []
+        for ca_age in ov_ages:
+            brca1, brca2 = self.mutn_probs(MODEL.ov_mutn_prob, ca_age)
+            ov_none.append((1 - brca1)*(1 - brca2))
+        tables = {"br_ages": br_ages, "ov_ages": ov_ages,
+                  "br_probs": br_probs, "ov_probs": ov_probs,
+                  "br_none": [br_probs[i]*br_none[i] for i in
+                              range(len(br_ages))],
+                  "br_mutn": [br_probs[i]*(1 - br_none[i]) for i in
+                              range(len(br_ages))],
+                  "ov_none": [ov_probs[i]*ov_none[i] for i in
+                              range(len(ov_ages))],
+                  "ov_mutn": [ov_probs[i]*(1 - ov_none[i]) for i in
+                              range(len(ov_ages))]}
+        tables["e_r"] = sum(tables["br_none"])
+        tables["e_s"] = sum(tables["ov_none"])
+        tables["carrier"] = 1 - tables["e_r"]*tables["e_s"]
+        self.age_tables[age] = tables
+        return tables
+
+    def sample_mutns(self, brca1, brca2, at_least_one):
+        '''
+        brca1, brca2: probabilities of a BRCA1 and a BRCA2 mutation
+
+        Returns whether there is a BRCA1 and a BRCA2 mutation, given that
+        there is at least one if at_least_one is True
+        '''
+        if at_least_one:
+            has_brca1 = random.random()*(1 - (1 - brca1)*(1 - brca2)) < brca1
+            if has_brca1:
+                has_brca2 = random.random() < brca2
+            else:
+                has_brca2 = True
+        else:
+            has_brca1 = random.random() < brca1
+            has_brca2 = random.random() < brca2
+        return has_brca1, has_brca2
+
+    def sample_founder(self, person, carrier):
+        '''
+        Randomly assigns breast and ovarian cancer ages and mutations to a
+        female founder given whether she is a carrier
+
+        Returns person information with updated cancer ages, mutation
+        status and G test
+        '''
+        tables = self.get_age_tables(person.age)
+        br_mutn = False
+        ov_mutn = False
+        if carrier:
+            w_br = 1 - tables["e_r"]
+            w_ov = tables["e_r"]*(1 - tables["e_s"])
+            if random.random()*(w_br + w_ov) < w_br:
+                br_mutn = True
+            else:
+                ov_mutn = True
+        if br_mutn:
+            br_age = sample_discrete(tables["br_ages"], tables["br_mutn"])
+            ov_age = sample_discrete(tables["ov_ages"], tables["ov_probs"])
+        else:
+            br_age = sample_discrete(tables["br_ages"], tables["br_none"])
+            if ov_mutn:
+                ov_age = sample_discrete(tables["ov_ages"],
+                                         tables["ov_mutn"])
+            else:
+                ov_age = sample_discrete(tables["ov_ages"],
+                                         tables["ov_none"])
+        brca1 = False
+        brca2 = False
+        if br_mutn:
+            probs = self.mutn_probs(MODEL.br_mutn_prob, br_age)
+            brca1, brca2 = self.sample_mutns(probs[0], probs[1], True)
+        if carrier and ov_age > 0:
+            probs = self.mutn_probs(MODEL.ov_mutn_prob, ov_age)
+            ov_brca1, ov_brca2 = self.sample_mutns(probs[0], probs[1],
+                                                   ov_mutn)
+            brca1 = brca1 or ov_brca1
+            brca2 = brca2 or ov_brca2
+        person.br_ca1 = br_age
+        person.ov_ca = ov_age
+        if brca1 and brca2:
+            person.mutn = 3
+        elif brca1:
+            person.mutn = 1
+        elif brca2:
+            person.mutn = 2
+        if person.mutn > 0:
+            person.g_test = DIRECT_TEST
+        return person
+
+    def get_carrier_founders(self, new_ped, pedigree):
+        '''
+        new_ped: pedigree instance used for the male founders
+        pedigree: pedigree from make_healthy_pedigree
+
+        Randomly assigns cancer and mutations to the four founders as
+        get_founder_ca and get_founder_mutns would, given that at least one
+        female founder has a mutation
+
+        Returns the pedigree with updated information for the founders
+        '''
+        founders = pedigree[:new_ped.num_founders]
+        women = []
+        for founder in founders:
+            if founder.sex == FEMALE:
+                women.append(founder)
+            else:
+                br_ca = new_ped.get_br_cancer(founder)
+                new_ped.get_ov_cancer(br_ca)
+                new_ped.add_history(founder)
+        if len(women) == 0:
+            raise ValueError("Pedigree has no female founders to carry a "
+                             "mutation")
+        carrier_probs = []
+        for founder in women:
+            carrier_probs.append(self.get_age_tables(founder.age)["carrier"])
+        has_carrier = False
+        for index in range(len(women)):
+            carrier_prob = carrier_probs[index]
+            if not has_carrier:
+                none_left = 1.0
+                for prob in carrier_probs[index:]:
+                    none_left *= 1 - prob
+                carrier_prob = carrier_prob/(1 - none_left)
+            carrier = random.random() < carrier_prob
+            has_carrier = has_carrier or carrier
+            new_ped.add_history(self.sample_founder(women[index], carrier))
+        return pedigree
+
+##to debug CarrierFounderSampler
+#new_ped = CancerPedigree()
+#sampler = CarrierFounderSampler()
+#h_ped = new_ped.make_healthy_pedigree()
+#for person in sampler.get_carrier_founders(new_ped, h_ped)[:4]:
+#    print(person)
+
+def compare_onset_samplers(num_people=100000, ages=(45, 70, 91),
+                           br_ca1=(0, 55)):
+    '''
+    Statistical equivalence test of the cancer ages from
+    InverseCdfCancerPedigree against the yearly loops of CancerPedigree
+
+    For every mutation status 0 to 3, age in ages and starting age of 1st
+    breast cancer in br_ca1, draws num_people women with each sampler and
+    compares the distributions of 1st breast cancer, 2nd breast cancer and
+    ovarian cancer ages with a two sample chi-square test
+
+    Returns a list of lists in the format:
+    [Mutn, Age, BrCa_1 before sampling, column, chi-square, degrees of
+    freedom, p-value]
+    '''
+    family_id = Pedigree.family_id
+    ind_id = Pedigree.ind_id
+    loop_ped = CancerPedigree()
+    icdf_ped = InverseCdfCancerPedigree()
+    Pedigree.family_id = family_id
+    Pedigree.ind_id = ind_id
+    results = []
+    for mutn in range(4):
+        for age in ages:
+            for br_ca1_age in br_ca1:
+                counts = []
+                for new_ped in [loop_ped, icdf_ped]:
+                    ca_counts = {11:{}, 12:{}, 13:{}}
+                    for x in range(num_people):
+                        person = Person(sex=FEMALE, age=age,
+                                        br_ca1=br_ca1_age, mutn=mutn)
+                        br_ca = new_ped.get_br_cancer(person)
+                        ov_ca = new_ped.get_ov_cancer(br_ca)
+                        for column in ca_counts:
+                            ca_age = ov_ca[column]
+                            ca_counts[column][ca_age] = \
+                                ca_counts[column].get(ca_age, 0) + 1
+                    counts.append(ca_counts)
+                for column in [11, 12, 13]:
+                    chi_sq, dof = chi_square_two_sample(counts[0][column],
+                                                        counts[1][column])
+                    p_value = chi_square_p_value(chi_sq, dof)
+                    results.append([mutn, age, br_ca1_age, column, chi_sq,
+                                    dof, p_value])
+    return results
+
+def chi_square_two_sample(counts1, counts2, min_count=10):
+    '''
+    counts1, counts2: dictionaries of counts for each value of two samples
+
+    Returns the two sample chi-square statistic and its degrees of
+    freedom, pooling values seen fewer than min_count times in total
+    '''
+    total1 = sum(counts1.values())
+    total2 = sum(counts2.values())
+    bins = []
+    pooled = [0, 0]
+    for value in set(counts1) | set(counts2):
+        count1 = counts1.get(value, 0)
+        count2 = counts2.get(value, 0)
+        if count1 + count2 < min_count:
+            pooled[0] += count1
+            pooled[1] += count2
+        else:
+            bins.append([count1, count2])
+    if sum(pooled) > 0:
+        bins.append(pooled)
+    ratio = math.sqrt(float(total2)/total1)
+    chi_sq = 0.0
+    for count1, count2 in bins:
+        chi_sq += (count1*ratio - count2/ratio)**2/(count1 + count2)
+    return chi_sq, len(bins) - 1
+
+def chi_square_p_value(chi_sq, dof):
+    '''
+    Returns the upper tail probability of a chi-square statistic using the
+    Wilson-Hilferty normal approximation, 1 when there are no degrees of
+    freedom
+    '''
+    if dof <= 0:
+        return 1.0
+    scale = 2.0/(9*dof)
+    z = ((chi_sq/dof)**(1.0/3) - (1 - scale))/math.sqrt(scale)
+    return 0.5*math.erfc(z/math.sqrt(2))
+
+##to debug compare_onset_samplers
+#for result in compare_onset_samplers(20000):
+#    print(result)
+
+#exact family history
+#family history counts of the distribution keys
+HISTORY_COLUMNS = ["br_ca_ls", "br_ca_gr", "ov_ca", "m2_br_ca", "p2_br_ca",
+                   "m2_ov_ca", "p2_ov_ca"]
+#while computing a distribution the number of female founders with a
+#mutation and the counts in HISTORY_COLUMNS are packed into one integer key
+#with COUNT_BITS bits each, so adding two keys adds every count at once. No
+#count can be more than 5 (a parent and 4 siblings or a grandmother and 4
+#aunts)
+COUNT_BITS = 4
+
+def count_key(counts):
+    '''Returns the integer key of a list of counts'''
+    key = 0
+    for index, count in enumerate(counts):
+        key += count << (COUNT_BITS*index)
+    return key
+
+def key_counts(key, length=8):
+    '''Returns the list of counts of an integer key'''
+    mask = (1 << COUNT_BITS) - 1
+    return [(key >> (COUNT_BITS*index)) & mask for index in range(length)]
+
+def convolve_counts(dist1, dist2, min_prob=0.0):
+    '''
+    dist1, dist2: dictionaries of probabilities key = integer key of counts
+
+    Returns the distribution of the sum of the counts of two independent
+    distributions, leaving out pairs with a probability under min_prob
+    '''
+    result = {}
+    get = result.get
+    for key1, prob1 in dist1.items():
+        if prob1 < min_prob:
+            continue
+        for key2, prob2 in dist2.items():
+            prob = prob1*prob2
+            if prob >= min_prob:
+                key = key1 + key2
+                result[key] = get(key, 0.0) + prob
+    return result
+
+def mix_counts(dists):
+    '''
+    dists: list of [weight, distribution] pairs
+
+    Returns the mixture of the distributions with the given weights
+    '''
+    result = {}
+    for weight, dist in dists:
+        for key, prob in dist.items():
+            result[key] = result.get(key, 0.0) + weight*prob
+    return result
+
+class FamilyHistoryDistribution(object):
+    '''
+    Exact distribution of the family history from get_family_history,
+    computed from the same pedigree structure and cancer model as the
+    simulations instead of by simulating pedigrees
+
+    Given the proband's age, the siblings, the mother's side and the
+    father's side of the pedigree are independent. Each side is summed
+    over the parent's age, the grandmother's age, her cancer and the
+    mutation it gives her from Table 2, and the 50% chance of each of her
+    children getting it. Each relative's breast and ovarian cancer
+    probabilities are exact sums over the yearly trials of get_br_cancer
+    and get_ov_cancer. Only women count towards the family history, since
+    men never have cancer in the simulation
+
+    Combinations of relatives less likely than min_prob are left out when
+    the three parts are combined, which removes most of the rare family
+    histories from the work. The probability left out is kept in missing
+    '''
+
+    groups = {"first": (1, 2, 3), "maternal": (4, 4, 6),
+              "paternal": (5, 5, 7)}
+
+    def __init__(self, min_prob=1e-20):
+        '''Initializes the caches of each person and side distribution'''
+        self.min_prob = min_prob
+        self.missing = 0.0
+        self.people = {}
+        self.founders = {}
+        self.sides = {}
+
+    def relative_ages(self, age, low, high):
+        '''
+        Returns a list of [age, probability] for a relative whose age is
+        drawn uniformly from age + low to age + high, with ages over 90
+        set to 91 as in add_parents and add_siblings
+        '''
+        ages = {}
+        weight = 1.0/(high - low + 1)
+        for rel_age in range(age + low, age + high + 1):
+            if rel_age > 90:
+                rel_age = 91
+            ages[rel_age] = ages.get(rel_age, 0.0) + weight
+        return sorted(ages.items())
+
+    def person_history(self, mutn, age, group):
+        '''
+        Returns the distribution of the family history counts added by a
+        woman with mutation status mutn and age who is a relative in group
+        "first", "maternal" or "paternal" once make_ca_pedigree gives her
+        cancer
+        '''
+        cache_key = (mutn, age, group)
+        if cache_key in self.people:
+            return self.people[cache_key]
+        br_cum_hazard = MODEL.br_cum_hazard[mutn]
+        ov_cum_hazard = MODEL.ov_cum_hazard[mutn]
+        no_br = math.exp(-br_cum_hazard[age])
+        if age >= 50:
+            br_gr = 1 - math.exp(br_cum_hazard[49] - br_cum_hazard[age])
+        else:
+            br_gr = 0.0
+        br_probs = [no_br, 1 - no_br - br_gr, br_gr]
+        no_ov = math.exp(-ov_cum_hazard[age])
+        ls_column, gr_column, ov_column = self.groups[group]
+        dist = {}
+        for br_cat in range(3):
+            for ov_flag in range(2):
+                key = [0]*8
+                if br_cat > 0:
+                    if br_cat == 1:
+                        key[ls_column] += 1
+                    else:
+                        key[gr_column] += 1
+                key[ov_column] += ov_flag
+                key = count_key(key)
+                if ov_flag:
+                    prob = br_probs[br_cat]*(1 - no_ov)
+                else:
+                    prob = br_probs[br_cat]*no_ov
+                dist[key] = dist.get(key, 0.0) + prob
+        self.people[cache_key] = dist
+        return dist
+
+    def founder_history(self, age):
+        '''
+        Returns a dictionary of the probability of each [mutation status,
+        breast cancer, ovarian cancer] for a female founder of a given age
+        after get_founder_ca and get_founder_mutns, with 1 for cancer and
+        0 for none
+        '''
+        if age in self.founders:
+            return self.founders[age]
+        br_ages, br_probs = onset_probs(MODEL.br_cum_hazard[0], age)
+        ov_ages, ov_probs = onset_probs(MODEL.ov_cum_hazard[0], age)
+        br_brca1, br_brca2 = MODEL.br_mutn_prob
+        ov_brca1, ov_brca2 = MODEL.ov_mutn_prob
+        dist = {}
+        for br_index in range(len(br_ages)):
+            br_age = br_ages[br_index]
+            if br_age > 0:
+                brca1_none = 1 - br_brca1[br_age]
+                brca2_none = 1 - br_brca2[br_age]
+            else:
+                brca1_none = 1.0
+                brca2_none = 1.0
+            for ov_index in range(len(ov_ages)):
+                ov_age = ov_ages[ov_index]
+                prob = br_probs[br_index]*ov_probs[ov_index]
+                if ov_age > 0:
+                    no_brca1 = brca1_none*(1 - ov_brca1[ov_age])
+                    no_brca2 = brca2_none*(1 - ov_brca2[ov_age])
+                else:
+                    no_brca1 = brca1_none
+                    no_brca2 = brca2_none
+                mutn_probs = [no_brca1*no_brca2, (1 - no_brca1)*no_brca2,
+                              no_brca1*(1 - no_brca2),
+                              (1 - no_brca1)*(1 - no_brca2)]
+                for mutn in range(4):
+                    key = (mutn, int(br_age > 0), int(ov_age > 0))
+                    dist[key] = dist.get(key, 0.0) + prob*mutn_probs[mutn]
+        self.founders[age] = dist
+        return dist
+
+    def child_history(self, mutn, age, group):
+        '''
+        Returns the distribution of the family history counts added by a
+        child of a female founder with mutation status mutn, who is male or
+        female with equal chance and gets the mutation with a 50% chance
+        '''
+        female = [[1.0, self.person_history(0, age, group)]]
+        if mutn > 0:
+            female = [[0.5, self.person_history(0, age, group)],
+                      [0.5, self.person_history(mutn, age, group)]]
+        return mix_counts([[0.5, {0: 1.0}]] +
+                          [[0.5*weight, dist] for weight, dist in female])
+
+    def sibling_history(self, age, low, high, group, child_history):
+        '''
+        Returns the distribution of the family history counts added by 0
+        to 4 siblings as in add_siblings, with ages from age + low to
+        age + high and each sibling's counts from child_history(age)
+        '''
+        sibling = mix_counts([[weight, child_history(sib_age)] for
+                              sib_age, weight in
+                              self.relative_ages(age, low, high)])
+        dists = []
+        dist = {0: 1.0}
+        for num_sibs in range(5):
+            dists.append([0.2, dist])
+            dist = convolve_counts(dist, sibling)
+        return mix_counts(dists)
+
+    def side_history(self, age, side):
+        '''
+        Returns the distribution of the family history counts added by the
+        grandparents, the parent and the aunts and uncles on the "maternal"
+        or "paternal" side given the parent's age. The first count is the
+        number of female founders with a mutation
+        '''
+        cache_key = (age, side)
+        if cache_key in self.sides:
+            return self.sides[cache_key]
+        founders = mix_counts([[weight, self.founder_history(gm_age)] for
+                               gm_age, weight in
+                               self.relative_ages(age, 20, 40)])
+        ls_column, gr_column, ov_column = self.groups[side]
+        dists = []
+        for mutn in range(4):
+            rest = self.sibling_history(age, -15, 15, side,
+                                        lambda sib_age:
+                                        self.child_history(mutn, sib_age,
+                                                           side))
+            if side == "maternal":
+                mother = self.person_history(0, age, "first")
+                if mutn > 0:
+                    mother = mix_counts([[0.5, mother],
+                                         [0.5, self.person_history(
+                                             mutn, age, "first")]])
+                rest = convolve_counts(rest, mother)
+            for founder_key, prob in founders.items():
+                if founder_key[0] != mutn:
+                    continue
+                key = [0]*8
+                key[0] = int(mutn > 0)
+                key[gr_column] += founder_key[1]
+                key[ov_column] += founder_key[2]
+                dists.append([prob, convolve_counts({count_key(key): 1.0},
+                                                    rest)])
+        dist = mix_counts(dists)
+        self.sides[cache_key] = dist
+        return dist
+
+    def distribution(self, carriers_only=False):
+        '''
+        Returns a dictionary of the probability of each family history from
+        get_family_history for pedigrees of run_sim_fhx, or of
+        run_ca_sim_fhx if carriers_only is True, key = tuple of the counts
+        in HISTORY_COLUMNS, and sets missing to the probability left out
+        '''
+        dists = []
+        for age in range(20, 66):
+            sibs = self.sibling_history(age, -15, 15, "first",
+                                        lambda sib_age:
+                                        self.child_history(0, sib_age,
+                                                           "first"))
+            for side in ["maternal", "paternal"]:
+                parent = mix_counts([[weight, self.side_history(par_age,
+                                                                side)]
+                                     for par_age, weight in
+                                     self.relative_ages(age, 20, 40)])
+                sibs = convolve_counts(sibs, parent, self.min_prob)
+            dists.append([1.0/46, sibs])
+        total = 0.0
+        result = {}
+        dist = mix_counts(dists)
+        self.missing = 1 - math.fsum(dist.values())
+        for key, prob in dist.items():
+            counts = key_counts(key)
+            if carriers_only and counts[0] == 0:
+                continue
+            key = tuple(counts[1:])
+            result[key] = result.get(key, 0.0) + prob
+            total += prob
+        for key in result:
+            result[key] /= total
+        return result
+
+def exact_family_history(carriers_only=False, min_prob=1e-20):
+    '''
+    Returns the exact distribution of the family histories of run_sim_fhx
+    (or run_ca_sim_fhx if carriers_only is True) from
+    FamilyHistoryDistribution, key = tuple of the counts in
+    HISTORY_COLUMNS, value = probability. min_prob=0 keeps every family
+    history
+    '''
+    return FamilyHistoryDistribution(min_prob).distribution(carriers_only)
+
+def family_history_probability(distribution, event):
+    '''
+    distribution: family history distribution from exact_family_history
+    event: function given a dictionary of counts key = column in
+        HISTORY_COLUMNS that returns True for the family histories wanted
+
+    Returns the probability of the event, for example
+    family_history_probability(dist, lambda fhx: fhx["br_ca_ls"] >= 2)
+    '''
+    total = 0.0
+    for key, prob in distribution.items():
+        if event(dict(zip(HISTORY_COLUMNS, key))):
+            total += prob
+    return total
+
+def compare_family_history(num_trials=100000, carriers_only=False,
+                           min_expected=10):
+    '''
+    Checks exact_family_history against num_trials simulated pedigrees
+    with a chi-square goodness of fit test of each column of
+    HISTORY_COLUMNS and of the joint family history, pooling values
+    expected fewer than min_expected times
+
+    Returns a list of lists in the format:
+    [column or "joint", chi-square, degrees of freedom, p-value]
+    '''
+    distribution = exact_family_history(carriers_only)
+    family_id = Pedigree.family_id
+    ind_id = Pedigree.ind_id
+    counts = {}
+    for ca_ped, fam_hx in iter_pedigrees(num_trials, carriers_only, True,
+                                         carrier_sampling="direct"):
+        key = tuple(fam_hx[3:10])
+        counts[key] = counts.get(key, 0) + 1
+    Pedigree.family_id = family_id
+    Pedigree.ind_id = ind_id
+    results = []
+    for index in range(len(HISTORY_COLUMNS) + 1):
+        observed = {}
+        expected = {}
+        for key, prob in distribution.items():
+            if index < len(HISTORY_COLUMNS):
+                key = key[index]
+            expected[key] = expected.get(key, 0.0) + prob*num_trials
+        for key, count in counts.items():
+            if index < len(HISTORY_COLUMNS):
+                key = key[index]
+            observed[key] = observed.get(key, 0) + count
+        chi_sq, dof = chi_square_goodness_of_fit(observed, expected,
+                                                 min_expected)
+        if index < len(HISTORY_COLUMNS):
+            column = HISTORY_COLUMNS[index]
+        else:
+            column = "joint"
+        results.append([column, chi_sq, dof,
+                        chi_square_p_value(chi_sq, dof)])
+    return results
+
+def chi_square_goodness_of_fit(observed, expected, min_expected=10):
+    '''
+    observed: dictionary of counts for each value
+    expected: dictionary of expected counts for each value
+
+    Returns the chi-square statistic and its degrees of freedom, pooling
+    values expected fewer than min_expected times
+    '''
+    bins = []
+    pooled = [0, 0.0]
+    for value in set(observed) | set(expected):
+        count = observed.get(value, 0)
+        mean = expected.get(value, 0.0)
+        if mean < min_expected:
+            pooled[0] += count
+            pooled[1] += mean
+        else:
+            bins.append([count, mean])
+    if pooled[1] > 0:
+        bins.append(pooled)
+    chi_sq = 0.0
+    for count, mean in bins:
+        chi_sq += (count - mean)**2/mean
+    return chi_sq, len(bins) - 1
+
+##to debug exact_family_history
+#dist = exact_family_history()
+#print(family_history_probability(dist, lambda fhx: fhx["br_ca_ls"] >= 2))
+#for result in compare_family_history(20000):
+#    print(result)
+
+class PedigreeBatch(object):
+    '''
+    Stores many pedigrees as one typed array per BOADICEA column instead
+    of one list per person
+
+    Columns are in the order of the person lists from
+    make_healthy_pedigree. Ages and cancer ages are uint8, IDs are int32,
+    birth years are int16 and the Sex, G Test, Mutn and receptor columns
+    are int8 codes from SEX_CODES, G_TEST_CODES, MUTN_CODES and
+    RECEPTOR_CODES. The people of family k are rows offsets[k] to
+    offsets[k+1]
+    '''
+
+    columns = [("fam_id", "int32", None), ("name", "int32", None),
+               ("target", "int8", None), ("ind_id", "int32", None),
+               ("fath_id", "int32", None), ("moth_id", "int32", None),
+               ("sex", "int8", SEX_CODES), ("twin", "int8", None),
+               ("dead", "int8", None), ("age", "uint8", None),
+               ("birth_year", "int16", None), ("br_ca1", "uint8", None),
+               ("br_ca2", "uint8", None), ("ov_ca", "uint8", None),
+               ("pro_ca", "uint8", None), ("pan_ca", "uint8", None),
+               ("g_test", "int8", G_TEST_CODES), ("mutn", "int8", MUTN_CODES),
+               ("ashkn", "int8", None), ("er", "int8", RECEPTOR_CODES),
+               ("pr", "int8", RECEPTOR_CODES),
+               ("her2", "int8", RECEPTOR_CODES),
+               ("ck14", "int8", RECEPTOR_CODES),
+               ("ck56", "int8", RECEPTOR_CODES)]
+
+    def __init__(self, data, offsets):
+        '''
+        data: dictionary of arrays keyed by the column names in columns
+        offsets: array of the first row of each family followed by the
+        total number of rows
+        '''
+        if np is None:
+            raise ImportError("NumPy is required for PedigreeBatch")
+        self.data = {}
+        for name, dtype, codes in self.columns:
+            self.data[name] = np.asarray(data[name], dtype=dtype)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        if self.offsets[-1] != len(self.data["ind_id"]):
+            raise ValueError("Family offsets do not match number of rows")
+
+    def __len__(self):
+        '''Returns the number of families in the batch'''
+        return len(self.offsets) - 1
+
+    def __getattr__(self, name):
+        '''Returns the array for a column name'''
+        data = self.__dict__.get("data")
+        if data is not None and name in data:
+            return data[name]
+        raise AttributeError(name)
+
+    def num_people(self):
+        '''Returns the number of people in the batch'''
+        return int(self.offsets[-1])
+
+    def nbytes(self):
+        '''Returns the number of bytes used by the column arrays'''
+        total = self.offsets.nbytes
+        for name in self.data:
+            total += self.data[name].nbytes
+        return total
+
+    def family_sizes(self):
+        '''Returns an array of the number of people in each family'''
+        return np.diff(self.offsets)
+
+    def family_index(self):
+        '''Returns an array of the family position of each row'''
+        return np.repeat(np.arange(len(self)), self.family_sizes())
+
+    @classmethod
+    def from_pedigrees(cls, pedigrees):
+        '''
+        pedigrees: list of pedigrees, each a list of Person objects or of
+        person lists in the format used in the make_healthy_pedigree
+        function
+
+        Returns a PedigreeBatch with the same information
+        '''
+        if np is None:
+            raise ImportError("NumPy is required for PedigreeBatch")
+        rows = []
+        offsets = [0]
+        for pedigree in pedigrees:
+            for person in pedigree:
+                if isinstance(person, Person):
+                    rows.append(person.get_codes())
+                else:
+                    rows.append(Person.from_values(person).get_codes())
+            offsets.append(len(rows))
+        data = {}
+        if rows:
+            columns = list(zip(*rows))
+        else:
+            columns = [[] for column in cls.columns]
+        for index, (name, dtype, codes) in enumerate(cls.columns):
+            data[name] = np.array(columns[index], dtype=dtype)
+        return cls(data, offsets)
+
+    @classmethod
+    def concatenate(cls, batches):
+        '''Returns one PedigreeBatch with the families of all batches'''
+        batches = list(batches)
+        data = {}
+        for name, dtype, codes in cls.columns:
+            data[name] = np.concatenate([batch.data[name] for batch in
+                                         batches])
+        offsets = [np.zeros(1, dtype=np.int64)]
+        start = 0
+        for batch in batches:
+            offsets.append(batch.offsets[1:] + start)
+            start += batch.num_people()
+        return cls(data, np.concatenate(offsets))
+
+    def select(self, families):
+        '''
+        families: array of family positions in the batch
+
+        Returns a PedigreeBatch with only the given families
+        '''
+        families = np.asarray(families, dtype=np.int64)
+        sizes = self.family_sizes()[families]
+        starts = self.offsets[families]
+        rows = np.repeat(starts - np.cumsum(sizes) + sizes, sizes) + \
+            np.arange(int(sizes.sum()))
+        data = {}
+        for name in self.data:
+            data[name] = self.data[name][rows]
+        offsets = np.concatenate([np.zeros(1, dtype=np.int64),
+                                  np.cumsum(sizes)])
+        return PedigreeBatch(data, offsets)
+
+    def parent_rows(self):
+        '''
+        Returns arrays of the row of the father and of the mother of each
+        row, found by family and IndID, -1 if the parent is not in the
+        family
+        '''
+        if self.num_people() == 0:
+            return [np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)]
+        family = self.family_index().astype(np.int64) << 32
+        keys = family | self.ind_id.astype(np.int64)
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        parents = []
+        for parent_id in [self.fath_id, self.moth_id]:
+            parent_keys = family | parent_id.astype(np.int64)
+            index = np.searchsorted(sorted_keys, parent_keys)
+            index = np.minimum(index, len(keys) - 1)
+            found = (parent_id != 0) & (sorted_keys[index] == parent_keys)
+            parents.append(np.where(found, order[index], -1))
+        return parents
+
+    def family_histories(self):
+        '''
+        Computes the summary family history of get_family_history for the
+        proband, the last person, of every family at once
+
+        The relatives are found as index_pedigree finds them, the parents,
+        grandparents and aunts/uncles of the proband from their IDs,
+        siblings as the other children of the father and children as the
+        children of the proband, and counted as add_history counts them
+
+        Returns a dictionary of arrays keyed by the names in
+        FAMILY_HISTORY_COLUMNS, as the family histories from
+        load_npy_bundle
+        '''
+        num_families = len(self)
+        rows = np.arange(self.num_people())
+        family = self.family_index()
+        proband = self.offsets[1:] - 1
+        fath_row, moth_row = self.parent_rows()
+        role = np.full(len(rows), -1, dtype=np.int64)
+
+        def children(parent_id, exclude):
+            parent_id = parent_id[family]
+            return (parent_id != 0) & ((self.fath_id == parent_id) |
+                                       (self.moth_id == parent_id)) & \
+                (rows != exclude[family])
+
+        role[proband] = ROLES.index("proband")
+        for side, parent_row in [["paternal", fath_row[proband]],
+                                 ["maternal", moth_row[proband]]]:
+            has_parent = parent_row >= 0
+            if side == "paternal":
+                role[parent_row[has_parent]] = ROLES.index("father")
+            else:
+                role[parent_row[has_parent]] = ROLES.index("mother")
+            grandfather = np.where(has_parent, fath_row[parent_row], -1)
+            grandmother = np.where(has_parent, moth_row[parent_row], -1)
+            has_grandfather = grandfather >= 0
+            role[grandfather[has_grandfather]] = \
+                ROLES.index("%s grandfather" % side)
+            grandfather_id = np.where(has_grandfather,
+                                      self.ind_id[grandfather], 0)
+            role[children(grandfather_id, parent_row)] = \
+                ROLES.index("%s aunt/uncle" % side)
+            role[grandmother[grandmother >= 0]] = \
+                ROLES.index("%s grandmother" % side)
+        role[children(self.fath_id[proband], proband)] = \
+            ROLES.index("sibling")
+        role[children(self.ind_id[proband], proband)] = ROLES.index("child")
+        groups = {}
+        for name in ["first", "maternal", "paternal"]:
+            in_group = np.array([HISTORY_GROUPS.get(item) == name for item in
+                                 ROLES] + [False])
+            groups[name] = in_group[role]
+        br_ca = self.br_ca1.astype(np.int64)
+        ov_ca = self.ov_ca.astype(np.int64)
+        counts = [("br_ca_ls", groups["first"] & (br_ca > 0) & (br_ca < 50)),
+                  ("br_ca_gr", groups["first"] & (br_ca >= 50)),
+                  ("ov_ca", groups["first"] & (ov_ca > 0)),
+                  ("m2_br_ca", groups["maternal"] & (br_ca > 0)),
+                  ("p2_br_ca", groups["paternal"] & (br_ca > 0)),
+                  ("m2_ov_ca", groups["maternal"] & (ov_ca > 0)),
+                  ("p2_ov_ca", groups["paternal"] & (ov_ca > 0))]
+        fam_hxs = {"fam_id": self.fam_id[proband],
+                   "pro_id": self.ind_id[proband],
+                   "fhx": np.ones(num_families),
+                   "male_br_ca": np.zeros(num_families),
+                   "pan_ca": np.zeros(num_families)}
+        for name, counted in counts:
+            fam_hxs[name] = np.bincount(family[counted],
+                                        minlength=num_families)
+        for name, dtype in FAMILY_HISTORY_COLUMNS:
+            fam_hxs[name] = fam_hxs[name].astype(dtype)
+        return fam_hxs
+
+    def iter_pedigrees(self):
+        '''
+        Yields each family as a list of Person objects as in the
+        make_healthy_pedigree function
+        '''
+        columns = [self.data[name].tolist() for name, dtype, codes in
+                   self.columns]
+        people = [Person(*codes) for codes in zip(*columns)]
+        offsets = self.offsets.tolist()
+        for index in range(len(self)):
+            yield people[offsets[index]:offsets[index + 1]]
+
+    def to_pedigrees(self):
+        '''
+        Returns a list of pedigrees, each a list of Person objects as in
+        the make_healthy_pedigree function, that can be given to
+        write_pedigree
+        '''
+        return list(self.iter_pedigrees())
+
+##to debug PedigreeBatch
+#new_ped = CancerPedigree()
+#batch = PedigreeBatch.from_pedigrees([new_ped.make_healthy_pedigree()
+#                                      for x in range(5)])
+#print(len(batch), batch.num_people(), batch.nbytes())
+#new_ped.write_pedigree(batch.to_pedigrees())
+
+class PedigreeStructureEngine(object):
+    '''
+    Makes the healthy pedigrees of make_healthy_pedigree for many families
+    at once with NumPy
+
+    The proband ages and sexes, the ages of the parents and grandparents,
+    the number of siblings of the proband and of each parent and the ages
+    and sexes of the siblings are each drawn for the whole batch as one
+    array, from the same distributions as init_proband, add_parents and
+    add_siblings. The people of each family are in the order of
+    make_healthy_pedigree and are given IDs in the order the scalar
+    functions would give them, each family taking the next block of
+    individual IDs so the IDs of the batch are contiguous
+    '''
+
+    #number of people before the siblings in make_healthy_pedigree order:
+    #the 4 grandparents, father and mother
+    num_ancestors = 6
+
+    def __init__(self, seed=None):
+        '''
+        seed: seed for the NumPy random generator, if None a seed is drawn
+        from the random module so runs seeded with random.seed repeat
+        '''
+        if np is None:
+            raise ImportError("NumPy is required for the pedigree "
+                              "structure engine")
+        if seed is None:
+            seed = random.getrandbits(64)
+        self.rng = np.random.default_rng(seed)
+
+    def get_gender(self, size):
+        '''Returns an array of size random MALE or FEMALE codes'''
+        return self.rng.integers(MALE, FEMALE + 1, size)
+
+    def parent_ages(self, child_age):
+        '''
+        child_age: array of ages of the children
+
+        Returns arrays of the age, birth year and dead status of one parent
+        of each child as in add_parents
+        '''
+        age = child_age + self.rng.integers(20, 41, len(child_age))
+        birth_year = int(year) - age
+        dead = age > 90
+        return np.minimum(age, 91), birth_year, dead
+
+    def sibling_ages(self, person_age, counts):
+        '''
+        person_age: array of ages of the people given siblings
+        counts: array of the number of siblings of each person
+
+        Returns arrays of the age, birth year and dead status of all the
+        siblings, those of the first person first, as in add_siblings
+        '''
+        age = np.repeat(person_age, counts) + \
+            self.rng.integers(-15, 16, int(counts.sum()))
+        birth_year = int(year) - age
+        dead = age > 90
+        return np.minimum(age, 91), birth_year, dead
+
+    def make_healthy_batch(self, num_families):
+        '''
+        Returns a PedigreeBatch of num_families healthy pedigrees as from
+        make_healthy_pedigree, with family IDs and individual IDs following
+        on from Pedigree.family_id and Pedigree.ind_id, which are updated
+        as if the pedigrees had been made one at a time
+        '''
+        rng = self.rng
+        pro_age = rng.integers(20, 66, num_families)
+        pro_sex = self.get_gender(num_families)
+        moth_age, moth_birth, moth_dead = self.parent_ages(pro_age)
+        fath_age, fath_birth, fath_dead = self.parent_ages(pro_age)
+        num_sibs = rng.integers(0, 5, num_families)
+        sib_age, sib_birth, sib_dead = self.sibling_ages(pro_age, num_sibs)
+        sib_sex = self.get_gender(len(sib_age))
+        parents = {}
+        for side, age in [("paternal", fath_age), ("maternal", moth_age)]:
+            parents[side] = [self.parent_ages(age), self.parent_ages(age)]
+        num_aunts = {"paternal": rng.integers(0, 5, num_families),
+                     "maternal": rng.integers(0, 5, num_families)}
+        aunts = {}
+        for side, age in [("paternal", fath_age), ("maternal", moth_age)]:
+            age, birth_year, dead = self.sibling_ages(age, num_aunts[side])
+            aunts[side] = (age, birth_year, dead, self.get_gender(len(age)))
+
+        sizes = self.num_ancestors + num_aunts["paternal"] + \
+            num_aunts["maternal"] + num_sibs + 1
+        offsets = np.concatenate([np.zeros(1, dtype=np.int64),
+                                  np.cumsum(sizes)])
+        starts = offsets[:-1]
+        total = int(offsets[-1])
+        #the scalar functions give IDs to the proband, mother, father,
+        #siblings, paternal grandmother and grandfather, maternal
+        #grandmother and grandfather, paternal then maternal aunts/uncles
+        first_id = Pedigree.ind_id + 1 + starts
+        pro_id = first_id
+        moth_id = first_id + 1
+        fath_id = first_id + 2
+        grand_ids = {"paternal": [first_id + 4 + num_sibs,
+                                  first_id + 3 + num_sibs],
+                     "maternal": [first_id + 6 + num_sibs,
+                                  first_id + 5 + num_sibs]}
+        aunt_first_id = {"paternal": first_id + 7 + num_sibs,
+                         "maternal": first_id + 7 + num_sibs +
+                         num_aunts["paternal"]}
+
+        data = {}
+        for name, dtype, codes in PedigreeBatch.columns:
+            data[name] = np.zeros(total, dtype=dtype)
+        data["fam_id"][:] = np.repeat(Pedigree.family_id + 1 +
+                                      np.arange(num_families), sizes)
+
+        def fill(rows, ind_id, fath, moth, sex, age, birth_year, dead):
+            data["ind_id"][rows] = ind_id
+            data["fath_id"][rows] = fath
+            data["moth_id"][rows] = moth
+            data["sex"][rows] = sex
+            data["age"][rows] = age
+            data["birth_year"][rows] = birth_year
+            data["dead"][rows] = dead
+
+        for index, side in enumerate(["paternal", "maternal"]):
+            for parent, sex in enumerate([MALE, FEMALE]):
+                age, birth_year, dead = parents[side][1 - parent]
+                fill(starts + 2 * index + parent, grand_ids[side][parent], 0,
+                     0, sex, age, birth_year, dead)
+        fill(starts + 4, fath_id, grand_ids["paternal"][0],
+             grand_ids["paternal"][1], MALE, fath_age, fath_birth, fath_dead)
+        fill(starts + 5, moth_id, grand_ids["maternal"][0],
+             grand_ids["maternal"][1], FEMALE, moth_age, moth_birth,
+             moth_dead)
+        row_start = starts + self.num_ancestors
+        groups = [(num_aunts["paternal"], aunt_first_id["paternal"],
+                   grand_ids["paternal"], aunts["paternal"]),
+                  (num_aunts["maternal"], aunt_first_id["maternal"],
+                   grand_ids["maternal"], aunts["maternal"]),
+                  (num_sibs, first_id + 3, [fath_id, moth_id],
+                   (sib_age, sib_birth, sib_dead, sib_sex))]
+        for counts, group_id, group_parents, people in groups:
+            owner = np.repeat(np.arange(num_families), counts)
+            rank = np.arange(int(counts.sum())) - \
+                np.repeat(np.cumsum(counts) - counts, counts)
+            age, birth_year, dead, sex = people
+            fill(row_start[owner] + rank, group_id[owner] + rank,
+                 group_parents[0][owner], group_parents[1][owner], sex, age,
+                 birth_year, dead)
+            row_start = row_start + counts
+        fill(row_start, pro_id, fath_id, moth_id, pro_sex, pro_age,
+             int(year) - pro_age, 0)
+        data["target"][row_start] = 1
+        data["name"][:] = data["ind_id"]
+        Pedigree.family_id += num_families
+        Pedigree.ind_id += total
+        return PedigreeBatch(data, offsets)
+
+##to debug PedigreeStructureEngine
+#batch = PedigreeStructureEngine().make_healthy_batch(5)
+#CancerPedigree().write_pedigree(batch.to_pedigrees())
+
+#pedigree classes used by each engine that simulates person by person
+PEDIGREE_ENGINES = {"scalar": CancerPedigree,
+                    "icdf": InverseCdfCancerPedigree}
+
+
+
+#output
+PEDIGREE_HEADERS = ["FamID", "Name", "Target", "IndivID", "FathID", "MothID",
+                    "Sex", "Twin", "Dead", "Age", "Yob", "1BrCa", "2BrCa",
+                    "OvCa", "ProCa", "PanCa", "Gtest", "Mutn", "Ashkn", "ER",
+                    "PR", "HER2", "CK14", "CK56"]
+FAMILY_HISTORY_HEADERS = ["FamID", "ProID", "FamHx", "ls1BrCa", "gr1BrCa",
+                          "1OvCa", "m2BrCa", "p2BrCa", "m2OvCa", "p2OvCa",
+                          "maleBr", "PanCa"]
+
+def write_pedigree_header(my_pedigree):
+    '''Writes the BOADICEA import header lines to an open file'''
+    my_pedigree.write("BOADICEA import pedigree file format 2.0 \n")
+    for item in PEDIGREE_HEADERS:
+        my_pedigree.write("%s\t" % item)
+    my_pedigree.write("\n")
+
+def write_pedigree_rows(my_pedigree, pedigrees, chunk_size=1000):
+    '''
+    pedigrees: iterable of pedigrees, each a list of Person objects or of
+    person lists in the format used in the make_healthy_pedigree function
+
+    Writes one line per person to an open file, writing and flushing the
+    lines of chunk_size pedigrees at a time so the output reaches disk as
+    the pedigrees are generated. If my_pedigree is a TextOutput with an
+    index, each family is added to the index
+
+    Returns the number of pedigrees written
+    '''
+    indexed = getattr(my_pedigree, "index", None) is not None
+    lines = []
+    families = []
+    count = 0
+    for pedigree in pedigrees:
+        ped_lines = ["\t".join(map(str, person)) + "\t\n" for person in
+                     pedigree]
+        lines.extend(ped_lines)
+        if indexed:
+            families.append((pedigree[0][0], sum(map(len, ped_lines)),
+                             len(ped_lines)))
+        count += 1
+        if count % chunk_size == 0:
+            write_text_rows(my_pedigree, lines, families)
+            lines = []
+            families = []
+    write_text_rows(my_pedigree, lines, families)
+    return count
+
+def write_text_rows(my_file, lines, families):
+    '''
+    Writes and flushes lines to an open file, giving the families the
+    lines belong to, as (FamID, number of bytes, number of rows), to a
+    TextOutput with an index
+    '''
+    if families:
+        my_file.write("".join(lines), families)
+    else:
+        my_file.write("".join(lines))
+    my_file.flush()
+
+def write_family_history_header(my_hx):
+    '''Writes the summary family history header lines to an open file'''
+    my_hx.write("Summary family history information \n")
+    for item in FAMILY_HISTORY_HEADERS:
+        my_hx.write("%s\t" % item)
+    my_hx.write("\n")
+
+def write_family_history_rows(my_hx, fam_hxs, chunk_size=1000):
+    '''
+    fam_hxs: iterable of family histories from get_family_history
+
+    Writes one line per family to an open file, writing and flushing
+    chunk_size lines at a time. If my_hx is a TextOutput with an index,
+    each family is added to the index
+
+    Returns the number of family histories written
+    '''
+    indexed = getattr(my_hx, "index", None) is not None
+    lines = []
+    families = []
+    count = 0
+    for fam in fam_hxs:
+        line = "\t".join(map(str, fam)) + "\t\n"
+        lines.append(line)
+        if indexed:
+            families.append((fam[0], len(line), 1))
+        count += 1
+        if count % chunk_size == 0:
+            write_text_rows(my_hx, lines, families)
+            lines = []
+            families = []
+    write_text_rows(my_hx, lines, families)
+    return count
+
+#file name suffixes of the compressions of TextOutput
+COMPRESSION_SUFFIXES = {None: "", "gzip": ".gz", "zstd": ".zst"}
+
+#sidecar index of an uncompressed TextOutput: the file name suffix, the
+#bytes at the start of the file and one little-endian record per family of
+#FamID, shard number (-1 if not sharded), byte offset of the first row,
+#number of bytes and number of rows
+TEXT_INDEX_SUFFIX = ".idx"
+TEXT_INDEX_MAGIC = b"BRCAIDX1"
+TEXT_INDEX_RECORD = struct.Struct("<qiqii")
+
+class TextOutput(object):
+    '''
+    Text output file that can be compressed with gzip or zstd and split
+    into shards of a bounded size, each starting with the same header
+
+    Has the write and flush methods of a file so it can be given to
+    write_pedigree_rows and write_family_history_rows. A shard is only
+    closed on flush, so the rows of each flushed chunk stay in one shard
+    and a shard can pass shard_bytes by up to one chunk
+
+    An uncompressed TextOutput can also write a sidecar index, path +
+    ".idx", with the shard, byte offset, length and number of rows of each
+    family so IndexedTextFile can read any family without scanning the
+    file
+    '''
+
+    def __init__(self, path, write_header=None, compression=None,
+                 shard_bytes=None, level=None, state=None, index=False):
+        '''
+        path: file name, the compression suffix is added if missing and
+            shards are named with their number before the extension, as
+            in "pedigree.00000.txt.gz"
+        write_header: function writing the header lines to an open file,
+            such as write_pedigree_header
+        compression: None, "gzip" or "zstd", zstd needs the zstandard
+            package
+        shard_bytes: number of bytes on disk after which a new shard is
+            started, one file if None
+        level: compression level, if None 6 for gzip as in the gzip
+            command and the zstandard default for zstd
+        state: state from checkpoint to continue the output from, the last
+            shard is cut back to where it was at the checkpoint
+        index: True to write the sidecar index, only for uncompressed
+            files. When continuing from state the index is cut back in the
+            same way, and is not written if state has no index
+        '''
+        if compression not in COMPRESSION_SUFFIXES:
+            raise ValueError("Unknown compression %s" % compression)
+        if index and compression is not None:
+            raise ValueError("Only uncompressed text files can be indexed")
+        if compression == "zstd" and zstandard is None:
+            raise ImportError("zstandard is required for zstd compression")
+        suffix = COMPRESSION_SUFFIXES[compression]
+        if suffix and path.endswith(suffix):
+            path = path[:-len(suffix)]
+        self.path = path
+        self.suffix = suffix
+        self.write_header = write_header
+        self.compression = compression
+        self.shard_bytes = shard_bytes
+        self.level = level
+        self.paths = []
+        self.raw = None
+        self.text = None
+        self.index = None
+        if index and state is None:
+            self.index = open(path + TEXT_INDEX_SUFFIX, "wb")
+            self.index.write(TEXT_INDEX_MAGIC)
+        elif index and state.get("index") is not None:
+            self.index = open(path + TEXT_INDEX_SUFFIX, "r+b")
+            self.index.truncate(state["index"])
+            self.index.seek(state["index"])
+        if state is None:
+            self.open_shard()
+        else:
+            self.paths = list(state["paths"])
+            if state["offset"] is not None:
+                self.raw = open(self.paths[-1], "r+b")
+                self.raw.truncate(state["offset"])
+                self.raw.seek(state["offset"])
+
+    def shard_path(self, index):
+        '''Returns the file name of shard number index'''
+        if self.shard_bytes is None:
+            return self.path + self.suffix
+        root, ext = os.path.splitext(self.path)
+        return "%s.%05d%s%s" % (root, index, ext, self.suffix)
+
+    def open_shard(self):
+        '''Opens the next shard and writes the header to it'''
+        path = self.shard_path(len(self.paths))
+        self.paths.append(path)
+        self.raw = open(path, "wb")
+        self.open_stream()
+        if self.write_header is not None:
+            self.write_header(self.text)
+
+    def open_stream(self):
+        '''
+        Starts the text stream at the end of the open shard, beginning a
+        new gzip member or zstd frame if compressed
+        '''
+        if self.compression == "gzip":
+            level = self.level
+            if level is None:
+                level = 6
+            stream = gzip.GzipFile(fileobj=self.raw, mode="wb",
+                                   compresslevel=level)
+        elif self.compression == "zstd":
+            if self.level is None:
+                compressor = zstandard.ZstdCompressor()
+            else:
+                compressor = zstandard.ZstdCompressor(level=self.level)
+            stream = compressor.stream_writer(self.raw, closefd=False)
+        else:
+            stream = self.raw
+        self.text = io.TextIOWrapper(stream, encoding="ascii",
+                                     write_through=True)
+
+    def close_stream(self):
+        '''
+        Ends the text stream, and any gzip member or zstd frame, leaving
+        the shard open
+        '''
+        stream = self.text.detach()
+        if stream is not self.raw:
+            stream.close()
+        self.raw.flush()
+        self.text = None
+
+    def close_shard(self):
+        '''Closes the open shard'''
+        if self.text is not None:
+            self.close_stream()
+        self.raw.close()
+        self.raw = None
+
+    def write(self, text, families=None):
+        '''
+        Writes a string to the open shard, starting a new shard if the
+        last one was closed by flush
+
+        families: list of (FamID, number of bytes, number of rows) of the
+            families whose rows make up text, in order, to add to the
+            index
+        '''
+        if not text:
+            return
+        if self.raw is None:
+            self.open_shard()
+        elif self.text is None:
+            self.open_stream()
+        if self.index is not None and families:
+            offset = self.raw.tell()
+            shard = -1
+            if self.shard_bytes is not None:
+                shard = len(self.paths) - 1
+            records = []
+            for fam_id, num_bytes, rows in families:
+                records.append(TEXT_INDEX_RECORD.pack(fam_id, shard, offset,
+                                                      num_bytes, rows))
+                offset += num_bytes
+            self.index.write(b"".join(records))
+        self.text.write(text)
+
+    def flush(self):
+        '''
+        Flushes the open shard to disk and closes it if it has reached
+        shard_bytes so the next write starts a new shard
+        '''
+        if self.index is not None:
+            self.index.flush()
+        if self.text is None:
+            return
+        self.text.flush()
+        if self.shard_bytes is not None and \
+           self.raw.tell() >= self.shard_bytes:
+            self.close_shard()
+
+    def checkpoint(self):
+        '''
+        Ends any gzip member or zstd frame so the output so far can be
+        read, syncs the open shard to disk and returns the state to give
+        to TextOutput to continue from this point
+        '''
+        index = None
+        if self.index is not None:
+            self.index.flush()
+            os.fsync(self.index.fileno())
+            index = self.index.tell()
+        if self.raw is None:
+            return {"paths": list(self.paths), "offset": None,
+                    "index": index}
+        if self.text is not None:
+            self.close_stream()
+        os.fsync(self.raw.fileno())
+        return {"paths": list(self.paths), "offset": self.raw.tell(),
+                "index": index}
+
+    def close(self):
+        '''Closes the open shard and the index'''
+        if self.raw is not None:
+            self.close_shard()
+        if self.index is not None:
+            self.index.close()
+            self.index = None
+
+##to debug TextOutput
+#new_ped = Pedigree()
+#my_pedigree = TextOutput("pedigree.txt", write_pedigree_header, "gzip",
+#                         100000)
+#write_pedigree_rows(my_pedigree, [new_ped.make_healthy_pedigree()
+#                                  for x in range(5000)], 500)
+#my_pedigree.close()
+#print(my_pedigree.paths)
+
+class IndexedTextFile(object):
+    '''
+    Random access to the families of a text file written by TextOutput
+    with an index, such as "pedigree.txt" or "familyhistory.txt"
+
+    The index and the file, or each of its shards, are memory mapped, so
+    finding a family is one lookup in the index, which is direct when the
+    FamIDs are consecutive as in run_parallel output and a binary search
+    otherwise, and reading it is one slice of the file
+    '''
+
+    def __init__(self, path):
+        '''
+        path: file name given to TextOutput, the index is path + ".idx"
+        '''
+        self.path = path
+        self.files = []
+        self.maps = {}
+        index_file = open(path + TEXT_INDEX_SUFFIX, "rb")
+        self.files.append(index_file)
+        self.index = mmap.mmap(index_file.fileno(), 0,
+                               access=mmap.ACCESS_READ)
+        if self.index[:len(TEXT_INDEX_MAGIC)] != TEXT_INDEX_MAGIC:
+            self.close()
+            raise ValueError("%s is not a text file index" %
+                             (path + TEXT_INDEX_SUFFIX))
+        self.num_families = (len(self.index) - len(TEXT_INDEX_MAGIC)) // \
+            TEXT_INDEX_RECORD.size
+
+    def __len__(self):
+        '''Returns the number of families in the index'''
+        return self.num_families
+
+    def close(self):
+        '''Closes the memory maps and files'''
+        for my_map in [self.index] + list(self.maps.values()):
+            my_map.close()
+        for my_file in self.files:
+            my_file.close()
+        self.maps = {}
+        self.files = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def record(self, position):
+        '''
+        Returns the index record of the family at position in the file as
+        (FamID, shard, offset, number of bytes, number of rows)
+        '''
+        return TEXT_INDEX_RECORD.unpack_from(
+            self.index, len(TEXT_INDEX_MAGIC) +
+            position * TEXT_INDEX_RECORD.size)
+
+    def fam_id(self, position):
+        '''Returns the FamID of the family at position in the file'''
+        return self.record(position)[0]
+
+    def position(self, fam_id):
+        '''
+        Returns the position in the file of the first family with a FamID
+        of at least fam_id, or the number of families if there is none
+        '''
+        if self.num_families == 0:
+            return 0
+        position = fam_id - self.fam_id(0)
+        if 0 <= position < self.num_families and \
+           self.fam_id(position) == fam_id:
+            return position
+        low = 0
+        high = self.num_families
+        while low < high:
+            middle = (low + high) // 2
+            if self.fam_id(middle) < fam_id:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def find(self, fam_id):
+        '''
+        Returns the position in the file of the family with FamID fam_id,
+        raising a ValueError if it is not in the index
+        '''
+        position = self.position(fam_id)
+        if position < self.num_families and self.fam_id(position) == fam_id:
+            return position
+        raise ValueError("Family %s is not in %s" % (fam_id, self.path))
+
+    def shard_map(self, shard):
+        '''Returns the memory map of shard number shard, -1 if not sharded'''
+        if shard not in self.maps:
+            path = self.path
+            if shard >= 0:
+                root, ext = os.path.splitext(self.path)
+                path = "%s.%05d%s" % (root, shard, ext)
+            my_file = open(path, "rb")
+            self.files.append(my_file)
+            self.maps[shard] = mmap.mmap(my_file.fileno(), 0,
+                                         access=mmap.ACCESS_READ)
+        return self.maps[shard]
+
+    def read_rows(self, position):
+        '''
+        Returns the rows of the family at position in the file, each a list
+        of the values as strings
+        '''
+        fam_id, shard, offset, num_bytes, rows = self.record(position)
+        text = self.shard_map(shard)[offset:offset + num_bytes]
+        return [line.split(b"\t")[:-1] for line in text.splitlines()]
+
+    def read_family(self, fam_id):
+        '''
+        Returns the rows of the family with FamID fam_id, each a list of
+        the values as strings
+        '''
+        return self.read_rows(self.find(fam_id))
+
+def parse_text_value(value):
+    '''Returns a text file value as an int, or as a str if not a number'''
+    try:
+        return int(value)
+    except ValueError:
+        return value.decode("ascii")
+
+class PedigreeTextReader(object):
+    '''
+    Reads single families or ranges of families from "pedigree.txt" and,
+    if it exists, "familyhistory.txt" written with an index by
+    write_simulation, without scanning the files
+    '''
+
+    def __init__(self, pedigree_file="pedigree.txt",
+                 family_history_file="familyhistory.txt", output_dir="."):
+        '''
+        pedigree_file, family_history_file, output_dir: as given to
+            write_simulation
+        '''
+        self.pedigrees = IndexedTextFile(os.path.join(output_dir,
+                                                      pedigree_file))
+        self.family_histories = None
+        path = os.path.join(output_dir, family_history_file)
+        if os.path.exists(path + TEXT_INDEX_SUFFIX):
+            self.family_histories = IndexedTextFile(path)
+
+    def __len__(self):
+        '''Returns the number of families'''
+        return len(self.pedigrees)
+
+    def close(self):
+        '''Closes the indexed files'''
+        self.pedigrees.close()
+        if self.family_histories is not None:
+            self.family_histories.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def get_family(self, fam_id):
+        '''
+        Returns the pedigree of the family with FamID fam_id as a list of
+        Person objects, or a list of the pedigree followed by its family
+        history if there is a family history file, as in iter_pedigrees
+        '''
+        pedigree = []
+        for row in self.pedigrees.read_family(fam_id):
+            pedigree.append(Person.from_values([parse_text_value(value)
+                                                for value in row]))
+        if self.family_histories is None:
+            return pedigree
+        fam_hx = [parse_text_value(value) for value in
+                  self.family_histories.read_family(fam_id)[0]]
+        return [pedigree, fam_hx]
+
+    def get_families(self, first, last):
+        '''
+        Returns a list of the families with FamIDs first to last in the
+        format of get_family, skipping FamIDs that are not in the files
+        '''
+        families = []
+        for position in range(self.pedigrees.position(first),
+                              len(self.pedigrees)):
+            fam_id = self.pedigrees.fam_id(position)
+            if fam_id > last:
+                break
+            families.append(self.get_family(fam_id))
+        return families
+
+##to debug PedigreeTextReader
+#run_parallel(500, "sim_fhx", seed=1, return_results=False)
+#with PedigreeTextReader() as reader:
+#    print(reader.get_family(137))
+#    print(len(reader.get_families(10, 20)))
+
+#columns of the family history table from get_family_history
+FAMILY_HISTORY_COLUMNS = [("fam_id", "int32"), ("pro_id", "int32"),
+                          ("fhx", "int8"), ("br_ca_ls", "uint8"),
+                          ("br_ca_gr", "uint8"), ("ov_ca", "uint8"),
+                          ("m2_br_ca", "uint8"), ("p2_br_ca", "uint8"),
+                          ("m2_ov_ca", "uint8"), ("p2_ov_ca", "uint8"),
+                          ("male_br_ca", "uint8"), ("pan_ca", "uint8")]
+
+#output formats of write_simulation
+OUTPUT_FORMATS = ["text", "npy", "both"]
+
+#size in bytes of the .npy headers written by NpyColumnWriter, large enough
+#for any row count so the header can be rewritten in place
+NPY_HEADER_SIZE = 128
+
+def npy_header(dtype, length):
+    '''
+    Returns a version 1.0 .npy header for a one dimensional array of
+    length values of dtype, padded to NPY_HEADER_SIZE bytes
+    '''
+    header = "{'descr': '%s', 'fortran_order': False, 'shape': (%d,), }" % \
+        (np.dtype(dtype).str, length)
+    header = header.ljust(NPY_HEADER_SIZE - 11) + "\n"
+    return b"\x93NUMPY\x01\x00" + struct.pack("<H", len(header)) + \
+        header.encode("latin1")
+
+class NpyColumnWriter(object):
+    '''
+    Writes a table as one .npy file per column in a directory, appending
+    the rows of each block as it is written so a table can be saved while
+    it is being generated
+    '''
+
+    def __init__(self, path, columns, state=None):
+        '''
+        path: directory for the column files, created if needed
+        columns: list of (name, dtype) for the columns
+        state: state from checkpoint to continue the columns from, each
+            file is cut back to its length at the checkpoint
+        '''
+        if np is None:
+            raise ImportError("NumPy is required for .npy output")
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        self.path = path
+        self.columns = columns
+        self.files = {}
+        self.lengths = {}
+        for name, dtype in columns:
+            file_path = os.path.join(path, name + ".npy")
+            if state is None:
+                self.files[name] = open(file_path, "wb")
+                self.files[name].write(npy_header(dtype, 0))
+                self.lengths[name] = 0
+            else:
+                self.lengths[name] = state[name]
+                self.files[name] = open(file_path, "r+b")
+                self.files[name].truncate(NPY_HEADER_SIZE + state[name] *
+                                          np.dtype(dtype).itemsize)
+                self.files[name].seek(0, 2)
+
+    def write(self, data):
+        '''
+        data: dictionary of arrays keyed by column name
+
+        Appends the arrays to the end of each column file
+        '''
+        for name, dtype in self.columns:
+            values = np.ascontiguousarray(data[name], dtype=dtype)
+            self.files[name].write(values.tobytes())
+            self.lengths[name] += len(values)
+
+    def flush(self):
+        '''Rewrites the headers with the current lengths and flushes'''
+        for name, dtype in self.columns:
+            my_file = self.files[name]
+            my_file.seek(0)
+            my_file.write(npy_header(dtype, self.lengths[name]))
+            my_file.seek(0, 2)
+            my_file.flush()
+
+    def checkpoint(self):
+        '''
+        Writes the headers, syncs the column files to disk and returns the
+        state to give to NpyColumnWriter to continue from this point
+        '''
+        self.flush()
+        for name in self.files:
+            os.fsync(self.files[name].fileno())
+        return dict(self.lengths)
+
+    def close(self):
+        '''Writes the final headers and closes the column files'''
+        self.flush()
+        for name in self.files:
+            self.files[name].close()
+
+class NpyBundleWriter(object):
+    '''
+    Writes pedigrees and family histories as a bundle of .npy files:
+    path/pedigree has one file per PedigreeBatch column and offsets.npy
+    with the first row of each family followed by the number of rows, and
+    path/familyhistory has one file per column of FAMILY_HISTORY_COLUMNS
+
+    The bundle is loaded without copying by load_npy_bundle
+    '''
+
+    def __init__(self, path, family_history=False, state=None):
+        '''
+        path: directory for the bundle
+        family_history: True to also write the family history table
+        state: state from checkpoint to continue the bundle from
+        '''
+        if state is None:
+            state = {"pedigree": None, "offsets": None,
+                     "family_history": None, "num_rows": 0}
+        columns = [(name, dtype) for name, dtype, codes in
+                   PedigreeBatch.columns]
+        self.pedigree = NpyColumnWriter(os.path.join(path, "pedigree"),
+                                        columns, state["pedigree"])
+        self.offsets = NpyColumnWriter(os.path.join(path, "pedigree"),
+                                       [("offsets", "int64")],
+                                       state["offsets"])
+        if state["offsets"] is None:
+            self.offsets.write({"offsets": [0]})
+        self.num_rows = state["num_rows"]
+        self.fam_hx = None
+        if family_history:
+            self.fam_hx = NpyColumnWriter(os.path.join(path, "familyhistory"),
+                                          FAMILY_HISTORY_COLUMNS,
+                                          state["family_history"])
+
+    def write_pedigrees(self, pedigrees):
+        '''
+        pedigrees: list of pedigrees in the format used in the
+        make_healthy_pedigree function
+
+        Appends the pedigrees as one row group and returns their number
+        '''
+        if len(pedigrees) == 0:
+            return 0
+        batch = PedigreeBatch.from_pedigrees(pedigrees)
+        self.pedigree.write(batch.data)
+        self.offsets.write({"offsets": batch.offsets[1:] + self.num_rows})
+        self.num_rows += batch.num_people()
+        self.pedigree.flush()
+        self.offsets.flush()
+        return len(batch)
+
+    def write_family_histories(self, fam_hxs):
+        '''
+        fam_hxs: list of family histories from get_family_history
+
+        Appends the family histories as one row group and returns their
+        number
+        '''
+        if len(fam_hxs) == 0:
+            return 0
+        data = {}
+        for index, (name, dtype) in enumerate(FAMILY_HISTORY_COLUMNS):
+            data[name] = [fam[index] for fam in fam_hxs]
+        self.fam_hx.write(data)
+        self.fam_hx.flush()
+        return len(fam_hxs)
+
+    def checkpoint(self):
+        '''
+        Syncs the bundle to disk and returns the state to give to
+        NpyBundleWriter to continue from this point
+        '''
+        state = {"pedigree": self.pedigree.checkpoint(),
+                 "offsets": self.offsets.checkpoint(),
+                 "family_history": None, "num_rows": self.num_rows}
+        if self.fam_hx is not None:
+            state["family_history"] = self.fam_hx.checkpoint()
+        return state
+
+    def close(self):
+        '''Closes all the column files'''
+        self.pedigree.close()
+        self.offsets.close()
+        if self.fam_hx is not None:
+            self.fam_hx.close()
+
+def load_npy_bundle(path, mmap_mode="r"):
+    '''
+    path: directory written by NpyBundleWriter
+    mmap_mode: passed to numpy.load, "r" maps the files read only without
+        copying them into memory and None reads them into memory
+
+    Returns a list of a PedigreeBatch of the pedigrees followed by a
+    dictionary of the family history column arrays, or None if the bundle
+    has no family histories. The dictionary can be given to
+    pandas.DataFrame
+    '''
+    if np is None:
+        raise ImportError("NumPy is required for .npy output")
+    data = {}
+    for name, dtype, codes in PedigreeBatch.columns:
+        data[name] = np.load(os.path.join(path, "pedigree", name + ".npy"),
+                             mmap_mode=mmap_mode)
+    offsets = np.load(os.path.join(path, "pedigree", "offsets.npy"),
+                      mmap_mode=mmap_mode)
+    fam_hxs = None
+    if os.path.isdir(os.path.join(path, "familyhistory")):
+        fam_hxs = {}
+        for name, dtype in FAMILY_HISTORY_COLUMNS:
+            fam_hxs[name] = np.load(os.path.join(path, "familyhistory",
+                                                 name + ".npy"),
+                                    mmap_mode=mmap_mode)
+    return [PedigreeBatch(data, offsets), fam_hxs]
+
+##to debug load_npy_bundle
+#my_bundle = NpyBundleWriter("pedigree_npy", True)
+#new_ped = CancerPedigree()
+#ca_ped = simulate_pedigree(new_ped)
+#my_bundle.write_pedigrees([ca_ped])
+#my_bundle.write_family_histories([new_ped.get_family_history(ca_ped)])
+#my_bundle.close()
+#print(load_npy_bundle("pedigree_npy")[0].to_pedigrees())
+
+#text input
+def open_text_input(path):
+    '''
+    Opens a text file written by TextOutput for reading as bytes,
+    decompressing it if the name ends in ".gz" or ".zst"
+    '''
+    if path.endswith(COMPRESSION_SUFFIXES["gzip"]):
+        return gzip.open(path, "rb")
+    if path.endswith(COMPRESSION_SUFFIXES["zstd"]):
+        if zstandard is None:
+            raise ImportError("zstandard is required for zstd compression")
+        reader = zstandard.ZstdDecompressor().stream_reader(
+            open(path, "rb"), read_across_frames=True)
+        return io.BufferedReader(reader)
+    return open(path, "rb")
+
+def parse_text_columns(buf, num_columns):
+    '''
+    buf: array of the bytes of whole tab separated lines, each value
+        followed by a tab
+
+    Returns an array of the start of each line and an array of the
+    position of the tab after each value, one row per value followed by a
+    row of the newlines and one column per line that is not blank, raising
+    a ValueError unless every line has num_columns values. The positions
+    of each value are contiguous, so the columns can be read one at a time
+    '''
+    index_type = np.int32
+    if len(buf) >= 2**31:
+        index_type = np.int64
+    #tabs and newlines are the only bytes below 11 in a valid file, so one
+    #comparison finds them all
+    ends = np.flatnonzero(buf <= 10)
+    #each line is normally num_columns values each ended by a tab, then an
+    #empty value ended by the newline
+    if len(ends) % (num_columns + 1) != 0 or \
+       (buf[ends[num_columns::num_columns + 1]] != 10).any():
+        #otherwise blank lines are skipped
+        ends = np.flatnonzero((buf == 9) | (buf == 10))
+        line_ends = np.flatnonzero(buf == 10)
+        per_line = np.bincount(np.searchsorted(line_ends, ends),
+                               minlength=len(line_ends))
+        if ((per_line != 1) & (per_line != num_columns + 1)).any():
+            raise ValueError("Pedigree row does not have %d values" %
+                             num_columns)
+        ends = ends[np.repeat(per_line > 1, per_line)]
+    ends = np.ascontiguousarray(ends.reshape(-1, num_columns + 1).T,
+                                dtype=index_type)
+    if (buf[ends[:num_columns]] != 9).any():
+        raise ValueError("Pedigree row does not have %d values" %
+                         num_columns)
+    line_starts = np.zeros(ends.shape[1], dtype=index_type)
+    line_starts[1:] = ends[num_columns, :-1] + 1
+    #skip the blank lines before each line
+    blank = buf[line_starts] == 10
+    while blank.any():
+        line_starts += blank
+        blank = buf[line_starts] == 10
+    return line_starts, ends
+
+def text_int_constants(size):
+    '''
+    Returns the constants for reading the digits of a value in one word of
+    size 4 or 8 bytes: the low and high nibble masks, the "0" bytes, the
+    carry that makes a low nibble over 9 spill into the high nibble, and
+    the multiplier, shift and mask that combine pairs, then fours, then
+    eights of digits
+    '''
+    ones = int.from_bytes(b"\x01" * size, "little")
+    steps = []
+    bits = 8
+    while bits < size * 8:
+        mask = int.from_bytes((b"\xff" * (bits // 8) +
+                               b"\x00" * (bits // 8)) * (size * 4 // bits),
+                              "little")
+        steps.append([10**(bits // 8) * 2**bits + 1, bits, mask])
+        bits *= 2
+    return [0x0F * ones, 0xF0 * ones, 0x30 * ones, 0x06 * ones, steps]
+
+TEXT_INT_WORDS = {4: text_int_constants(4), 8: text_int_constants(8)}
+
+def parse_text_ints(buf, starts, lengths):
+    '''
+    buf: array of the bytes of the text followed by at least 8 more bytes
+    starts, lengths: arrays of the start and length of each value, all at
+        least 1
+
+    Returns an int64 array of the whole numbers written in buf at starts
+    with lengths, raising a ValueError if any is not a number
+
+    Single digits are read as bytes, values of up to 4 or 8 digits as one
+    4 or 8 byte word each with the digits combined in pairs, fours and
+    eights with one multiplication each, longer values one digit at a time
+    '''
+    if len(starts) == 0:
+        return np.zeros(0, dtype=np.int64)
+    width = int(lengths.max())
+    if width == 1:
+        digits = buf[starts] - np.uint8(48)
+        if (digits > 9).any():
+            raise ValueError("Pedigree value is not a number")
+        return digits.astype(np.int64)
+    short = lengths <= 8
+    word_lengths = lengths
+    if width > 8:
+        #longer values are checked and read below, here only their first
+        #digit
+        word_lengths = np.where(short, lengths, 1)
+    size = 8
+    if width <= 4:
+        size = 4
+    low_mask, high_mask, zeros, carry, steps = TEXT_INT_WORDS[size]
+    word_type = np.dtype("<u%d" % size)
+    #one unaligned word starting at every byte of buf
+    words = np.ndarray((len(buf) - 7,), word_type, buffer=buf,
+                       strides=(1,))
+    #shifting the word left puts the digits in the high bytes, so the
+    #bytes after the value are dropped and the low bytes are leading zeros
+    shift = (size - word_lengths).astype(word_type)
+    shift <<= word_type.type(3)
+    word = words[starts]
+    word <<= shift
+    low = word & word_type.type(low_mask)
+    word &= word_type.type(high_mask)
+    word ^= word_type.type(zeros) << shift
+    word |= (low + word_type.type(carry)) & word_type.type(high_mask)
+    if word.any():
+        raise ValueError("Pedigree value is not a number")
+    for multiplier, bits, mask in steps:
+        low *= word_type.type(multiplier)
+        low >>= word_type.type(bits)
+        if bits * 2 < size * 8:
+            low &= word_type.type(mask)
+    values = low.astype(np.int64)
+    if width <= 8:
+        return values
+    for index in np.flatnonzero(~short):
+        start = starts[index]
+        text = buf[start:start + lengths[index]].tobytes()
+        if not text.isdigit():
+            raise ValueError("Pedigree value is not a number")
+        values[index] = int(text)
+    return values
+
+def parse_pedigree_text(data, keep_last=False):
+    '''
+    data: bytes of whole "pedigree.txt" rows in the BOADICEA 2.0 tab
+        layout without the header lines
+    keep_last: True if the last family may go on after data
+
+    Parses the values straight into the typed columns of PedigreeBatch,
+    turning the "M"/"F", "T", "N" and "P" values into their codes, and
+    splits the rows into families where the FamID changes. Each column is
+    read from the positions of the tabs around it, so the values are
+    never copied into one array first
+
+    Returns a list of the PedigreeBatch of the families and the position
+    in data of the first row not included, which is the start of the last
+    family if keep_last and otherwise the length of data
+    '''
+    columns = PedigreeBatch.columns
+    buf = np.frombuffer(data + b"\0" * 8, dtype=np.uint8)
+    line_starts, ends = parse_text_columns(buf[:len(data)], len(columns))
+    data_columns = {}
+    tables = {}
+    for name, dtype, codes in columns:
+        if codes is not None:
+            tables[name] = np.full(256, -1, dtype=np.int64)
+            for value, code in codes.items():
+                tables[name][ord(str(value))] = code
+    for index, (name, dtype, codes) in enumerate(columns):
+        if index == 0:
+            starts = line_starts
+        else:
+            starts = ends[index - 1] + 1
+        lengths = ends[index] - starts
+        if len(lengths) and lengths.min() == 0:
+            raise ValueError("Empty %s value in pedigree" % name)
+        if codes is not None:
+            coded = tables[name][buf[starts]]
+            if ((lengths != 1) | (coded < 0)).any():
+                raise ValueError("Unknown %s value in pedigree" % name)
+            data_columns[name] = coded.astype(dtype)
+            continue
+        column = parse_text_ints(buf, starts, lengths)
+        if len(column) and column.max() > np.iinfo(dtype).max:
+            raise ValueError("%s value too large in pedigree" % name)
+        data_columns[name] = column.astype(dtype)
+    fam_id = data_columns["fam_id"]
+    offsets = np.concatenate([np.zeros(1, dtype=np.int64),
+                              np.flatnonzero(fam_id[1:] != fam_id[:-1]) + 1,
+                              np.array([len(fam_id)], dtype=np.int64)])
+    if len(fam_id) == 0:
+        offsets = offsets[:1]
+    end = len(data)
+    if keep_last and len(offsets) > 1:
+        offsets = offsets[:-1]
+        end = int(line_starts[offsets[-1]])
+        for name in data_columns:
+            data_columns[name] = data_columns[name][:offsets[-1]]
+    return [PedigreeBatch(data_columns, offsets), end]
+
+def iter_pedigree_text(paths, chunk_bytes=1 << 20):
+    '''
+    paths: file name, or list of file names such as the shards of one
+        run in order, of "pedigree.txt" files from write_pedigree or
+        write_simulation, compressed or not
+    chunk_bytes: number of bytes read and parsed at a time
+
+    Yields a PedigreeBatch for each chunk of whole families, so memory use
+    depends on chunk_bytes and not on the size of the files
+    '''
+    if np is None:
+        raise ImportError("NumPy is required to load pedigree files")
+    if isinstance(paths, str):
+        paths = [paths]
+    pending = b""
+    for path in paths:
+        with open_text_input(path) as my_file:
+            line = my_file.readline()
+            if line.startswith(b"BOADICEA"):
+                my_file.readline()
+            else:
+                pending += line
+            while True:
+                data = my_file.read(chunk_bytes)
+                if not data:
+                    break
+                pending += data
+                cut = pending.rfind(b"\n") + 1
+                batch, end = parse_pedigree_text(pending[:cut], True)
+                pending = pending[end:]
+                if len(batch) > 0:
+                    yield batch
+    if pending.strip():
+        if not pending.endswith(b"\n"):
+            pending += b"\n"
+        yield parse_pedigree_text(pending)[0]
+
+def load_pedigree_text(paths, chunk_bytes=1 << 20):
+    '''
+    Returns one PedigreeBatch of all the families in the "pedigree.txt"
+    files paths, read as in iter_pedigree_text
+    '''
+    batches = list(iter_pedigree_text(paths, chunk_bytes))
+    if not batches:
+        return PedigreeBatch.from_pedigrees([])
+    return PedigreeBatch.concatenate(batches)
+
+def text_family_histories(paths, new_f=None, chunk_bytes=1 << 20,
+                          compression=None):
+    '''
+    Recomputes the family histories of the families in the "pedigree.txt"
+    files paths, read a chunk at a time as in iter_pedigree_text, with
+    PedigreeBatch.family_histories
+
+    If new_f is given the family histories are also written to it as in
+    write_family_history, compressed with compression
+
+    Returns a dictionary of the family history column arrays as from
+    PedigreeBatch.family_histories
+    '''
+    my_hx = None
+    if new_f is not None:
+        my_hx = TextOutput(new_f, write_family_history_header, compression,
+                           index=compression is None)
+    chunks = []
+    try:
+        for batch in iter_pedigree_text(paths, chunk_bytes):
+            fam_hxs = batch.family_histories()
+            chunks.append(fam_hxs)
+            if my_hx is not None:
+                rows = zip(*[fam_hxs[name].tolist() for name, dtype in
+                             FAMILY_HISTORY_COLUMNS])
+                write_family_history_rows(my_hx, rows, len(batch) + 1)
+    finally:
+        if my_hx is not None:
+            my_hx.close()
+    fam_hxs = {}
+    for name, dtype in FAMILY_HISTORY_COLUMNS:
+        fam_hxs[name] = np.concatenate([np.zeros(0, dtype=dtype)] +
+                                       [chunk[name] for chunk in chunks])
+    return fam_hxs
+
+##to debug load_pedigree_text
+#run_sim_fhx(500)
+#batch = load_pedigree_text("pedigree.txt")
+#print(len(batch), batch.num_people())
+#print(text_family_histories("pedigree.txt")["m2_br_ca"][:20])
+
+#summary statistics
+#family history signature of a family, the counts of its family history in
+#HISTORY_COLUMNS followed by the Mutn code of the proband
+SIGNATURE_COLUMNS = HISTORY_COLUMNS + ["Mutn"]
+#bits of each column in the integer keys of index_npy_signatures
+SIGNATURE_BITS = 8
+
+def family_signature(fam_hx, proband):
+    '''
+    Returns the family history signature of a family as a tuple of the
+    columns in SIGNATURE_COLUMNS, given its family history from
+    get_family_history and its proband
+    '''
+    return tuple(fam_hx[3:10]) + (proband.mutn,)
+
+class CountMinSketch(object):
+    '''
+    Approximate counts of any number of keys in a fixed depth x width
+    table. Each key is counted in one cell of every row picked by that
+    row's hash of the key, and its estimate is the smallest of those
+    cells, which is never below the true count and is above it by at most
+    about 2.7/width of all the counts added with probability
+    1 - exp(-depth)
+
+    Keys must be tuples of integers, whose hash is the same in every
+    process, so sketches with the same width, depth and seed made by
+    different workers can be merged
+    '''
+
+    #Mersenne prime for the row hashes
+    prime = (1 << 61) - 1
+
+    def __init__(self, width=2**16, depth=4, seed=0, state=None):
+        '''
+        Initializes an empty sketch with depth rows of width counters and
+        row hashes drawn from seed, or one with the counters of state from
+        get_state
+        '''
+        self.width = width
+        self.depth = depth
+        self.seed = seed
+        my_random = random.Random(seed)
+        self.hashes = [[my_random.randrange(1, self.prime),
+                        my_random.randrange(self.prime)]
+                       for row in range(depth)]
+        self.total = 0
+        self.rows = [[0]*width for row in range(depth)]
+        if state is not None:
+            self.total = state["total"]
+            self.rows = state["rows"]
+
+    def cells(self, key):
+        '''Returns the column of key in each row'''
+        value = hash(key)
+        prime = self.prime
+        width = self.width
+        return [(a*value + b) % prime % width for a, b in self.hashes]
+
+    def add(self, key, count=1):
+        '''Adds count to key and returns its new estimate'''
+        self.total += count
+        estimate = None
+        for row, cell in zip(self.rows, self.cells(key)):
+            row[cell] += count
+            if estimate is None or row[cell] < estimate:
+                estimate = row[cell]
+        return estimate
+
+    def estimate(self, key):
+        '''Returns the estimated count of key'''
+        return min([row[cell] for row, cell in
+                    zip(self.rows, self.cells(key))])
+
+    def merge(self, other):
+        '''Adds the counts of another sketch with the same shape and seed'''
+        if (other.width, other.depth, other.seed) != \
+           (self.width, self.depth, self.seed):
+            raise ValueError("Count-min sketches must have the same width, "
+                             "depth and seed to be merged")
+        self.total += other.total
+        for row, other_row in zip(self.rows, other.rows):
+            for cell in range(self.width):
+                row[cell] += other_row[cell]
+        return self
+
+    def get_state(self):
+        '''Returns the counters as JSON compatible lists'''
+        return {"width": self.width, "depth": self.depth, "seed": self.seed,
+                "total": self.total, "rows": self.rows}
+
+class SignatureIndex(object):
+    '''
+    Number of families with each family history signature, from which
+    report gives how many families are unique and the sizes of their
+    k-anonymity classes (the families sharing a signature)
+
+    counts: dictionary of exact counts key = signature
+    sketch: CountMinSketch counting the signatures instead of counts when
+        the number of different signatures is too large to keep, in which
+        case only the estimates of given signatures are available: the
+        sketch does not keep the signatures, so class_sizes and report
+        need the exact counts
+
+    The signatures of the BOADICEA pedigrees are limited by the pedigree
+    structure, so the exact counts stay small for any number of families
+    '''
+
+    def __init__(self, counts=None, sketch=None):
+        '''
+        Initializes an index with the exact counts, empty if None, or
+        with a CountMinSketch sketch instead
+        '''
+        self.sketch = sketch
+        self.counts = None
+        self.families = 0
+        if sketch is not None:
+            self.families = sketch.total
+        else:
+            self.counts = {}
+            if counts is not None:
+                for signature, count in counts.items():
+                    self.add(signature, count)
+
+    def add(self, signature, count=1):
+        '''
+        Adds count families with signature and returns the number of
+        families with it so far, estimated with a sketch
+        '''
+        self.families += count
+        if self.sketch is not None:
+            return self.sketch.add(signature, count)
+        count += self.counts.get(signature, 0)
+        self.counts[signature] = count
+        return count
+
+    def add_pedigree(self, pedigree, fam_hx):
+        '''
+        Adds a cancer pedigree given its family history and returns the
+        number of families with its signature so far
+        '''
+        return self.add(family_signature(fam_hx, pedigree[-1]))
+
+    def count(self, signature):
+        '''Returns the number of families with signature'''
+        if self.sketch is not None:
+            return self.sketch.estimate(signature)
+        return self.counts.get(signature, 0)
+
+    def merge(self, other):
+        '''Adds the counts of another SignatureIndex and returns self'''
+        if (self.sketch is None) != (other.sketch is None):
+            raise ValueError("Cannot merge exact and sketched signature "
+                             "indexes")
+        if self.sketch is not None:
+            self.sketch.merge(other.sketch)
+            self.families += other.families
+        else:
+            for signature, count in other.counts.items():
+                self.add(signature, count)
+        return self
+
+    def class_sizes(self):
+        '''
+        Returns a dictionary of the number of families in k-anonymity
+        classes of each size key = size
+        '''
+        if self.sketch is not None:
+            raise ValueError("Class sizes need the exact counts, a sketch "
+                             "only estimates the count of a signature")
+        sizes = {}
+        for count in self.counts.values():
+            sizes[count] = sizes.get(count, 0) + count
+        return sizes
+
+    def report(self, ks=(2, 5, 10)):
+        '''
+        Returns a dictionary with the number of families, of different
+        signatures and of unique families (alone in their class), and
+        key = "below_k" for each k in ks the number of families in classes
+        of fewer than k families, the families that are not k-anonymous
+        '''
+        sizes = self.class_sizes()
+        report = {"families": self.families, "signatures": len(self.counts),
+                  "unique": sizes.get(1, 0)}
+        for k in ks:
+            below = 0
+            for size, families in sizes.items():
+                if size < k:
+                    below += families
+            report["below_%d" % k] = below
+        return report
+
+def index_signatures(results, sketch=None):
+    '''
+    results: iterable of [cancer pedigree, family history] from
+        iter_pedigrees with family_history=True
+    sketch: CountMinSketch to count with instead of exact counts
+
+    Returns the SignatureIndex of the families of results
+    '''
+    index = SignatureIndex(sketch=sketch)
+    for ca_ped, fam_hx in results:
+        index.add_pedigree(ca_ped, fam_hx)
+    return index
+
+def index_npy_signatures(path, block_size=10**7, mmap_mode="r"):
+    '''
+    Returns the exact SignatureIndex of the families of a .npy bundle with
+    family histories written by NpyBundleWriter, counting block_size
+    families at a time with NumPy. Each signature is packed into one
+    integer with SIGNATURE_BITS bits per column so a block is counted with
+    one numpy.unique
+    '''
+    batch, fam_hxs = load_npy_bundle(path, mmap_mode)
+    if fam_hxs is None:
+        raise ValueError("Bundle %s has no family histories" % path)
+    proband_rows = batch.offsets[1:] - 1
+    index = SignatureIndex()
+    for start in range(0, len(batch), block_size):
+        stop = min(start + block_size, len(batch))
+        keys = np.zeros(stop - start, dtype="int64")
+        for position, name in enumerate(HISTORY_COLUMNS):
+            keys |= np.asarray(fam_hxs[name][start:stop], dtype="int64") << \
+                (SIGNATURE_BITS*position)
+        mutn = batch.mutn[proband_rows[start:stop]].astype("int64")
+        keys |= mutn << (SIGNATURE_BITS*len(HISTORY_COLUMNS))
+        values, counts = np.unique(keys, return_counts=True)
+        mask = (1 << SIGNATURE_BITS) - 1
+        for key, count in zip(values.tolist(), counts.tolist()):
+            signature = tuple([(key >> (SIGNATURE_BITS*position)) & mask
+                               for position in
+                               range(len(SIGNATURE_COLUMNS))])
+            index.add(signature, count)
+    return index
+
+##to debug SignatureIndex
+#print(index_signatures(iter_pedigrees(5000, family_history=True)).report())
+
+#columns of the table written by SimulationSummary.write
+SUMMARY_COLUMNS = ["table", "relation", "category", "value", "count"]
+
+class SimulationSummary(object):
+    '''
+    Counts over simulated pedigrees for runs that only need aggregates
+    instead of every person, kept as dictionaries of counts:
+    families: number of pedigrees
+    people: key = [relation, sex], relation from ROLES or "other"
+    carriers: key = [relation, Mutn] for Mutn 1, 2 and 3
+    cancers: key = [relation, "BrCa_1" or "OvCa", age band] where the age
+        band is the start of the band of the Antoniou et al 2004 tables
+        (30 for under 40, 40, 50, 60 and 70 for 70 and over)
+    signatures: key = family history signature from family_signature,
+        the counts of SignatureIndex
+
+    The number of keys is limited by the pedigree structure and does not
+    grow with the number of families, and summaries of different chunks,
+    workers or runs are combined with merge
+    '''
+
+    tables = ["people", "carriers", "cancers", "signatures"]
+
+    def __init__(self, state=None):
+        '''
+        Initializes an empty summary, or one with the counts of state from
+        get_state
+        '''
+        self.families = 0
+        self.people = {}
+        self.carriers = {}
+        self.cancers = {}
+        self.signatures = {}
+        if state is not None:
+            self.families = state["families"]
+            for table in self.tables:
+                counts = getattr(self, table)
+                for key, count in state[table]:
+                    counts[tuple(key)] = count
+
+    def add(self, pedigree, fam_hx, roles):
+        '''
+        pedigree: cancer pedigree
+        fam_hx: its family history from get_family_history
+        roles: dictionary of each person's role key = IndID, such as the
+            roles of the pedigree instance that made it
+
+        Adds the counts of one pedigree
+        '''
+        self.families += 1
+        people = self.people
+        carriers = self.carriers
+        cancers = self.cancers
+        for person in pedigree:
+            relation = roles.get(person.ind_id) or "other"
+            key = (relation, SEX_VALUES[person.sex])
+            people[key] = people.get(key, 0) + 1
+            mutn = person.mutn
+            if mutn in (1, 2, 3):
+                key = (relation, mutn)
+                carriers[key] = carriers.get(key, 0) + 1
+            for cancer, ca_age in [["BrCa_1", person.br_ca1],
+                                   ["OvCa", person.ov_ca]]:
+                if ca_age > 0:
+                    key = (relation, cancer, min(max(ca_age//10*10, 30), 70))
+                    cancers[key] = cancers.get(key, 0) + 1
+        key = family_signature(fam_hx, pedigree[-1])
+        self.signatures[key] = self.signatures.get(key, 0) + 1
+
+    def merge(self, other):
+        '''Adds the counts of another SimulationSummary and returns self'''
+        self.families += other.families
+        for table in self.tables:
+            counts = getattr(self, table)
+            for key, count in getattr(other, table).items():
+                counts[key] = counts.get(key, 0) + count
+        return self
+
+    def get_state(self):
+        '''
+        Returns the counts as JSON compatible lists, which
+        SimulationSummary(state) turns back into a summary
+        '''
+        state = {"families": self.families}
+        for table in self.tables:
+            state[table] = [[list(key), count] for key, count in
+                            sorted(getattr(self, table).items())]
+        return state
+
+    def rows(self):
+        '''
+        Returns the summary table as a list of rows with the columns in
+        SUMMARY_COLUMNS. Signatures are in the relation "proband" with the
+        category the SIGNATURE_COLUMNS joined by commas and the value the
+        signature joined by commas. The k_anonymity rows give the number
+        of families in k-anonymity classes of each size, the families in
+        classes of size 1 being unique
+        '''
+        rows = [["families", "all", "families", "", self.families]]
+        for key, count in sorted(self.people.items()):
+            rows.append(["people", key[0], "Sex", key[1], count])
+        for key, count in sorted(self.carriers.items()):
+            rows.append(["carriers", key[0], "Mutn", key[1], count])
+        for key, count in sorted(self.cancers.items()):
+            rows.append(["cancers", key[0], key[1], key[2], count])
+        category = ",".join(SIGNATURE_COLUMNS)
+        for key, count in sorted(self.signatures.items()):
+            rows.append(["signatures", "proband", category,
+                         ",".join(map(str, key)), count])
+        sizes = self.signature_index().class_sizes()
+        for size, families in sorted(sizes.items()):
+            rows.append(["k_anonymity", "proband", "class_size", size,
+                         families])
+        return rows
+
+    def signature_index(self):
+        '''Returns the SignatureIndex of the signature counts'''
+        return SignatureIndex(self.signatures)
+
+    def write(self, path="summary.txt"):
+        '''Writes the summary table to a tab separated text file'''
+        with open(path, "w") as my_file:
+            my_file.write("\t".join(SUMMARY_COLUMNS) + "\n")
+            for row in self.rows():
+                my_file.write("\t".join(map(str, row)) + "\n")
+
+def read_summary(path="summary.txt"):
+    '''
+    Returns the SimulationSummary of a table written by
+    SimulationSummary.write, so tables of separate runs can be merged
+    '''
+    summary = SimulationSummary()
+    with open(path) as my_file:
+        my_file.readline()
+        for line in my_file:
+            table, relation, category, value, count = \
+                line.rstrip("\n").split("\t")
+            count = int(count)
+            if table == "families":
+                summary.families += count
+            elif table == "people":
+                summary.people[(relation, value)] = count
+            elif table == "carriers":
+                summary.carriers[(relation, int(value))] = count
+            elif table == "cancers":
+                summary.cancers[(relation, category, int(value))] = count
+            elif table == "signatures":
+                key = tuple([int(x) for x in value.split(",")])
+                summary.signatures[key] = count
+            elif table == "k_anonymity":
+                continue
+            else:
+                raise ValueError("Unknown summary table %s" % table)
+    return summary
+
+##to debug SimulationSummary
+#summary = SimulationSummary()
+#new_ped = CancerPedigree()
+#ca_ped = simulate_pedigree(new_ped)
+#summary.add(ca_ped, new_ped.get_family_history(ca_ped), new_ped.roles)
+#for row in summary.merge(SimulationSummary(summary.get_state())).rows():
+#    print(row)
+
+def get_random_state():
+    '''Returns the state of the random module as JSON compatible lists'''
+    version, internal, gauss_next = random.getstate()
+    return [version, list(internal), gauss_next]
+
+def set_random_state(state):
+    '''Sets the state of the random module from get_random_state'''
+    random.setstate((state[0], tuple(state[1]), state[2]))
+
+def write_checkpoint(path, params, count, my_pedigree, my_hx, my_bundle,
+                     summary=None):
+    '''
+    Syncs the open outputs of write_simulation to disk and saves a JSON
+    checkpoint to path with the run parameters params, the number of
+    families written, the random state, the pedigree ID counters and the
+    state of each output, and the counts of the SimulationSummary summary
+    for run_summary
+
+    The checkpoint is written to a temporary file that then replaces path
+    so a checkpoint is never left half written
+    '''
+    outputs = {"pedigree": None, "family_history": None, "npy": None}
+    if my_pedigree is not None:
+        outputs["pedigree"] = my_pedigree.checkpoint()
+    if my_hx is not None:
+        outputs["family_history"] = my_hx.checkpoint()
+    if my_bundle is not None:
+        outputs["npy"] = my_bundle.checkpoint()
+    state = {"params": params, "families": count,
+             "random_state": get_random_state(),
+             "family_id": Pedigree.family_id, "ind_id": Pedigree.ind_id,
+             "outputs": outputs}
+    if summary is not None:
+        state["summary"] = summary.get_state()
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as my_file:
+        json.dump(state, my_file)
+        my_file.flush()
+        os.fsync(my_file.fileno())
+    os.replace(temp_path, path)
+
+def read_checkpoint(path):
+    '''Returns the checkpoint saved by write_checkpoint'''
+    with open(path) as my_file:
+        return json.load(my_file)
+
+def checkpoint_families(state):
+    '''
+    Returns the number of families written before the checkpoint state
+    from resume_checkpoint, 0 if state is None
+    '''
+    if state is None:
+        return 0
+    return state["families"]
+
+def resume_checkpoint(checkpoint, resume, params):
+    '''
+    checkpoint: path of the checkpoint file of a run, or None
+    resume: True to continue the run from the checkpoint
+    params: parameters of the run, which must match the checkpoint
+
+    Returns the checkpoint to give to write_simulation as resume_state
+    after setting the random state and pedigree ID counters it recorded,
+    or None to start a new run if resume is False or no checkpoint has
+    been written yet
+    '''
+    if checkpoint is None or not resume or not os.path.exists(checkpoint):
+        return None
+    state = read_checkpoint(checkpoint)
+    if state["params"] != params:
+        raise ValueError("Checkpoint %s is for a different run: %s" %
+                         (checkpoint, state["params"]))
+    set_random_state(state["random_state"])
+    Pedigree.family_id = state["family_id"]
+    Pedigree.ind_id = state["ind_id"]
+    return state
+
+def write_simulation(results, family_history=False, chunk_size=1000,
+                     return_results=True, output_format="text",
+                     npy_path="pedigree_npy", compression=None,
+                     shard_bytes=None, pedigree_file="pedigree.txt",
+                     family_history_file="familyhistory.txt",
+                     output_dir=".", checkpoint=None, resume_state=None,
+                     run_params=None):
+    '''
+    results: iterable from iter_pedigrees
+    family_history: True if results has family histories
+    output_format: "text" for the BOADICEA text files, "npy" for a bundle
+        of .npy files in npy_path written by NpyBundleWriter or "both"
+    compression: None, "gzip" or "zstd" to compress the text files
+    shard_bytes: size in bytes after which the text files are split into
+        a new shard as in TextOutput, one file each if None
+    output_dir: directory for pedigree_file, family_history_file and
+        npy_path, created if needed
+    checkpoint: path of a checkpoint file written with write_checkpoint
+        after each chunk_size families, with run_params as the parameters
+        of the run, or None for no checkpoints
+    resume_state: checkpoint from resume_checkpoint to continue the output
+        files from, results must then hold only the remaining families
+
+    Writes each pedigree to pedigree_file and, if family_history, each
+    family history to family_history_file as results are generated,
+    writing and flushing chunk_size families at a time. Uncompressed text
+    files get a ".idx" index of the families for PedigreeTextReader. The
+    .npy bundle gets one row group per chunk_size families
+
+    Returns the pedigrees, or a list of the pedigrees followed by the
+    family histories if family_history, when return_results is True and
+    otherwise the number of families written without keeping any of them.
+    When resuming, the number includes the families written before the
+    checkpoint but only the remaining families are returned
+    '''
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError("Unknown output format %s" % output_format)
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+    pedigree_file = os.path.join(output_dir, pedigree_file)
+    family_history_file = os.path.join(output_dir, family_history_file)
+    npy_path = os.path.join(output_dir, npy_path)
+    pedigrees = []
+    fam_hxs = []
+    my_pedigree = None
+    my_hx = None
+    my_bundle = None
+    count = 0
+    outputs = {"pedigree": None, "family_history": None, "npy": None}
+    if resume_state is not None:
+        count = resume_state["families"]
+        outputs = resume_state["outputs"]
+    try:
+        if output_format != "npy":
+            my_pedigree = TextOutput(pedigree_file, write_pedigree_header,
+                                     compression, shard_bytes,
+                                     state=outputs["pedigree"],
+                                     index=compression is None)
+            if family_history:
+                my_hx = TextOutput(family_history_file,
+                                   write_family_history_header, compression,
+                                   shard_bytes,
+                                   state=outputs["family_history"],
+                                   index=compression is None)
+        if output_format != "text":
+            my_bundle = NpyBundleWriter(npy_path, family_history,
+                                        outputs["npy"])
+        block = []
+        for result in results:
+            block.append(result)
+            if return_results and family_history:
+                pedigrees.append(result[0])
+                fam_hxs.append(result[1])
+            elif return_results:
+                pedigrees.append(result)
+            if len(block) == chunk_size:
+                count += write_simulation_block(block, my_pedigree, my_hx,
+                                                my_bundle, family_history)
+                block = []
+                if checkpoint is not None:
+                    write_checkpoint(checkpoint, run_params, count,
+                                     my_pedigree, my_hx, my_bundle)
+        count += write_simulation_block(block, my_pedigree, my_hx, my_bundle,
+                                        family_history)
+        if checkpoint is not None:
+            write_checkpoint(checkpoint, run_params, count, my_pedigree,
+                             my_hx, my_bundle)
+    finally:
+        if my_pedigree is not None:
+            my_pedigree.close()
+        if my_hx is not None:
+            my_hx.close()
+        if my_bundle is not None:
+            my_bundle.close()
+    if not return_results:
+        return count
+    if family_history:
+        return [pedigrees, fam_hxs]
+    return pedigrees
+
+def write_simulation_block(block, my_pedigree, my_hx, my_bundle=None,
+                           family_history=False):
+    '''
+    Writes a block of results from iter_pedigrees to the open pedigree
+    file and family history file, and to the NpyBundleWriter my_bundle,
+    for write_simulation, skipping any of them that is None
+
+    Returns the number of families written
+    '''
+    if family_history:
+        block_peds = [result[0] for result in block]
+        block_hxs = [result[1] for result in block]
+    else:
+        block_peds = block
+    size = len(block) + 1
+    if my_pedigree is not None:
+        write_pedigree_rows(my_pedigree, block_peds, size)
+    if my_hx is not None:
+        write_family_history_rows(my_hx, block_hxs, size)
+    if my_bundle is not None:
+        my_bundle.write_pedigrees(block_peds)
+        if family_history:
+            my_bundle.write_family_histories(block_hxs)
+    return len(block)
+
+#simulation
+#largest number of people in a pedigree from make_healthy_pedigree:
+#4 grandparents, 2 parents, 4 aunts/uncles on each side, 4 siblings and the
+#proband
+MAX_PEDIGREE_SIZE = 19
+#most generations below a person in a pedigree made with generations:
+#each child is at least 20 years younger than their mother, who is at most
+#91 and at least Pedigree.min_parent_age
+MAX_DESCENT = 4
+
+def pedigree_size_bound(generations=None):
+    '''
+    Returns the number of individual IDs to reserve for each family of a
+    run_parallel run: the largest pedigree that can be made,
+    MAX_PEDIGREE_SIZE, or for pedigrees made with generations the size of
+    the pedigree when everyone has 4 siblings and a partner and 4 children
+    wherever the generations allow. Ages are capped at 91, so no line of
+    descent goes down more than MAX_DESCENT generations before the
+    children are too young to be parents
+    '''
+    if generations is None:
+        return MAX_PEDIGREE_SIZE
+    ancestors, descendants = check_generations(generations)
+    #most partners and descendants of a person with each number of
+    #generations below them
+    below = [0]
+    for depth in range(MAX_DESCENT):
+        below.append(1 + 4 * (1 + below[-1]))
+    size = 1 + below[min(descendants, MAX_DESCENT)]
+    for generation in range(1, ancestors + 1):
+        depth = min(generation - 1 + descendants, MAX_DESCENT)
+        #the ancestors of this generation and the siblings of the
+        #generation below them
+        size += 2 ** generation
+        size += 4 * 2 ** (generation - 1) * (1 + below[depth])
+    return max(MAX_PEDIGREE_SIZE, size)
+
+#simulation modes named after the run_* function they reproduce
+SIMULATION_MODES = ["simulation", "sim_fhx", "ca_sims", "ca_sim_fhx"]
+
+def simulate_pedigree(new_ped, carriers_only=False, founder_sampler=None):
+    '''
+    Runs steps 1 to 5 of run_simulation for one family with the pedigree
+    instance new_ped
+
+    If carriers_only is True and founder_sampler is a
+    CarrierFounderSampler, steps 2 and 3 are drawn given that a founder
+    has a mutation
+
+    Returns the cancer pedigree, or None if carriers_only is True and no
+    founder has a mutation
+    '''
+    h_ped = new_ped.make_healthy_pedigree()
+    if carriers_only and founder_sampler is not None:
+        founder_mutns = founder_sampler.get_carrier_founders(new_ped, h_ped)
+    else:
+        founder_ca = new_ped.get_founder_ca(h_ped)
+        founder_mutns = new_ped.get_founder_mutns(founder_ca)
+    founders = []
+    for person in founder_mutns:
+        if person.mutn > 0:
+            founders.append(person)
+    if carriers_only and len(founders) == 0:
+        return None
+    for person in founders:
+        new_ped.pass_founder_mutn(person, founder_mutns)
+    return new_ped.make_ca_pedigree(founder_mutns)
+
+def iter_pedigrees(num_trials, carriers_only=False, family_history=False,
+                   engine="scalar", carrier_sampling="rejection",
+                   generations=None):
+    '''
+    Generates num_trials pedigrees one family at a time following the
+    steps in run_simulation
+
+    carriers_only: only keep pedigrees where a founder has a mutation, as
+        in run_ca_sims
+    family_history: also compute the summary family history of each
+        pedigree, as in run_sim_fhx
+    engine: "scalar", "icdf" or "numpy" as in run_simulation, "numpy" is
+        not available with carriers_only
+    carrier_sampling: with carriers_only, "rejection" simulates pedigrees
+        until a founder has a mutation, "direct" draws founders given that
+        one has a mutation with CarrierFounderSampler
+    generations: [up, down] to make N-generation pedigrees with
+        make_generations, or None for the pedigrees of
+        make_healthy_pedigree, needs the "scalar" or "icdf" engine
+
+    Yields each cancer pedigree, or a list of the cancer pedigree followed
+    by its family history if family_history is True
+    '''
+    if engine == "numpy":
+        if carriers_only:
+            raise ValueError("The numpy engine does not run carrier only "
+                             "simulations")
+        if generations is not None:
+            raise ValueError("The numpy engine only makes three generation "
+                             "pedigrees")
+        families = VectorizedCancerEngine().iter_ca_pedigrees(num_trials)
+    elif engine in PEDIGREE_ENGINES:
+        if carrier_sampling == "direct":
+            founder_sampler = CarrierFounderSampler()
+        elif carrier_sampling == "rejection":
+            founder_sampler = None
+        else:
+            raise ValueError("Unknown carrier sampling %s" %
+                             carrier_sampling)
+        families = iter_scalar_pedigrees(num_trials, carriers_only,
+                                         PEDIGREE_ENGINES[engine],
+                                         founder_sampler, generations)
+    else:
+        raise ValueError("Unknown engine %s" % engine)
+    for new_ped, ca_ped in families:
+        if family_history:
+            fam_hx = new_ped.get_family_history(ca_ped)
+            yield [ca_ped, fam_hx]
+        else:
+            yield ca_ped
+
+def iter_scalar_pedigrees(num_trials, carriers_only, pedigree_class,
+                          founder_sampler=None, generations=None):
+    '''
+    Yields the pedigree instance and cancer pedigree for each of
+    num_trials families simulated person by person with pedigree_class,
+    made with generations if it is not None
+    '''
+    x = 1
+    while x <= num_trials:
+        new_ped = pedigree_class(generations)
+        ca_ped = simulate_pedigree(new_ped, carriers_only, founder_sampler)
+        if ca_ped is not None:
+            yield new_ped, ca_ped
+            x += 1
+
+##to debug iter_pedigrees
+#for ca_ped, fam_hx in iter_pedigrees(5, family_history=True):
+#    print(fam_hx)
+
+def run_simulation(num_trials, engine="scalar", return_results=True,
+                   output_format="text", checkpoint=None, resume=False):
+    '''
+    Runs pedigree simulation for number of trials specified
+
+    Produces file "pedigree.txt" that contains number of specified
+    pedigrees
+
+    For each family in pedigrees goes through the following steps:
+    1) Makes a healthy pedigree with designated proband, proband's
+    parents, proband's grandparents, proband's aunts/uncles
+    2) Randomly assigns pedigree founders (proband's grandparents)
+    cancer using probabilties from Antoniou et al 2004 Table 1
+    3) Randomly assigns pedigree founder mutations based on their cancer
+    status using probabilities from Antonious et al 2004 Table 2
+    4) Passes founder mutations from founder to each offspring with 50%
+    chance of passing mutation
+    5) Randomly assigns cancer to remaining individuals in pedigree
+
+    engine: "scalar" assigns cancer person by person with yearly draws,
+    "icdf" assigns cancer person by person with InverseCdfCancerPedigree,
+    "numpy" assigns cancer to blocks of pedigrees at once with
+    VectorizedCancerEngine
+
+    Pedigrees are written to "pedigree.txt" as they are generated. If
+    return_results is False they are not kept and the number of pedigrees
+    is returned instead of the pedigrees, so memory use does not grow with
+    num_trials
+
+    output_format: "text", "npy" or "both" as in write_simulation, the
+    .npy bundle is written to the directory "pedigree_npy"
+
+    checkpoint: path of a file where the progress of the run is saved
+    every 1000 pedigrees, or None. Calling again with the same arguments
+    and resume=True continues the run from the checkpoint with the same
+    output as a run that was not stopped. Needs the "scalar" or "icdf"
+    engine
+    '''
+    if checkpoint is not None and engine == "numpy":
+        raise ValueError("Checkpoints need the scalar or icdf engine")
+    params = {"run": "run_simulation", "num_trials": num_trials,
+              "engine": engine, "output_format": output_format}
+    state = resume_checkpoint(checkpoint, resume, params)
+    results = iter_pedigrees(num_trials - checkpoint_families(state),
+                             engine=engine)
+    return write_simulation(results, return_results=return_results,
+                            output_format=output_format,
+                            checkpoint=checkpoint, resume_state=state,
+                            run_params=params)
+
+#run_simulation(500)            
+
+def run_sim_fhx(num_trials, engine="scalar", return_results=True,
+                output_format="text", checkpoint=None, resume=False):
+    '''
+    Runs simulation according to specifications given in run_simulation
+    but also produces a file with the summary family history for the
+    proband in each pedigree
+
+    engine: "scalar", "icdf" or "numpy" as in run_simulation
+    output_format: "text", "npy" or "both" as in run_simulation
+    checkpoint, resume: as in run_simulation
+
+    Returns a list including all the pedigree information followed by
+    the summary family history information, or the number of pedigrees if
+    return_results is False
+    '''
+    if checkpoint is not None and engine == "numpy":
+        raise ValueError("Checkpoints need the scalar or icdf engine")
+    params = {"run": "run_sim_fhx", "num_trials": num_trials,
+              "engine": engine, "output_format": output_format}
+    state = resume_checkpoint(checkpoint, resume, params)
+    results = iter_pedigrees(num_trials - checkpoint_families(state),
+                             family_history=True, engine=engine)
+    return write_simulation(results, True, return_results=return_results,
+                            output_format=output_format,
+                            checkpoint=checkpoint, resume_state=state,
+                            run_params=params)
+
+#run_sim_fhx(5)
+
+def run_ca_sims(num_trials, engine="scalar", return_results=True,
+                carrier_sampling="rejection", output_format="text",
+                checkpoint=None, resume=False):
+    '''
+    Does the same thing as the function run simulation but only
+    returns pedigrees where at least one family member has a mutation
+    
+    Runs very slowly due to small probability of developing mutation
+    if an individual develops cancer, unless carrier_sampling is "direct"
+    so founders are drawn given that one has a mutation instead of
+    rejecting pedigrees without one
+
+    engine: "scalar" or "icdf" as in run_simulation
+    output_format: "text", "npy" or "both" as in run_simulation
+    checkpoint, resume: as in run_simulation
+    '''
+    params = {"run": "run_ca_sims", "num_trials": num_trials,
+              "engine": engine, "carrier_sampling": carrier_sampling,
+              "output_format": output_format}
+    state = resume_checkpoint(checkpoint, resume, params)
+    results = iter_pedigrees(num_trials - checkpoint_families(state),
+                             carriers_only=True, engine=engine,
+                             carrier_sampling=carrier_sampling)
+    return write_simulation(results, return_results=return_results,
+                            output_format=output_format,
+                            checkpoint=checkpoint, resume_state=state,
+                            run_params=params)
+
+#run_ca_sims(5)
+
+def run_ca_sim_fhx(num_trials, engine="scalar", return_results=True,
+                   carrier_sampling="rejection", output_format="text",
+                   checkpoint=None, resume=False):
+    '''
+    Runs simulations with same specifications in run_ca_sim but also
+    produces a file with the summary family history for the proband in
+    each pedigree
+
+    engine: "scalar" or "icdf" as in run_simulation
+    carrier_sampling: "rejection" or "direct" as in run_ca_sims
+    output_format: "text", "npy" or "both" as in run_simulation
+    checkpoint, resume: as in run_simulation
+
+    Return a list of the pedigrees followed by the family histories
+    '''
+    params = {"run": "run_ca_sim_fhx", "num_trials": num_trials,
+              "engine": engine, "carrier_sampling": carrier_sampling,
+              "output_format": output_format}
+    state = resume_checkpoint(checkpoint, resume, params)
+    results = iter_pedigrees(num_trials - checkpoint_families(state),
+                             carriers_only=True, family_history=True,
+                             engine=engine,
+                             carrier_sampling=carrier_sampling)
+    return write_simulation(results, True, return_results=return_results,
+                            output_format=output_format,
+                            checkpoint=checkpoint, resume_state=state,
+                            run_params=params)
+
+#run_ca_sim_fhx(5)
+
+#ways run_parallel seeds the random module, once per chunk or once per
+#family
+RANDOM_STREAMS = ["chunk", "family"]
+
+def family_seed(seed, fam_id):
+    '''
+    Returns the seed of the random stream of the family with family ID
+    fam_id in a run_parallel run with streams="family"
+    '''
+    return "%s:family:%s" % (seed, fam_id)
+
+def simulate_family(index, engine, carriers_only, ids_per_family,
+                    founder_sampler=None, generations=None):
+    '''
+    Simulates the family at position index of a run_parallel run with the
+    random module as it is, giving it family ID index + 1 and individual
+    IDs from index * ids_per_family + 1
+
+    Raises a ValueError if the family needs more than ids_per_family
+    individual IDs, which would otherwise be taken from the next family
+
+    Returns the pedigree instance and the cancer pedigree
+    '''
+    ca_ped = None
+    while ca_ped is None:
+        Pedigree.family_id = index
+        Pedigree.ind_id = index * ids_per_family
+        new_ped = PEDIGREE_ENGINES[engine](generations)
+        ca_ped = simulate_pedigree(new_ped, carriers_only, founder_sampler)
+        if Pedigree.ind_id > (index + 1) * ids_per_family:
+            raise ValueError("Family %d has more than %d people" %
+                             (index + 1, ids_per_family))
+    return new_ped, ca_ped
+
+def simulate_chunk(task):
+    '''
+    task: list of [mode, engine, seed, start, count, ids_per_family,
+        carrier_sampling, streams, summary, generations]
+
+    Simulates families start + 1 to start + count for run_parallel with
+    the random module seeded from seed and start, or if streams is
+    "family" seeded from seed and the family ID before each family. Family
+    k gets family ID k and the families of the chunk get individual IDs
+    from the block start * ids_per_family + 1 to
+    (start + count) * ids_per_family, so the families are the same
+    whichever process simulates them
+
+    Returns a list of the pedigrees followed by the family histories, or
+    if summary is True a SimulationSummary of the chunk without keeping
+    the pedigrees
+    '''
+    mode, engine, seed, start, count, ids_per_family, carrier_sampling, \
+        streams, summary, generations = task
+    random.seed("%s:%s" % (seed, start))
+    carriers_only = mode in ["ca_sims", "ca_sim_fhx"]
+    family_history = mode in ["sim_fhx", "ca_sim_fhx"]
+    founder_sampler = None
+    if carrier_sampling == "direct":
+        founder_sampler = CarrierFounderSampler()
+    if engine == "numpy":
+        Pedigree.family_id = start
+        Pedigree.ind_id = start * ids_per_family
+        pedigrees = VectorizedCancerEngine().make_ca_pedigrees(count)
+        new_sim = CancerPedigree()
+        families = [(new_sim, ca_ped) for ca_ped in pedigrees]
+        #the numpy engine gives the chunk one contiguous block of IDs
+        if Pedigree.ind_id > (start + count) * ids_per_family:
+            raise ValueError("Pedigrees have more than %d people on "
+                             "average" % ids_per_family)
+    else:
+        families = iter_chunk_families(seed, start, count, engine,
+                                       carriers_only, ids_per_family,
+                                       founder_sampler, streams, generations)
+    pedigrees = []
+    fam_hxs = []
+    chunk_summary = SimulationSummary()
+    for new_ped, ca_ped in families:
+        if summary:
+            chunk_summary.add(ca_ped, new_ped.get_family_history(ca_ped),
+                              new_ped.roles)
+            continue
+        pedigrees.append(ca_ped)
+        if family_history:
+            fam_hxs.append(new_ped.get_family_history(ca_ped))
+    if summary:
+        return chunk_summary
+    return [pedigrees, fam_hxs]
+
+def iter_chunk_families(seed, start, count, engine, carriers_only,
+                        ids_per_family, founder_sampler, streams,
+                        generations=None):
+    '''
+    Yields the pedigree instance and cancer pedigree of each family of a
+    chunk of simulate_chunk simulated person by person
+    '''
+    for index in range(start, start + count):
+        if streams == "family":
+            random.seed(family_seed(seed, index + 1))
+        yield simulate_family(index, engine, carriers_only, ids_per_family,
+                              founder_sampler, generations)
+
+def regenerate_family(seed, fam_id, mode="simulation", engine="scalar",
+                      ids_per_family=None, carrier_sampling="rejection",
+                      generations=None):
+    '''
+    Simulates again only the family with family ID fam_id of a run_parallel
+    run with streams="family" and the same seed, mode, engine,
+    ids_per_family, carrier_sampling and generations, without simulating
+    the families before it
+
+    Run inside "with StageProfiler(trace=True):" to print each stage of
+    the family as it is simulated. The random state and pedigree ID
+    counters are restored afterwards
+
+    Returns the cancer pedigree, or a list of the cancer pedigree followed
+    by its family history for "sim_fhx" and "ca_sim_fhx", as in
+    iter_pedigrees
+    '''
+    if mode not in SIMULATION_MODES:
+        raise ValueError("Unknown simulation mode %s" % mode)
+    if engine not in PEDIGREE_ENGINES:
+        raise ValueError("Only the scalar and icdf engines have family "
+                         "streams")
+    if ids_per_family is None:
+        ids_per_family = pedigree_size_bound(generations)
+    founder_sampler = None
+    if carrier_sampling == "direct":
+        founder_sampler = CarrierFounderSampler()
+    random_state = random.getstate()
+    family_id = Pedigree.family_id
+    ind_id = Pedigree.ind_id
+    try:
+        random.seed(family_seed(seed, fam_id))
+        new_ped, ca_ped = simulate_family(fam_id - 1, engine,
+                                          mode in ["ca_sims", "ca_sim_fhx"],
+                                          ids_per_family, founder_sampler,
+                                          generations)
+    finally:
+        random.setstate(random_state)
+        Pedigree.family_id = family_id
+        Pedigree.ind_id = ind_id
+    if mode in ["sim_fhx", "ca_sim_fhx"]:
+        return [ca_ped, new_ped.get_family_history(ca_ped)]
+    return ca_ped
+
+##to debug regenerate_family
+#run_parallel(50, "sim_fhx", seed=1, chunk_size=10, streams="family")
+#with StageProfiler(trace=True):
+#    print(regenerate_family(1, 37, "sim_fhx"))
+
+def check_parallel_options(mode, engine, carrier_sampling, streams,
+                           generations=None):
+    '''
+    Raises a ValueError if the options of run_parallel or run_summary
+    cannot be used together
+    '''
+    if mode not in SIMULATION_MODES:
+        raise ValueError("Unknown simulation mode %s" % mode)
+    if engine != "numpy" and engine not in PEDIGREE_ENGINES:
+        raise ValueError("Unknown engine %s" % engine)
+    if engine == "numpy" and mode in ["ca_sims", "ca_sim_fhx"]:
+        raise ValueError("The numpy engine does not run carrier only "
+                         "simulations")
+    if carrier_sampling not in ["rejection", "direct"]:
+        raise ValueError("Unknown carrier sampling %s" % carrier_sampling)
+    if streams not in RANDOM_STREAMS:
+        raise ValueError("Unknown random streams %s" % streams)
+    if engine == "numpy" and streams == "family":
+        raise ValueError("The numpy engine does not have family streams")
+    if generations is not None:
+        check_generations(generations)
+        if engine == "numpy":
+            raise ValueError("The numpy engine only makes three generation "
+                             "pedigrees")
+
+#largest individual ID of the int32 ID columns of PedigreeBatch, which
+#the .npy output is written from
+MAX_BATCH_ID = 2**31 - 1
+
+def check_npy_ids(num_trials, ids_per_family, output_format):
+    '''
+    Raises a ValueError if output_format includes the .npy output and the
+    num_trials families of a run_parallel run with ids_per_family
+    individual IDs each could go past MAX_BATCH_ID, so the run fails
+    before any family is simulated instead of part way through
+    '''
+    if output_format == "text":
+        return
+    if num_trials * ids_per_family > MAX_BATCH_ID:
+        raise ValueError("%d families of %d individual IDs each do not fit "
+                         "the int32 IDs of the npy output, use text output "
+                         "or fewer families" % (num_trials, ids_per_family))
+
+def run_parallel(num_trials, mode="simulation", workers=None, seed=None,
+                 chunk_size=1000, engine="scalar", ids_per_family=None,
+                 return_results=True, carrier_sampling="rejection",
+                 output_format="text", compression=None, shard_bytes=None,
+                 output_dir=".", checkpoint=None, resume=False,
+                 streams="chunk", generations=None):
+    '''
+    Runs one of the simulations run_simulation, run_sim_fhx, run_ca_sims
+    or run_ca_sim_fhx split across worker processes
+
+    num_trials: number of pedigrees
+    mode: "simulation", "sim_fhx", "ca_sims" or "ca_sim_fhx" for the
+        simulation to run
+    workers: number of worker processes, all processors if None and no
+        extra processes if 1
+    seed: seed for the simulation, drawn from the random module if None
+    chunk_size: number of families in each chunk given to a worker, each
+        chunk has its own random stream seeded from seed and its position
+    engine: "scalar", "icdf" or "numpy" as in run_simulation, "numpy" only
+        for "simulation" and "sim_fhx"
+    ids_per_family: number of individual IDs reserved for each family,
+        from pedigree_size_bound if None
+    return_results: as in run_simulation
+    carrier_sampling: "rejection" or "direct" as in run_ca_sims
+    output_format: "text", "npy" or "both" as in run_simulation
+    compression, shard_bytes: compression and shard size of the text files
+        as in write_simulation
+    output_dir: directory for the output files as in write_simulation
+    checkpoint, resume: as in run_simulation, the checkpoint is saved after
+        each chunk and if seed is None the seed of the checkpoint is used
+    streams: "chunk" to seed the random module once per chunk or "family"
+        to seed it from the seed and family ID before each family, so the
+        output does not depend on chunk_size and any family can be
+        simulated again alone with regenerate_family. "family" needs the
+        "scalar" or "icdf" engine
+    generations: [up, down] for N-generation pedigrees as in
+        iter_pedigrees, or None
+
+    The chunks are written in order to "pedigree.txt" and, for "sim_fhx"
+    and "ca_sim_fhx", "familyhistory.txt" as they finish, so the output
+    for a given seed and chunk_size is the same for any number of workers
+
+    Returns the same as the run_* function for mode
+    '''
+    check_parallel_options(mode, engine, carrier_sampling, streams,
+                           generations)
+    if generations is not None:
+        generations = check_generations(generations)
+    if ids_per_family is None:
+        ids_per_family = pedigree_size_bound(generations)
+    check_npy_ids(num_trials, ids_per_family, output_format)
+    if seed is None and resume and checkpoint is not None and \
+       os.path.exists(checkpoint):
+        seed = read_checkpoint(checkpoint)["params"]["seed"]
+    if seed is None:
+        seed = random.getrandbits(64)
+    params = {"run": "run_parallel", "num_trials": num_trials, "mode": mode,
+              "seed": seed, "chunk_size": chunk_size, "engine": engine,
+              "ids_per_family": ids_per_family,
+              "carrier_sampling": carrier_sampling,
+              "output_format": output_format, "compression": compression,
+              "shard_bytes": shard_bytes, "output_dir": output_dir,
+              "streams": streams, "generations": generations}
+    state = resume_checkpoint(checkpoint, resume, params)
+    tasks = []
+    for start in range(checkpoint_families(state), num_trials, chunk_size):
+        count = min(chunk_size, num_trials - start)
+        tasks.append([mode, engine, seed, start, count, ids_per_family,
+                      carrier_sampling, streams, False, generations])
+    family_history = mode in ["sim_fhx", "ca_sim_fhx"]
+    results = iter_parallel_results(tasks, workers, family_history)
+    return write_simulation(results, family_history, chunk_size,
+                            return_results, output_format,
+                            compression=compression, shard_bytes=shard_bytes,
+                            output_dir=output_dir, checkpoint=checkpoint,
+                            resume_state=state, run_params=params)
+
+def iter_parallel_results(tasks, workers, family_history):
+    '''
+    Runs simulate_chunk on each task with a pool of workers processes, or
+    in this process if workers is 1, and yields the results of each family
+    in order in the format of iter_pedigrees
+    '''
+    for chunk_peds, chunk_hxs in iter_parallel_chunks(tasks, workers):
+        for result in iter_chunk_results(chunk_peds, chunk_hxs,
+                                         family_history):
+            yield result
+
+#chunks simulated ahead of the writer for each worker process
+CHUNKS_PER_WORKER = 2
+
+def iter_parallel_chunks(tasks, workers):
+    '''
+    Runs simulate_chunk on each task with a pool of workers processes, or
+    in this process if workers is 1, and yields the result of each chunk
+    in order
+
+    At most CHUNKS_PER_WORKER chunks per worker are submitted ahead of the
+    chunk being yielded, so finished chunks do not pile up in memory when
+    the workers are faster than the output is written
+    '''
+    if workers == 1:
+        random_state = random.getstate()
+        family_id = Pedigree.family_id
+        ind_id = Pedigree.ind_id
+        try:
+            for task in tasks:
+                yield simulate_chunk(task)
+        finally:
+            random.setstate(random_state)
+            Pedigree.family_id = family_id
+            Pedigree.ind_id = ind_id
+        return
+    if workers is None:
+        workers = os.cpu_count() or 1
+    pool = multiprocessing.Pool(workers)
+    try:
+        pending = collections.deque()
+        tasks = iter(tasks)
+        for task in tasks:
+            pending.append(pool.apply_async(simulate_chunk, [task]))
+            if len(pending) >= CHUNKS_PER_WORKER * workers:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+    finally:
+        pool.terminate()
+        pool.join()
+
+def iter_chunk_results(chunk_peds, chunk_hxs, family_history):
+    '''Yields the results of one chunk in the format of iter_pedigrees'''
+    if family_history:
+        for index in range(len(chunk_peds)):
+            yield [chunk_peds[index], chunk_hxs[index]]
+    else:
+        for ca_ped in chunk_peds:
+            yield ca_ped
+
+#run_parallel(500, "sim_fhx", workers=4, seed=1)
+
+def run_summary(num_trials, mode="sim_fhx", workers=None, seed=None,
+                chunk_size=1000, engine="scalar", ids_per_family=None,
+                carrier_sampling="rejection", output_dir=".",
+                summary_file="summary.txt", checkpoint=None, resume=False,
+                streams="chunk", generations=None):
+    '''
+    Runs the simulation of mode as in run_parallel but writes only a
+    SimulationSummary table to summary_file in output_dir instead of
+    pedigree.txt and familyhistory.txt. Each worker summarizes its chunks
+    as it simulates them and the chunk summaries are merged in order, so
+    memory use does not grow with num_trials. The family histories are
+    counted for every mode
+
+    The arguments are as in run_parallel. With a checkpoint the merged
+    counts are saved after each chunk and resume=True continues from them
+
+    Returns the SimulationSummary
+    '''
+    check_parallel_options(mode, engine, carrier_sampling, streams,
+                           generations)
+    if generations is not None:
+        generations = check_generations(generations)
+    if ids_per_family is None:
+        ids_per_family = pedigree_size_bound(generations)
+    if seed is None and resume and checkpoint is not None and \
+       os.path.exists(checkpoint):
+        seed = read_checkpoint(checkpoint)["params"]["seed"]
+    if seed is None:
+        seed = random.getrandbits(64)
+    params = {"run": "run_summary", "num_trials": num_trials, "mode": mode,
+              "seed": seed, "chunk_size": chunk_size, "engine": engine,
+              "ids_per_family": ids_per_family,
+              "carrier_sampling": carrier_sampling, "output_dir": output_dir,
+              "summary_file": summary_file, "streams": streams,
+              "generations": generations}
+    state = resume_checkpoint(checkpoint, resume, params)
+    summary = SimulationSummary()
+    if state is not None:
+        summary = SimulationSummary(state["summary"])
+    tasks = []
+    for start in range(summary.families, num_trials, chunk_size):
+        count = min(chunk_size, num_trials - start)
+        tasks.append([mode, engine, seed, start, count, ids_per_family,
+                      carrier_sampling, streams, True, generations])
+    for chunk_summary in iter_parallel_chunks(tasks, workers):
+        summary.merge(chunk_summary)
+        if checkpoint is not None:
+            write_checkpoint(checkpoint, params, summary.families, None,
+                             None, None, summary)
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+    summary.write(os.path.join(output_dir, summary_file))
+    return summary
+
+##to debug run_summary
+#for row in run_summary(500, workers=4, seed=1).rows()[:20]:
+#    print(row)
+
+
+#profiling
+class CountingRandom(object):
+    '''
+    Stands in for the random module while a StageProfiler is enabled,
+    passing each call on to the random module and counting the draws
+    '''
+
+    #functions of the random module that do not draw random numbers
+    not_draws = ["seed", "getstate", "setstate"]
+
+    def __init__(self, module, profiler):
+        self.module = module
+        self.profiler = profiler
+
+    def __getattr__(self, name):
+        '''Returns the attribute of the random module, counting calls'''
+        value = getattr(self.module, name)
+        if name in self.not_draws or not callable(value):
+            return value
+        profiler = self.profiler
+        def draw(*args, **kwargs):
+            profiler.count_draw(name)
+            return value(*args, **kwargs)
+        return draw
+
+class StageProfiler(object):
+    '''
+    Opt-in profiler for the person by person simulations that records the
+    wall time, calls and random draws of each stage of the pipeline and
+    the pedigrees rejected by the carrier only simulations
+
+    Nothing is changed until enable is called. enable replaces the
+    methods in methods, the functions in functions and the module global
+    random with counting wrappers and disable puts the originals back, so
+    a disabled profiler adds no overhead. Only the current process is
+    profiled, so run_parallel should be given workers=1
+
+    Usage:
+    with StageProfiler() as profiler:
+        run_ca_sims(10)
+    profiler.write_report("profile.json")
+
+    With trace=True each stage call is also printed as it returns, with
+    its nesting, time and result, which is useful with regenerate_family
+    '''
+
+    #(class, method name) of the methods timed as stages
+    methods = [(Pedigree, "make_healthy_pedigree"),
+               (CancerPedigree, "get_founder_ca"),
+               (CancerPedigree, "get_founder_mutns"),
+               (CancerPedigree, "pass_founder_mutn"),
+               (CancerPedigree, "make_ca_pedigree"),
+               (CancerPedigree, "get_br_cancer"),
+               (CancerPedigree, "get_ov_cancer"),
+               (CancerPedigree, "get_mutn_br"),
+               (CancerPedigree, "get_mutn_ov"),
+               (CancerPedigree, "get_family_history"),
+               (InverseCdfCancerPedigree, "get_br_cancer"),
+               (InverseCdfCancerPedigree, "get_ov_cancer"),
+               (CarrierFounderSampler, "get_carrier_founders")]
+    #module functions timed as stages
+    functions = ["simulate_pedigree", "write_pedigree_rows",
+                 "write_family_history_rows"]
+
+    def __init__(self, trace=False):
+        self.trace = trace
+        self.stages = {}
+        self.draws = {}
+        self.rejections = 0
+        self.accepted = 0
+        self.stack = []
+        self.originals = []
+        self.start = None
+        self.seconds = 0.0
+
+    def __enter__(self):
+        self.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.disable()
+        return False
+
+    def get_stage(self, name):
+        '''Returns the counts of stage name, adding them if needed'''
+        if name not in self.stages:
+            self.stages[name] = {"calls": 0, "seconds": 0.0,
+                                 "self_seconds": 0.0, "draws": 0}
+        return self.stages[name]
+
+    def count_draw(self, name):
+        '''Counts a call to random function name in the current stage'''
+        self.draws[name] = self.draws.get(name, 0) + 1
+        if self.stack:
+            self.get_stage(self.stack[-1][0])["draws"] += 1
+
+    def wrap(self, name, func):
+        '''
+        Returns a function that calls func and adds its time to stage
+        name, counting rejected pedigrees if func is simulate_pedigree
+        '''
+        profiler = self
+        stage = self.get_stage(name)
+        count_pedigrees = name == "simulate_pedigree"
+        def timed(*args, **kwargs):
+            frame = [name, 0.0]
+            profiler.stack.append(frame)
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                profiler.stack.pop()
+                stage["calls"] += 1
+                stage["seconds"] += elapsed
+                stage["self_seconds"] += elapsed - frame[1]
+                if profiler.stack:
+                    profiler.stack[-1][1] += elapsed
+            if profiler.trace:
+                print("%s%s %.6f s -> %.200s" % ("  " * len(profiler.stack),
+                                                 name, elapsed, result))
+            if count_pedigrees:
+                if result is None:
+                    profiler.rejections += 1
+                else:
+                    profiler.accepted += 1
+            return result
+        return timed
+
+    def enable(self):
+        '''Installs the counting wrappers'''
+        if self.originals:
+            return
+        module = globals()
+        for cls, name in self.methods:
+            func = cls.__dict__[name]
+            self.originals.append([cls, name, func])
+            setattr(cls, name, self.wrap("%s.%s" % (cls.__name__, name),
+                                         func))
+        for name in self.functions:
+            self.originals.append([None, name, module[name]])
+            module[name] = self.wrap(name, module[name])
+        self.originals.append([None, "random", module["random"]])
+        module["random"] = CountingRandom(module["random"], self)
+        self.start = time.perf_counter()
+
+    def disable(self):
+        '''Puts back the original methods, functions and random module'''
+        if not self.originals:
+            return
+        self.seconds += time.perf_counter() - self.start
+        module = globals()
+        for cls, name, func in reversed(self.originals):
+            if cls is None:
+                module[name] = func
+            else:
+                setattr(cls, name, func)
+        self.originals = []
+
+    def report(self):
+        '''
+        Returns a dictionary with the total seconds profiled, the calls,
+        seconds including and excluding nested stages and random draws of
+        each stage that was called, the draws of each random function and
+        the accepted and rejected pedigrees of simulate_pedigree
+        '''
+        seconds = self.seconds
+        if self.originals:
+            seconds += time.perf_counter() - self.start
+        total_draws = 0
+        for name in self.draws:
+            total_draws += self.draws[name]
+        stages = {}
+        for name in self.stages:
+            if self.stages[name]["calls"] > 0:
+                stages[name] = self.stages[name]
+        return {"seconds": seconds, "stages": stages,
+                "draws": self.draws, "total_draws": total_draws,
+                "pedigrees_accepted": self.accepted,
+                "pedigrees_rejected": self.rejections}
+
+    def write_report(self, path="profile.json"):
+        '''Writes the report as JSON to path'''
+        with open(path, "w") as my_file:
+            json.dump(self.report(), my_file, indent=2, sort_keys=True)
+
+#with StageProfiler() as profiler:
+#    run_ca_sim_fhx(5)
+#profiler.write_report()
+
+
+#benchmark
+#stages of run_sim_fhx timed by run_benchmark
+BENCHMARK_STAGES = ["make_healthy_pedigree", "get_founder_ca",
+                    "get_founder_mutns", "pass_founder_mutn",
+                    "make_ca_pedigree", "get_family_history",
+                    "write_pedigree", "write_family_history"]
+
+def benchmark_stages(num_trials, engine, path):
+    '''
+    Runs the steps of run_sim_fhx for num_trials families one stage at a
+    time, writing the text files to the directory path
+
+    Returns a dictionary of the seconds taken by each stage in
+    BENCHMARK_STAGES
+    '''
+    times = {}
+    start = time.perf_counter()
+    new_peds = [PEDIGREE_ENGINES[engine]() for x in range(num_trials)]
+    h_peds = [new_ped.make_healthy_pedigree() for new_ped in new_peds]
+    times["make_healthy_pedigree"] = time.perf_counter() - start
+    start = time.perf_counter()
+    founder_cas = [new_peds[index].get_founder_ca(h_peds[index])
+                   for index in range(num_trials)]
+    times["get_founder_ca"] = time.perf_counter() - start
+    start = time.perf_counter()
+    founder_mutns = [new_peds[index].get_founder_mutns(founder_cas[index])
+                     for index in range(num_trials)]
+    times["get_founder_mutns"] = time.perf_counter() - start
+    start = time.perf_counter()
+    for index in range(num_trials):
+        for person in founder_mutns[index]:
+            if person.mutn > 0:
+                new_peds[index].pass_founder_mutn(person,
+                                                  founder_mutns[index])
+    times["pass_founder_mutn"] = time.perf_counter() - start
+    start = time.perf_counter()
+    ca_peds = [new_peds[index].make_ca_pedigree(founder_mutns[index])
+               for index in range(num_trials)]
+    times["make_ca_pedigree"] = time.perf_counter() - start
+    start = time.perf_counter()
+    fam_hxs = [new_peds[index].get_family_history(ca_peds[index])
+               for index in range(num_trials)]
+    times["get_family_history"] = time.perf_counter() - start
+    start = time.perf_counter()
+    my_pedigree = TextOutput(os.path.join(path, "pedigree.txt"),
+                             write_pedigree_header)
+    write_pedigree_rows(my_pedigree, ca_peds)
+    my_pedigree.close()
+    times["write_pedigree"] = time.perf_counter() - start
+    start = time.perf_counter()
+    my_hx = TextOutput(os.path.join(path, "familyhistory.txt"),
+                       write_family_history_header)
+    write_family_history_rows(my_hx, fam_hxs)
+    my_hx.close()
+    times["write_family_history"] = time.perf_counter() - start
+    return times
+
+def run_benchmark(num_trials=2000, seed=1, engine="scalar", repeats=3):
+    '''
+    Times each stage in BENCHMARK_STAGES on num_trials families with the
+    random module seeded from seed, keeping the fastest of repeats runs,
+    then runs the stages once more under tracemalloc for the peak memory
+
+    engine: "scalar" or "icdf" as in run_simulation
+
+    The random state and pedigree ID counters are restored afterwards.
+    Returns a dictionary report that can be saved with save_benchmark
+    '''
+    if engine not in PEDIGREE_ENGINES:
+        raise ValueError("Unknown engine %s" % engine)
+    random_state = random.getstate()
+    family_id = Pedigree.family_id
+    ind_id = Pedigree.ind_id
+    path = tempfile.mkdtemp()
+    times = {}
+    try:
+        for repeat in range(repeats):
+            random.seed(seed)
+            Pedigree.family_id = 0
+            Pedigree.ind_id = 0
+            stage_times = benchmark_stages(num_trials, engine, path)
+            for stage in BENCHMARK_STAGES:
+                if stage not in times or stage_times[stage] < times[stage]:
+                    times[stage] = stage_times[stage]
+        random.seed(seed)
+        Pedigree.family_id = 0
+        Pedigree.ind_id = 0
+        tracemalloc.start()
+        try:
+            benchmark_stages(num_trials, engine, path)
+            peak_memory = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    finally:
+        shutil.rmtree(path)
+        random.setstate(random_state)
+        Pedigree.family_id = family_id
+        Pedigree.ind_id = ind_id
+    total = sum(times.values())
+    share = {}
+    for stage in BENCHMARK_STAGES:
+        share[stage] = times[stage] / total
+    max_rss = None
+    if resource is not None:
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {"num_trials": num_trials, "seed": seed, "engine": engine,
+            "repeats": repeats, "python": platform.python_version(),
+            "seconds": times, "share": share, "total_seconds": total,
+            "pedigrees_per_sec": num_trials / total,
+            "peak_memory_bytes": peak_memory, "max_rss": max_rss}
+
+def save_benchmark(report, path="benchmark.json"):
+    '''Saves a report from run_benchmark as JSON to use as a baseline'''
+    with open(path, "w") as my_file:
+        json.dump(report, my_file, indent=2, sort_keys=True)
+
+def load_benchmark(path="benchmark.json"):
+    '''Returns a report saved with save_benchmark'''
+    with open(path) as my_file:
+        return json.load(my_file)
+
+def compare_benchmark(report, baseline, tolerance=0.1, min_share=0.01):
+    '''
+    report, baseline: reports from run_benchmark or load_benchmark for the
+        same number of trials, seed and engine
+    tolerance: fraction by which a stage may be slower, or the peak memory
+        larger, than in baseline before it counts as a regression
+    min_share: fraction of the baseline total time a stage must also slow
+        down by, so timer noise in the short stages is not reported
+
+    Returns a list of [name, baseline value, report value] for each stage
+    time, pedigrees/sec and peak memory that regressed
+    '''
+    for key in ["num_trials", "seed", "engine"]:
+        if report[key] != baseline[key]:
+            raise ValueError("Benchmark %s %s does not match baseline %s" %
+                             (key, report[key], baseline[key]))
+    regressions = []
+    for stage in BENCHMARK_STAGES:
+        slower = report["seconds"][stage] - baseline["seconds"][stage]
+        if slower > baseline["seconds"][stage] * tolerance and \
+           slower > baseline["total_seconds"] * min_share:
+            regressions.append([stage, baseline["seconds"][stage],
+                                report["seconds"][stage]])
+    if report["pedigrees_per_sec"] < baseline["pedigrees_per_sec"] / \
+       (1 + tolerance):
+        regressions.append(["pedigrees_per_sec",
+                            baseline["pedigrees_per_sec"],
+                            report["pedigrees_per_sec"]])
+    if report["peak_memory_bytes"] > baseline["peak_memory_bytes"] * \
+       (1 + tolerance):
+        regressions.append(["peak_memory_bytes",
+                            baseline["peak_memory_bytes"],
+                            report["peak_memory_bytes"]])
+    return regressions
+
+def print_benchmark(report, baseline=None, tolerance=0.1):
+    '''
+    Prints the time and share of each stage, the pedigrees/sec and the
+    peak memory of a report and, if baseline is given, the change from
+    the baseline and any regressions found by compare_benchmark
+    '''
+    print("%d pedigrees, seed %s, engine %s, best of %d" %
+          (report["num_trials"], report["seed"], report["engine"],
+           report["repeats"]))
+    for stage in BENCHMARK_STAGES:
+        line = "%-22s %8.4f s %6.1f%%" % (stage, report["seconds"][stage],
+                                         100 * report["share"][stage])
+        if baseline is not None:
+            line += " %+7.1f%%" % (100 * (report["seconds"][stage] /
+                                          baseline["seconds"][stage] - 1))
+        print(line)
+    print("%-22s %8.0f" % ("pedigrees/sec", report["pedigrees_per_sec"]))
+    print("%-22s %8.1f MB" % ("peak memory",
+                              report["peak_memory_bytes"] / 1e6))
+    if baseline is not None:
+        regressions = compare_benchmark(report, baseline, tolerance)
+        for name, old, new in regressions:
+            print("REGRESSION %s: %s -> %s" % (name, old, new))
+        if len(regressions) == 0:
+            print("no regressions against baseline")
+
+#save_benchmark(run_benchmark())
+#print_benchmark(run_benchmark(), load_benchmark())
+
+
+#command line
+def main(argv=None):
+    '''
+    Runs a simulation from the command line arguments argv, or sys.argv
+    if None, with run_parallel and prints the number of pedigrees written
+    and the seed that reproduces them
+    '''
+    parser = argparse.ArgumentParser(
+        description="Simulate BRCA pedigrees for BOADICEA")
+    parser.add_argument("mode", nargs="?", default="simulation",
+                        choices=SIMULATION_MODES,
+                        help="simulation to run, named after the run_* "
+                        "functions (default simulation)")
+    parser.add_argument("-n", "--trials", type=int, default=500,
+                        help="number of pedigrees (default 500)")
+    parser.add_argument("-w", "--workers", type=int, default=1,
+                        help="number of worker processes, 0 for all "
+                        "processors (default 1)")
+    parser.add_argument("-s", "--seed", type=int, default=None,
+                        help="seed for the simulation, random if not given")
+    parser.add_argument("-c", "--chunk-size", type=int, default=1000,
+                        help="families per chunk (default 1000)")
+    parser.add_argument("-e", "--engine", default="scalar",
+                        choices=sorted(PEDIGREE_ENGINES) + ["numpy"],
+                        help="cancer sampling engine (default scalar)")
+    parser.add_argument("--carrier-sampling", default="rejection",
+                        choices=["rejection", "direct"],
+                        help="founder sampling for ca_sims and ca_sim_fhx "
+                        "(default rejection)")
+    parser.add_argument("-f", "--format", default="text",
+                        choices=OUTPUT_FORMATS,
+                        help="output format (default text)")
+    parser.add_argument("--compression", default=None,
+                        choices=["gzip", "zstd"],
+                        help="compression of the text files")
+    parser.add_argument("--shard-bytes", type=int, default=None,
+                        help="split the text files into shards of about "
+                        "this many bytes")
+    parser.add_argument("-o", "--output-dir", default=".",
+                        help="directory for the output files (default .)")
+    parser.add_argument("--summary", action="store_true",
+                        help="write only a table of aggregate counts to "
+                        "summary.txt instead of the pedigrees")
+    parser.add_argument("--profile", default=None, metavar="PATH",
+                        help="write a StageProfiler JSON report to PATH")
+    parser.add_argument("--streams", default="chunk",
+                        choices=RANDOM_STREAMS,
+                        help="seed the random module once per chunk or once "
+                        "per family (default chunk)")
+    parser.add_argument("--generations", type=int, nargs=2, default=None,
+                        metavar=("UP", "DOWN"),
+                        help="make pedigrees with UP generations above and "
+                        "DOWN below the proband instead of three "
+                        "generations")
+    parser.add_argument("--checkpoint", default=None, metavar="PATH",
+                        help="save a checkpoint to PATH after each chunk")
+    parser.add_argument("--resume", action="store_true",
+                        help="continue the run from --checkpoint")
+    args = parser.parse_args(argv)
+    if args.trials < 0:
+        parser.error("--trials must not be negative")
+    if args.chunk_size < 1:
+        parser.error("--chunk-size must be at least 1")
+    workers = args.workers
+    if workers == 0:
+        workers = None
+    elif workers < 0:
+        parser.error("--workers must not be negative")
+    if args.resume and args.checkpoint is None:
+        parser.error("--resume needs --checkpoint")
+    if args.summary and (args.format != "text" or
+                         args.compression is not None or
+                         args.shard_bytes is not None):
+        parser.error("--summary does not write pedigree files")
+    if args.format == "npy" and (args.compression is not None or
+                                 args.shard_bytes is not None):
+        parser.error("--compression and --shard-bytes are for text output")
+    if args.profile is not None and args.workers != 1:
+        parser.error("--profile only profiles the current process, use "
+                     "--workers 1")
+    if args.carrier_sampling == "direct" and \
+       args.mode not in ["ca_sims", "ca_sim_fhx"]:
+        parser.error("--carrier-sampling is for ca_sims and ca_sim_fhx")
+    if args.shard_bytes is not None and args.shard_bytes < 1:
+        parser.error("--shard-bytes must be at least 1")
+    if np is None and (args.engine == "numpy" or args.format != "text"):
+        parser.error("NumPy is required for the numpy engine and npy "
+                     "output")
+    if args.compression == "zstd" and zstandard is None:
+        parser.error("zstandard is required for zstd compression")
+    try:
+        check_parallel_options(args.mode, args.engine, args.carrier_sampling,
+                               args.streams, args.generations)
+        if not args.summary:
+            check_npy_ids(args.trials, pedigree_size_bound(args.generations),
+                          args.format)
+    except ValueError as error:
+        parser.error(str(error))
+    seed = args.seed
+    if seed is None and args.resume and os.path.exists(args.checkpoint):
+        seed = read_checkpoint(args.checkpoint)["params"]["seed"]
+    if seed is None:
+        seed = random.getrandbits(63)
+    profiler = None
+    if args.profile is not None:
+        profiler = StageProfiler()
+        profiler.enable()
+    try:
+        if args.summary:
+            count = run_summary(args.trials, args.mode, workers, seed,
+                                args.chunk_size, args.engine,
+                                carrier_sampling=args.carrier_sampling,
+                                output_dir=args.output_dir,
+                                checkpoint=args.checkpoint,
+                                resume=args.resume,
+                                streams=args.streams,
+                                generations=args.generations).families
+        else:
+            count = run_parallel(args.trials, args.mode, workers, seed,
+                                 args.chunk_size, args.engine,
+                                 return_results=False,
+                                 carrier_sampling=args.carrier_sampling,
+                                 output_format=args.format,
+                                 compression=args.compression,
+                                 shard_bytes=args.shard_bytes,
+                                 output_dir=args.output_dir,
+                                 checkpoint=args.checkpoint,
+                                 resume=args.resume, streams=args.streams,
+                                 generations=args.generations)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+    if profiler is not None:
+        profiler.write_report(args.profile)
+    if args.summary:
+        print("summarized %d pedigrees in %s with seed %d" %
+              (count, os.path.join(args.output_dir, "summary.txt"), seed))
+    else:
+        print("wrote %d pedigrees to %s with seed %d" %
+              (count, args.output_dir, seed))
+    return 0
+
+if __name__ == "__main__":
+    main()